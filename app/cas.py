@@ -0,0 +1,145 @@
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+COMPLETE_MARKER = ".complete"
+
+
+def link_or_copy(src: Path, dest: Path):
+    # Hardlink (shares the bytes on disk); copy when src and dest are on different filesystems
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+class ContentStore:
+    """
+    Content-addressed store shared by all jobs: uploaded videos keyed by their SHA-256, and
+    derived data (extracted frames, cached features) keyed by the video hash plus whatever
+    parameters produced it. Jobs get hardlinks to the entries, so identical uploads are stored
+    and decoded once.
+
+    References live in a SQLite table with one row per (job, kind): a job holds at most one
+    entry of each kind, and taking a new one drops the old. An entry is deleted once no job
+    references it; since jobs hold hardlinks, deleting a job's files never affects another job.
+
+    Layout under root:
+        refs.db                    (job_id, kind) -> key
+        <kind>/<key>/              entry, complete once it holds .complete
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS refs (job_id TEXT NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL,"
+            " PRIMARY KEY (job_id, kind))"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS refs_entry ON refs (kind, key)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.root / "refs.db"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def path(self, kind: str, key: str) -> Path:
+        return self.root / kind / key
+
+    def exists(self, kind: str, key: str) -> bool:
+        return (self.path(kind, key) / COMPLETE_MARKER).exists()
+
+    def refs(self, job_id: str) -> Dict[str, str]:
+        # kind -> key of every entry a job references
+        return dict(self._conn().execute("SELECT kind, key FROM refs WHERE job_id = ?", (job_id,)).fetchall())
+
+    def share(self, src_job: str, dst_job: str):
+        """Give dst_job references to exactly the entries src_job references (e.g. batch children)."""
+        wanted = self.refs(src_job)
+        for kind, key in wanted.items():
+            self.acquire(dst_job, kind, key)
+        for kind in set(self.refs(dst_job)) - set(wanted):
+            self.release(dst_job, kind)
+
+    def acquire(self, job_id: str, kind: str, key: str) -> bool:
+        """
+        Reference an entry for a job (replacing the job's previous entry of this kind). Returns
+        whether the entry is complete; if not, the caller builds it with put() while holding the
+        reference, which keeps it from being collected meanwhile.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old = conn.execute("SELECT key FROM refs WHERE job_id = ? AND kind = ?", (job_id, kind)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO refs (job_id, kind, key) VALUES (?, ?, ?)", (job_id, kind, key))
+            garbage = self._collect(conn, kind, old[0]) if old and old[0] != key else None
+            complete = self.exists(kind, key)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._purge(garbage)
+        return complete
+
+    def put(self, kind: str, key: str, build: Callable[[Path], None]) -> Path:
+        """
+        Build an entry in a private staging directory and publish it atomically. If another job
+        published the same entry meanwhile, that one is kept (entries with one key are equal).
+        """
+        final = self.path(kind, key)
+        staging = self.root / kind / f".{key}.{uuid.uuid4().hex[:8]}.tmp"
+        staging.mkdir(parents=True)
+        try:
+            build(staging)
+            (staging / COMPLETE_MARKER).touch()
+            try:
+                staging.rename(final)
+            except OSError:
+                pass  # published by another job first
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return final
+
+    def release(self, job_id: str, kind: Optional[str] = None):
+        # Drop a job's references (all kinds by default); entries nobody references are deleted
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if kind is None:
+                rows = conn.execute("SELECT kind, key FROM refs WHERE job_id = ?", (job_id,)).fetchall()
+            else:
+                rows = conn.execute("SELECT kind, key FROM refs WHERE job_id = ? AND kind = ?", (job_id, kind)).fetchall()
+            conn.execute("DELETE FROM refs WHERE job_id = ?" + ("" if kind is None else " AND kind = ?"),
+                         (job_id,) if kind is None else (job_id, kind))
+            garbage = [self._collect(conn, k, key) for k, key in rows]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        for trash in garbage:
+            self._purge(trash)
+
+    def _collect(self, conn: sqlite3.Connection, kind: str, key: str) -> Optional[Path]:
+        # Within the refs transaction: move an unreferenced entry aside so no acquire can see it
+        if conn.execute("SELECT 1 FROM refs WHERE kind = ? AND key = ?", (kind, key)).fetchone():
+            return None
+        entry = self.path(kind, key)
+        if not entry.exists():
+            return None
+        trash = self.root / kind / f".{key}.{uuid.uuid4().hex[:8]}.del"
+        entry.rename(trash)
+        return trash
+
+    @staticmethod
+    def _purge(trash: Optional[Path]):
+        if trash is not None:
+            shutil.rmtree(trash, ignore_errors=True)
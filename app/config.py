@@ -5,9 +5,67 @@ class Settings(BaseSettings):
     SAM2_CHECKPOINT: str = ""  # path to .pt
     DEVICE: str = "cuda"  # or "cpu"
     DATA_ROOT: str = "./data"
-    FRAME_EXT: str = "png"
-    MAX_WORKERS: int = 1
-    MASK_OUTPUT_MODE: str = "single"  # or "per_label"
+    FRAME_EXT: str = "png"  # png | jpg | npy (raw, fastest to write, largest)
+    VIDEO_FRAME_MODE: str = "extract"  # "extract" frames to disk at upload, or "decode" them on demand from the video
+    FRAME_CACHE_SIZE: int = 8  # decoded frames kept per open frame source
+    FRAME_PNG_COMPRESSION: int = 1  # 0-9, used when FRAME_EXT=png
+    FRAME_JPEG_QUALITY: int = 95  # 0-100, used when FRAME_EXT=jpg
+    EXTRACT_WORKERS: int = 0  # decode processes for frame extraction, 0 = one per CPU core
+    EXTRACT_WRITER_THREADS: int = 4  # image encoder threads per decode process
+    MAX_WORKERS: int = 1  # concurrent propagation jobs
+    PIPELINE_PREFETCH: int = 4  # frames decoded ahead of inference
+    PIPELINE_WRITERS: int = 2  # threads rendering overlays and writing PNGs
+    WRITE_OVERLAYS: bool = False  # overlays are rendered on request by /data/{job_id}/overlays/{name}
+    OVERLAY_CACHE_MB: int = 256  # encoded on-demand overlays kept in memory
+    PROPAGATION_MEMORY_FRAMES: int = 1  # past masks kept as temporal state (memory is constant in video length)
+    PROCESSING_MAX_SIDE: int = 0  # downscale frames so the long side is at most this many pixels for inference, 0 = no cap
+    PROCESSING_SCALE: float = 1.0  # scale factor (0-1] applied to frames for inference, before PROCESSING_MAX_SIDE
+    PROCESSING_OUTPUT: str = "full"  # masks upsampled to the frame size ("full") or kept at the processing size ("processing")
+    PROCESSING_REFINE_EDGES: bool = False  # guided-filter upsampled masks against the full-size frame (slower, tighter edges)
+    INCREMENTAL_PROPAGATION: bool = True  # re-runs recompute only frames affected by changed prompts (MASK_STORAGE=store, SEGMENT_WORKERS=1)
+    SEGMENT_WORKERS: int = 1  # processes propagating keyframe segments in parallel, each with its own model; 1 = one sequential pass, 0 = one per CPU core
+    EVENTS_MIN_INTERVAL: float = 0.25  # seconds; /api/events sends at most one coalesced update per interval
+    MAX_QUEUE_SIZE: int = 16  # waiting jobs before /api/propagate answers 429
+    MASK_OUTPUT_MODE: str = "single"  # default labels_mode: "single" (union), "composite" (label index) or "per_label"
+    MASK_STORAGE: str = "store"  # "store": one RLE mask store per job, PNGs made on request; "png": one PNG per frame
+    MASK_STORE_COMPACT_RATIO: float = 0.5  # after a run, compact the mask store once this share of its data file is dead
+    LIST_PAGE_SIZE: int = 1000  # default page size (limit) of /api/frames/{job_id}/list and /api/masks/{job_id}/list
+    PARSE_WORKERS: int = 0  # processes parsing Label Studio tasks for /api/propagate_batch, 0 = one per CPU core
+    ENABLE_PROFILING: bool = False  # honour profile=true on /api/propagate: cProfile the job into its outputs (profile.pstats)
+
+    # Job state: "sqlite" is shared by all processes on the host and survives restarts; "memory" is per process
+    JOB_STORE: str = "sqlite"
+    JOB_STORE_PATH: str = ""  # default: DATA_ROOT/jobs.db
+    JOB_PROGRESS_FLUSH_S: float = 1.0  # per-frame progress is written to the store at most this often
+
+    # Where propagation runs: "inline" in the API process (JobScheduler), or "worker" in separate
+    # `python -m app.worker` processes fed by a durable SQLite queue (needs JOB_STORE=sqlite)
+    EXECUTION_MODE: str = "inline"
+    QUEUE_PATH: str = ""  # default: DATA_ROOT/queue.db
+    WORKER_LEASE_S: float = 60.0  # a job whose worker stops heartbeating for this long is handed to another worker
+    WORKER_POLL_S: float = 0.5  # idle workers check the queue this often
+    WORKER_MAX_ATTEMPTS: int = 3  # leases of one job before it is failed (its workers keep dying)
+
+    # Uploads are streamed to disk in chunks
+    UPLOAD_CHUNK_BYTES: int = 8 * 1024 * 1024
+    MAX_UPLOAD_MB: int = 20480  # 0 = unlimited
+    DEDUPE_UPLOADS: bool = True  # identical videos/frame ZIPs share one copy and one frame extraction (DATA_ROOT/cas, hardlinks)
+
+    # Predictor pool: loaded models are reused across jobs
+    PREDICTOR_POOL_SIZE: int = 1  # max distinct (model, checkpoint, device) entries kept loaded
+    PREDICTOR_MIN_FREE_MB: int = 1024  # evict idle predictors when free host/GPU memory drops below this
+    PREDICTOR_PRELOAD: bool = False  # load the configured predictor at startup instead of on first job
+    WARMUP_ON_STARTUP: bool = False  # at startup, load the predictor and run one dummy frame in the background; /readyz answers 503 until done
+
+    # CPU inference profile, used when DEVICE=cpu or no GPU is available (see app/cpu_accel.py). The
+    # model modes (channels-last, bf16, int8, compile) are not wired into inference yet: _segment_frame
+    # does not run the SAM2 model, so they are neither applied nor reported in job meta
+    CPU_THREADS: int = 0  # torch intra-op threads, 0 = torch default
+    CPU_INTEROP_THREADS: int = 0  # torch inter-op threads, 0 = torch default
+    CPU_CHANNELS_LAST: bool = False  # channels-last (NHWC) model weights and inputs
+    CPU_BF16: bool = False  # bfloat16 autocast; only applied on CPUs with native bf16 (AVX512-BF16/AMX)
+    CPU_INT8: bool = False  # dynamic int8 quantization of linear layers (masks may drift slightly)
+    CPU_COMPILE: bool = False  # torch.compile the model; slow first job, falls back to eager on failure
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
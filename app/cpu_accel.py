@@ -0,0 +1,131 @@
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional
+
+
+@dataclass(frozen=True)
+class CPUProfile:
+    """
+    How SAM2 inference runs when no GPU is available. All modes are off by default; the thread
+    settings leave torch's defaults when 0.
+    """
+    threads: int = 0  # intra-op threads
+    interop_threads: int = 0  # inter-op threads; only settable before torch starts parallel work
+    channels_last: bool = False  # NHWC weights and inputs (faster oneDNN convolutions)
+    bf16: bool = False  # bfloat16 autocast, where the CPU has native bf16 (AVX512-BF16 / AMX)
+    int8: bool = False  # dynamic int8 quantization of the linear layers
+    compile: bool = False  # torch.compile the model (falls back to eager if compilation fails)
+
+    @classmethod
+    def from_settings(cls, settings) -> "CPUProfile":
+        return cls(
+            threads=settings.CPU_THREADS,
+            interop_threads=settings.CPU_INTEROP_THREADS,
+            channels_last=settings.CPU_CHANNELS_LAST,
+            bf16=settings.CPU_BF16,
+            int8=settings.CPU_INT8,
+            compile=settings.CPU_COMPILE,
+        )
+
+    def numerics(self) -> Dict[str, bool]:
+        # The modes that can change the masks (for cache keys); thread counts and layout do not
+        return dict(bf16=self.bf16, int8=self.int8, compile=self.compile)
+
+
+def bf16_supported() -> bool:
+    # Without native bf16 instructions autocast emulates it, which is slower than fp32
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+class CPUAccelerator:
+    """
+    Applies a CPUProfile: thread settings when created, model transforms in optimize() and the
+    inference context (inference_mode, bf16 autocast) in inference(). Inactive on other devices.
+    report holds what took effect, for job meta: the model modes appear only once optimize() got a
+    torch model, and a requested mode that could not be applied says why.
+
+    torch is imported only when there is a torch model to accelerate.
+    """
+
+    def __init__(self, profile: CPUProfile, device: str):
+        self.profile = profile
+        self.active = device == "cpu"
+        self.report: Dict[str, Any] = dict(device=device)
+        self._torch_model = False
+        self._bf16 = False
+        if self.active:
+            self.report.update(threads=profile.threads, interop_threads=profile.interop_threads)
+            if profile.threads or profile.interop_threads:
+                self._configure_threads()
+
+    def _configure_threads(self):
+        import torch
+        if self.profile.threads:
+            torch.set_num_threads(self.profile.threads)
+        if self.profile.interop_threads:
+            try:
+                torch.set_num_interop_threads(self.profile.interop_threads)
+            except RuntimeError:
+                pass  # already fixed for this process; reported below
+        self.report.update(threads=torch.get_num_threads(), interop_threads=torch.get_num_interop_threads())
+
+    def optimize(self, model):
+        """Returns the model with the profile's transforms applied (in place where torch allows)."""
+        if not self.active or model is None:
+            return model
+        import torch
+        if not isinstance(model, torch.nn.Module):
+            return model
+        self._torch_model = True
+        model.eval()
+        p = self.profile
+        self.report.update(channels_last=p.channels_last, bf16=p.bf16, int8=p.int8, compile=p.compile)
+        if p.bf16:
+            self._bf16 = bf16_supported()
+            if not self._bf16:
+                self.report["bf16"] = "off: CPU has no native bf16"
+        if p.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        if p.int8:
+            from torch.ao.quantization import quantize_dynamic
+            quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        if p.compile:
+            try:
+                import torch._dynamo
+                torch._dynamo.config.suppress_errors = True  # run eagerly if compilation fails
+                model = torch.compile(model)
+            except Exception as e:
+                self.report["compile"] = f"off: {e}"
+        return model
+
+    def prepare(self, x):
+        # Inputs in the model's layout
+        if self.active and self.profile.channels_last and x.dim() == 4:
+            import torch
+            return x.contiguous(memory_format=torch.channels_last)
+        return x
+
+    @contextmanager
+    def inference(self) -> Iterator[None]:
+        if not (self.active and self._torch_model):
+            yield
+            return
+        import torch
+        with ExitStack() as stack:
+            stack.enter_context(torch.inference_mode())
+            if self._bf16:
+                stack.enter_context(torch.autocast("cpu", dtype=torch.bfloat16))
+            yield
+
+
+def describe(profile: Optional[CPUProfile], device: str) -> Dict[str, Any]:
+    # The report of SAM2VideoPropagator in another process (segment workers), without touching torch:
+    # thread settings only, as its inference does not run the model (see SAM2VideoPropagator.runs_model)
+    if device != "cpu" or profile is None:
+        return dict(device=device)
+    return dict(device=device, threads=profile.threads, interop_threads=profile.interop_threads)
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from app.lazy_imports import cv2
+from app.mask_store import MaskStore, label_dirname
+
+# Fixed entry timestamp so identical masks always produce a byte-identical archive
+_ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+def export_etag(masks_dir: Path, store: Optional[MaskStore]) -> str:
+    """Content key of a job's masks: the store signature, or name/size/mtime of every mask PNG."""
+    h = hashlib.sha1()
+    if store is not None:
+        h.update(b"store:" + store.signature().encode())
+    else:
+        for fp in sorted(Path(masks_dir).rglob("*.png")):
+            st = fp.stat()
+            h.update(f"{fp.relative_to(masks_dir)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/").strip('"') == etag:
+            return True
+    return False
+
+
+class _ChunkSink:
+    # Write-only, non-seekable target: zipfile then streams entries with data descriptors
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, b) -> int:
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _mask_entries(masks_dir: Path, store: Optional[MaskStore]) -> Iterator[Tuple[str, bytes]]:
+    # per_label jobs get the composite view at the top level and one folder per label, as on disk
+    if store is not None:
+        per_label = store.mode == "per_label"
+        for i in store.iter_written():
+            ok, buf = cv2.imencode(".png", store.mask_image(i))
+            yield f"{store.frames[i]}.png", buf.tobytes()
+            if per_label:
+                for k, label in enumerate(store.labels):
+                    ok, buf = cv2.imencode(".png", store.mask_image(i, k))
+                    yield f"{label_dirname(label)}/{store.frames[i]}.png", buf.tobytes()
+    else:
+        for fp in sorted(Path(masks_dir).rglob("*.png")):
+            yield fp.relative_to(masks_dir).as_posix(), fp.read_bytes()
+
+
+def stream_export(masks_dir: Path, store: Optional[MaskStore], cache_path: Optional[Path] = None) -> Iterator[bytes]:
+    """
+    Yield a ZIP_STORED archive of the job's mask PNGs (PNG is already compressed) one entry at
+    a time. With cache_path, the bytes are also teed into a private temp file that is renamed
+    onto cache_path once complete, so concurrent downloads never see a partial archive.
+    """
+    sink = _ChunkSink()
+    tmp = None
+    out = None
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_name(f".{cache_path.name}.{uuid.uuid4().hex[:8]}.part")
+        out = open(tmp, "wb")
+    try:
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+            for name, data in _mask_entries(masks_dir, store):
+                zf.writestr(zipfile.ZipInfo(name, date_time=_ZIP_EPOCH), data)
+                chunk = sink.drain()
+                if out is not None:
+                    out.write(chunk)
+                yield chunk
+        chunk = sink.drain()
+        if out is not None:
+            out.write(chunk)
+            out.close()
+            out = None
+            os.replace(tmp, cache_path)
+            tmp = None
+            prune_exports(cache_path.parent, keep=cache_path.name)
+        yield chunk
+    finally:
+        # Client went away or encoding failed: never leave a partial archive behind
+        if out is not None:
+            out.close()
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+
+
+def prune_exports(exports_dir: Path, keep: Optional[str] = None):
+    for fp in Path(exports_dir).glob("*.zip"):
+        if fp.name != keep:
+            fp.unlink(missing_ok=True)
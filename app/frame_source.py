@@ -0,0 +1,279 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.lazy_imports import cv2
+from app.manifest import FrameManifest
+from app.video_utils import read_frame
+
+VIDEO_EXTS = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v", ".mpg", ".mpeg")
+
+
+class FrameSource:
+    """
+    Random-access sequence of BGR frames (0-based index) with 1-based zero-padded frame names,
+    matching the names extract_frames_from_video writes. Decoded frames are kept in a small LRU.
+    Safe to share between threads.
+
+    Sources opened from an ingest manifest know their shape without decoding a frame, and carry
+    the manifest's signature (None otherwise).
+    """
+
+    def __init__(self, cache_size: int = 8, shape: Optional[Tuple[int, int]] = None):
+        self._cache: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._cache_size = max(0, cache_size)
+        self._lock = threading.Lock()
+        self._shape = shape
+        self.signature: Optional[str] = None
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def name(self, index: int) -> str:
+        raise NotImplementedError
+
+    def _decode(self, index: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def names(self) -> List[str]:
+        return [self.name(i) for i in range(len(self))]
+
+    def index_of(self, name: str) -> Optional[int]:
+        stem = Path(name).stem
+        if not stem.isdigit():
+            return None
+        idx = int(stem) - 1
+        if 0 <= idx < len(self) and Path(self.name(idx)).stem == stem:
+            return idx
+        return None
+
+    def read(self, index: int) -> np.ndarray:
+        if not 0 <= index < len(self):
+            raise IndexError(f"Frame index {index} out of range (0..{len(self) - 1}).")
+        with self._lock:
+            img = self._cache.get(index)
+            if img is not None:
+                self._cache.move_to_end(index)
+                return img
+            img = self._decode(index)
+            if img is None:
+                raise IOError(f"Failed to decode frame {index}.")
+            if self._cache_size:
+                self._cache[index] = img
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+            return img
+
+    def shape(self) -> Tuple[int, int]:
+        if self._shape is None:
+            h, w = self.read(0).shape[:2]
+            self._shape = (h, w)
+        return self._shape
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(len(self)):
+            yield self.read(i)
+
+    def close(self):
+        with self._lock:
+            self._cache.clear()
+
+    def __getstate__(self):
+        # Pickled (e.g. for segment worker processes) as its location only; caches are per process
+        state = self.__dict__.copy()
+        state["_cache"] = OrderedDict()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class ImageDirFrameSource(FrameSource):
+    def __init__(self, paths: Sequence[Path], cache_size: int = 8, shape: Optional[Tuple[int, int]] = None):
+        super().__init__(cache_size, shape)
+        self.paths = [Path(p) for p in paths]
+        self._by_name = {p.name: i for i, p in enumerate(self.paths)}
+
+    @classmethod
+    def from_dir(cls, frames_dir: Path, ext: str = "png", cache_size: int = 8) -> "ImageDirFrameSource":
+        return cls(sorted(Path(frames_dir).glob(f"*.{ext}")), cache_size=cache_size)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def name(self, index: int) -> str:
+        return self.paths[index].name
+
+    def index_of(self, name: str) -> Optional[int]:
+        return self._by_name.get(name)
+
+    def _decode(self, index: int) -> np.ndarray:
+        return read_frame(self.paths[index])
+
+
+class VideoFrameSource(FrameSource):
+    """
+    Decodes frames straight from the video container. Sequential reads continue from the current
+    decoder position; any other access seeks (the backend decodes forward from the nearest keyframe).
+    Every seek is checked; once one misses, frames are reached by decoding forward instead.
+    """
+
+    def __init__(self, video_path: Path, ext: str = "png", cache_size: int = 8, count: Optional[int] = None,
+                 shape: Optional[Tuple[int, int]] = None):
+        # count (e.g. from the manifest) skips asking the container, which may mean demuxing it all
+        super().__init__(cache_size, shape)
+        self.video_path = Path(video_path)
+        self.ext = ext
+        self._cap = cv2.VideoCapture(str(self.video_path))
+        if not self._cap.isOpened():
+            raise IOError(f"Cannot open video {self.video_path}.")
+        self._count = count if count is not None else int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if self._count <= 0:
+            # Container does not report a frame count: count by demuxing once
+            self._count = 0
+            while self._cap.grab():
+                self._count += 1
+            self._reopen()
+        self._next = 0
+        self._seekable = True
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state["_cap"]
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._cap = cv2.VideoCapture(str(self.video_path))
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def codec(self) -> str:
+        fourcc = int(self._cap.get(cv2.CAP_PROP_FOURCC))
+        return "".join(chr((fourcc >> 8 * k) & 0xFF) for k in range(4)).strip("\x00 ") or "unknown"
+
+    def name(self, index: int) -> str:
+        return f"{index + 1:08d}.{self.ext}"
+
+    def _reopen(self):
+        self._cap.release()
+        self._cap = cv2.VideoCapture(str(self.video_path))
+        self._next = 0
+
+    def _seek(self, index: int) -> bool:
+        # The backend seeks by timestamp and can land on another frame (not every container indexes
+        # its keyframes); then decode forward to the frame, from the start if it lies behind
+        if self._seekable:
+            if self._cap.set(cv2.CAP_PROP_POS_FRAMES, index) and int(self._cap.get(cv2.CAP_PROP_POS_FRAMES)) == index:
+                return True
+            self._seekable = False
+            self._next = -1  # position unknown after the missed seek
+        if not 0 <= self._next <= index:
+            self._reopen()
+        while self._next < index:
+            if not self._cap.grab():
+                return False
+            self._next += 1
+        return True
+
+    def _decode(self, index: int) -> np.ndarray:
+        if index != self._next and not self._seek(index):
+            self._next = -1
+            return None
+        ok, frame = self._cap.read()
+        self._next = index + 1 if ok else -1
+        return frame if ok else None
+
+    def close(self):
+        super().close()
+        with self._lock:
+            self._cap.release()
+
+
+class ScaledFrameSource(FrameSource):
+    """
+    Another source's frames resized to (height, width) as they are read, so a reduced processing
+    resolution costs one resize per frame and nothing downstream sees the full-size frame. The
+    full-size frames stay in the wrapped source's cache for whoever needs them at output.
+    """
+
+    def __init__(self, source: FrameSource, size: Tuple[int, int], cache_size: int = 8):
+        super().__init__(cache_size, (int(size[0]), int(size[1])))
+        self.source = source
+        self.size = (int(size[0]), int(size[1]))
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def name(self, index: int) -> str:
+        return self.source.name(index)
+
+    def index_of(self, name: str) -> Optional[int]:
+        return self.source.index_of(name)
+
+    def _decode(self, index: int) -> np.ndarray:
+        h, w = self.size
+        return cv2.resize(self.source.read(index), (w, h), interpolation=cv2.INTER_AREA)
+
+
+def find_video(video_dir: Path) -> Optional[Path]:
+    if not Path(video_dir).exists():
+        return None
+    for fp in sorted(Path(video_dir).iterdir()):
+        if fp.is_file() and fp.suffix.lower() in VIDEO_EXTS:
+            return fp
+    return None
+
+
+def manifest_frame_source(manifest: FrameManifest, frames_dir: Path, video_dir: Path, ext: str = "png",
+                          cache_size: int = 8) -> Optional[FrameSource]:
+    # None when the manifest no longer matches what is on disk (files gone, FRAME_EXT changed)
+    shape = (manifest.height, manifest.width)
+    if manifest.kind == "frames":
+        if manifest.codec != ext:
+            return None
+        src: FrameSource = ImageDirFrameSource([Path(frames_dir) / n for n in manifest.names], cache_size, shape)
+    else:
+        video = Path(video_dir) / (manifest.video or "")
+        if not video.is_file():
+            return None
+        try:
+            src = VideoFrameSource(video, ext=ext, cache_size=cache_size, count=manifest.count, shape=shape)
+        except IOError:
+            return None
+    src.signature = manifest.signature
+    return src
+
+
+def open_frame_source(frames_dir: Path, video_dir: Path, ext: str = "png", cache_size: int = 8) -> Optional[FrameSource]:
+    # The ingest manifest says what to open; jobs ingested before manifests existed are listed/probed.
+    # Extracted frames take precedence; otherwise decode from the uploaded video.
+    manifest = FrameManifest.load(frames_dir)
+    if manifest is not None:
+        src = manifest_frame_source(manifest, frames_dir, video_dir, ext, cache_size)
+        if src is not None:
+            return src
+    if Path(frames_dir).exists():
+        src = ImageDirFrameSource.from_dir(frames_dir, ext=ext, cache_size=cache_size)
+        if len(src):
+            return src
+    video = find_video(video_dir)
+    if video is not None:
+        try:
+            return VideoFrameSource(video, ext=ext, cache_size=cache_size)
+        except IOError:
+            return None
+    return None
+
+
+def as_frame_source(frames: Union[FrameSource, Iterable[Path]]) -> FrameSource:
+    if isinstance(frames, FrameSource):
+        return frames
+    return ImageDirFrameSource(list(frames))
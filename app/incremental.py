@@ -0,0 +1,89 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.frame_source import FrameSource, ImageDirFrameSource, VideoFrameSource
+from app.labelstudio_parser import BoxPrompt, ParsedPrompts, PointPrompt
+from app.mask_store import MaskStore
+
+MANIFEST_NAME = "propagation.json"
+
+
+def _prompt_bytes(pr) -> bytes:
+    if isinstance(pr, BoxPrompt):
+        fields = ("box", pr.label, pr.x1, pr.y1, pr.x2, pr.y2)
+    elif isinstance(pr, PointPrompt):
+        fields = ("point", pr.label, pr.x, pr.y, pr.positive)
+    else:
+        mask = np.asarray(pr.mask).astype(bool)
+        fields = ("mask", pr.label, mask.shape, hashlib.sha1(np.packbits(mask)).hexdigest())
+    return json.dumps(fields).encode()
+
+
+def prompt_digests(prompts: ParsedPrompts, frame_count: int) -> List[str]:
+    """Digest of the prompts on each frame (0-based), "" for frames without prompts."""
+    hashes: Dict[int, Any] = {}
+    for pr in (*prompts.boxes, *prompts.points, *prompts.masks):
+        hashes.setdefault(pr.frame - 1, hashlib.sha1()).update(_prompt_bytes(pr))
+    return [hashes[i].hexdigest() if i in hashes else "" for i in range(frame_count)]
+
+
+def source_signature(source: FrameSource) -> Optional[str]:
+    # Changes when frames are re-uploaded; None for sources that cannot be fingerprinted cheaply
+    if source.signature is not None:
+        return source.signature  # from the ingest manifest: no per-file stat
+    h = hashlib.sha1()
+    if isinstance(source, ImageDirFrameSource):
+        for p in source.paths:
+            st = p.stat()
+            h.update(f"{p.name}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    elif isinstance(source, VideoFrameSource):
+        st = source.video_path.stat()
+        h.update(f"{source.video_path.name}:{st.st_size}:{st.st_mtime_ns}:{len(source)}".encode())
+    else:
+        return None
+    return h.hexdigest()
+
+
+def run_key(**params: Any) -> str:
+    # Everything besides the prompts that a cached mask depends on (model, labels, mode, frames, ...)
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load_manifest(masks_dir: Path) -> Optional[Dict[str, Any]]:
+    path = Path(masks_dir) / MANIFEST_NAME
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_manifest(masks_dir: Path, key: str, digests: List[str]):
+    path = Path(masks_dir) / MANIFEST_NAME
+    tmp = path.with_name(MANIFEST_NAME + ".tmp")
+    tmp.write_text(json.dumps(dict(key=key, prompts=digests)), encoding="utf-8")
+    tmp.replace(path)
+
+
+def remove_manifest(masks_dir: Path):
+    # Before outputs are modified: an interrupted run must not leave masks that look reusable
+    (Path(masks_dir) / MANIFEST_NAME).unlink(missing_ok=True)
+
+
+def dirty_frames(masks_dir: Path, key: str, digests: List[str], labels: List[str]) -> Optional[List[int]]:
+    """
+    Frames (0-based) whose prompts changed since the last completed run, plus frames missing from
+    its mask store; None if nothing can be reused (no previous run, or the run key, frame count or
+    labels differ).
+    """
+    manifest = load_manifest(masks_dir)
+    if manifest is None or manifest.get("key") != key or len(manifest.get("prompts", ())) != len(digests):
+        return None
+    store = MaskStore.open(masks_dir)
+    if store is None or store.labels != labels or len(store.frames) != len(digests):
+        return None
+    written = store.written()
+    return [i for i, (old, new) in enumerate(zip(manifest["prompts"], digests)) if old != new or not written[i]]
@@ -1,9 +1,18 @@
 import json
+import re
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional
+from typing import List, Deque, Dict, Any, Iterator, Optional, Tuple
 from pathlib import Path
 import numpy as np
 
+from app.rle import counts_from_string, decode_counts, decode_ls_brush_mask
+
+_STRUCTURE = re.compile(r'[{}\[\]"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
 @dataclass
 class BoxPrompt:
     frame: int
@@ -39,83 +48,165 @@ class ParsedPrompts:
 def _percent_to_abs(val: float, size: int) -> float:
     return (val / 100.0) * size
 
-def _decode_rle(rle: str, height: int, width: int) -> np.ndarray:
-    # Basic RLE decoder (Label Studio style may differ; adjust if needed)
-    # Expecting "counts" in COCO-like format is typical; many LS exports provide custom rle string.
-    # This is a placeholder simple decoder for "num:len" pairs. For robustness, integrate pycocotools if available.
-    try:
-        import pycocotools.mask as mask_utils
-        # If rle is json-serializable dict with counts/size
-        # Try parse as JSON
+def _decode_rle(rle: Any, height: int, width: int) -> np.ndarray:
+    """
+    Decode a mask annotation to bool (H, W). Accepts:
+      - Label Studio brush RLE: list of byte values (the "rle" field of BrushLabels results)
+      - COCO RLE: {"counts": [...] or compressed str, "size": [h, w]}, or that dict as a JSON string
+      - plain run lengths: space-separated ints alternating background/foreground, row-major
+    Raises ValueError when the data cannot be decoded.
+    """
+    if isinstance(rle, str):
+        text = rle.strip()
+        if text[:1] in ("{", "["):
+            try:
+                return _decode_rle(json.loads(text), height, width)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid RLE JSON: {e}")
         try:
-            obj = json.loads(rle)
-            return mask_utils.decode(obj).astype(bool)
-        except Exception:
-            pass
-    except Exception:
-        pass
-
-    # Fallback simple decoder: space-separated integers alt format "counts" (not guaranteed)
-    arr = np.zeros((height * width,), dtype=np.uint8)
-    idx = 0
-    try:
-        parts = [int(x) for x in rle.strip().split()]
-        val = 0
-        for run in parts:
-            if val == 1:
-                arr[idx:idx+run] = 1
-            idx += run
-            val = 1 - val
-        return arr.reshape((height, width)).astype(bool)
-    except Exception:
-        # If we cannot decode, return empty mask
-        return np.zeros((height, width), dtype=bool)
-
-def parse_labelstudio_export(ls_json_path: str, frames_dir: str, frame_ext: str = "png") -> ParsedPrompts:
-    with open(ls_json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    frames = sorted(Path(frames_dir).glob(f"*.{frame_ext}"))
-    if not frames:
-        raise ValueError("No frames found in frames_dir.")
+            counts = np.array(text.split(), dtype=np.int64)
+        except ValueError:
+            raise ValueError("Unrecognized RLE string.")
+        return decode_counts(counts, width, height).T
 
-    prompts = ParsedPrompts()
-    # Strategy: take first task with annotations
-    task = None
-    for t in data:
-        if t.get("annotations"):
-            task = t
-            break
-    if task is None:
-        return prompts
+    if isinstance(rle, dict):
+        counts = rle.get("counts")
+        h, w = rle.get("size") or (height, width)
+        if isinstance(counts, str):
+            counts = counts_from_string(counts)
+        if counts is None:
+            raise ValueError("COCO RLE without counts.")
+        return decode_counts(counts, int(h), int(w))
+
+    if isinstance(rle, (list, tuple)):
+        return decode_ls_brush_mask(rle, height, width)
+
+    raise ValueError(f"Unsupported RLE type {type(rle).__name__}.")
+
+def iter_labelstudio_tasks(ls_json_path: str, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the tasks of a Label Studio JSON export (a top-level array of objects) one at a time,
+    reading the file in chunk_size pieces so that only the task being decoded is held in memory.
+    Each task is scanned to its closing brace before it is decoded, so it is decoded once.
+    """
+    decoder = json.JSONDecoder()
+    with open(ls_json_path, "r", encoding="utf-8-sig") as f:
+        buf = f.read(chunk_size)
+        pos = 0
+
+        def fill() -> bool:
+            # Reads at least as much as is buffered, so a large task is read in doubling pieces
+            nonlocal buf, pos
+            more = f.read(max(chunk_size, len(buf) - pos))
+            if not more:
+                return False
+            buf = buf[pos:] + more
+            pos = 0
+            return True
 
+        def skip_ws():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buf) or not fill():
+                    return
+
+        def object_end() -> int:
+            # Index just past the object starting at pos; only brackets and string delimiters are looked at
+            depth, in_string, i = 0, False, pos
+            while True:
+                m = (_STRING_SPECIAL if in_string else _STRUCTURE).search(buf, i)
+                if m is None:
+                    shift = pos
+                    i = max(i, len(buf))
+                    if not fill():
+                        raise ValueError("Unexpected end of Label Studio export.")
+                    i -= shift
+                    continue
+                c = m.group()
+                i = m.end()
+                if in_string:
+                    if c == "\\":
+                        i += 1  # skip the escaped character
+                    else:
+                        in_string = False
+                elif c == '"':
+                    in_string = True
+                elif c in "{[":
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        return i
+
+        skip_ws()
+        if pos >= len(buf) or buf[pos] != "[":
+            raise ValueError("Expected a list of tasks.")
+        pos += 1
+        first = True
+        while True:
+            skip_ws()
+            if pos >= len(buf):
+                raise ValueError("Unexpected end of Label Studio export.")
+            if buf[pos] == "]":
+                return
+            if not first:
+                if buf[pos] != ",":
+                    raise ValueError(f"Expected ',' between tasks, got {buf[pos]!r}.")
+                pos += 1
+                skip_ws()
+            first = False
+            if pos >= len(buf) or buf[pos] != "{":
+                raise ValueError("Expected a task object.")
+            object_end()  # the whole task is buffered now
+            task, pos = decoder.raw_decode(buf, pos)
+            if pos > chunk_size:
+                buf = buf[pos:]
+                pos = 0
+            yield task
+
+def _task_results(task: Dict[str, Any]) -> List[Dict[str, Any]]:
     results = []
-    for ann in task.get("annotations", []):
+    for ann in task.get("annotations") or []:
         for r in ann.get("result", []):
             results.append(r)
+    return results
 
-    # We assume uniform resolution across frames
-    # Attempt to fetch from any result: original_width/height
-    W = H = None
+
+def _task_resolution(results: List[Dict[str, Any]]) -> Optional[Tuple[int, int]]:
+    # Attempt to fetch from any result: original_width/height -> (height, width)
     for r in results:
         ow = r.get("original_width")
         oh = r.get("original_height")
         if ow and oh:
-            W, H = int(ow), int(oh)
-            break
-    if W is None or H is None:
-        # Fallback: read first frame
-        import cv2
-        img = cv2.imread(str(frames[0]))
-        H, W = img.shape[:2]
+            return int(oh), int(ow)
+    return None
+
+
+def parse_task(
+    task: Dict[str, Any],
+    frame_count: int,
+    frame_size: Optional[Tuple[int, int]] = None,  # (height, width), used if results carry no resolution
+) -> ParsedPrompts:
+    prompts = ParsedPrompts()
+    results = _task_results(task)
+    if not results:
+        return prompts
+
+    # We assume uniform resolution across frames
+    size = _task_resolution(results) or frame_size
+    if size is None:
+        raise ValueError("Cannot determine frame resolution for task.")
+    H, W = size
 
     def clamp_frame_index(fr: int) -> int:
         # Normalize frames: many exports are 0-based; our file names start at 1-based.
         # If out of range, clamp.
         if fr <= 0:
             return 1
-        if fr > len(frames):
-            return len(frames)
+        if fr > frame_count:
+            return frame_count
         return fr
 
     for r in results:
@@ -150,10 +241,78 @@ def parse_labelstudio_export(ls_json_path: str, frames_dir: str, frame_ext: str
             # RLE decode
             rle = val.get("rle")
             if rle:
-                mask = _decode_rle(rle, height=H, width=W)
+                try:
+                    mask = _decode_rle(rle, height=H, width=W)
+                except ValueError as e:
+                    raise ValueError(f"Cannot decode brush mask '{r.get('id', '?')}' on frame {fr}: {e}")
                 prompts.masks.append(MaskPrompt(frame=frame_idx, mask=mask.astype(np.uint8), label=label))
             else:
                 # TODO: polygon to raster if provided
                 pass
 
-    return prompts
\ No newline at end of file
+    return prompts
+
+
+def _parse_task_entry(task: Dict[str, Any], index: int, frame_count: int,
+                      frame_size: Optional[Tuple[int, int]]) -> Tuple[str, ParsedPrompts]:
+    return str(task.get("id", index)), parse_task(task, frame_count, frame_size)
+
+
+def iter_labelstudio_task_prompts(
+    ls_json_path: str,
+    frame_count: int,
+    frame_size: Optional[Tuple[int, int]] = None,
+    workers: int = 1,
+) -> Iterator[Tuple[Dict[str, Any], str, ParsedPrompts]]:
+    """
+    Stream (task, task_id, ParsedPrompts) for every task with annotations, in export order. With
+    workers > 1, tasks are parsed in a process pool with at most 2 * workers tasks in flight.
+    """
+    tasks = ((i, t) for i, t in enumerate(iter_labelstudio_tasks(ls_json_path)) if t.get("annotations"))
+    if workers <= 1:
+        for i, t in tasks:
+            yield (t,) + _parse_task_entry(t, i, frame_count, frame_size)
+        return
+
+    pending: Deque[Tuple[Dict[str, Any], Future]] = deque()
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        for i, t in tasks:
+            pending.append((t, pool.submit(_parse_task_entry, t, i, frame_count, frame_size)))
+            if len(pending) >= 2 * workers:
+                t, fut = pending.popleft()
+                yield (t,) + fut.result()
+        while pending:
+            t, fut = pending.popleft()
+            yield (t,) + fut.result()
+
+
+def parse_labelstudio_export(
+    ls_json_path: str,
+    frames_dir: str,
+    frame_ext: str = "png",
+    frame_count: Optional[int] = None,
+    frame_size: Optional[Tuple[int, int]] = None,  # (height, width)
+) -> ParsedPrompts:
+    # frame_count/frame_size let callers with a non-directory frame source (e.g. a video) skip the glob.
+    frames = None
+    if frame_count is None:
+        frames = sorted(Path(frames_dir).glob(f"*.{frame_ext}"))
+        frame_count = len(frames)
+    if not frame_count:
+        raise ValueError("No frames found in frames_dir.")
+
+    # Strategy: take first task with annotations (the export is only read up to that task)
+    task = next((t for t in iter_labelstudio_tasks(ls_json_path) if t.get("annotations")), None)
+    if task is None:
+        return ParsedPrompts()
+
+    if frame_size is None and _task_resolution(_task_results(task)) is None:
+        # Fallback: read first frame
+        import cv2
+        if frames is None:
+            frames = sorted(Path(frames_dir).glob(f"*.{frame_ext}"))
+        img = cv2.imread(str(frames[0]))
+        frame_size = img.shape[:2]
+
+    return parse_task(task, frame_count, frame_size)
@@ -0,0 +1,48 @@
+import importlib
+import threading
+import time
+from typing import Dict
+
+_import_times: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+class LazyModule:
+    """
+    Stands in for a heavy module until an attribute is first used, then imports it. Importing
+    the app (a replica that only serves status and stored files, a worker that has not leased a
+    job yet) then does not pay for the module. Attributes are cached on the stand-in once
+    looked up, so later accesses cost what they cost on the module; only use it for modules
+    whose attributes are not reassigned after import.
+    """
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_lazy_name", name)
+        object.__setattr__(self, "_lazy_module", None)
+
+    def _load(self):
+        with _lock:
+            if self._lazy_module is None:
+                t0 = time.perf_counter()
+                module = importlib.import_module(self._lazy_name)
+                _import_times[self._lazy_name] = round(time.perf_counter() - t0, 3)
+                object.__setattr__(self, "_lazy_module", module)
+        return self._lazy_module
+
+    def __getattr__(self, attr: str):
+        value = getattr(self._load(), attr)
+        object.__setattr__(self, attr, value)
+        return value
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._lazy_module is not None else "not loaded"
+        return f"<lazy module {self._lazy_name!r} ({state})>"
+
+
+def import_times() -> Dict[str, float]:
+    # Seconds each lazy module took to import, for the modules imported so far
+    with _lock:
+        return dict(_import_times)
+
+
+cv2 = LazyModule("cv2")
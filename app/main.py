@@ -1,24 +1,43 @@
 import os
-import io
+import re
+import asyncio
+import time
 import json
 import shutil
 import zipfile
 import uuid
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
-import cv2
 import numpy as np
-from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks, HTTPException
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
+from fastapi import FastAPI, Form, HTTPException, Header, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
 
 from app.config import settings
+from app.lazy_imports import cv2
 from app.video_utils import extract_frames_from_video, validate_frame_zip, ensure_zero_padded_names
-from app.labelstudio_parser import parse_labelstudio_export
-from app.sam2_infer import SAM2VideoPropagator, PropagationResult
-from app.progress import JobManager
+from app.labelstudio_parser import iter_labelstudio_task_prompts
+from app.progress import TERMINAL_STATUSES, owner_alive, process_owner
+from app.scheduler import JobScheduler, QueueFull
+from app.frame_source import FrameSource, VideoFrameSource
+from app.manifest import MANIFEST_NAME, FrameManifest, build_frames_manifest, video_manifest
+from app.overlay import BytesLRU, OverlayRenderer
+from app.export import etag_matches, export_etag, stream_export
+from app.mask_store import HEADER_NAME as MASK_STORE_HEADER, MASK_MODES, MaskStore, label_dirname
+from app.runner import (
+    CHECKPOINT, OUTPUTS, UPLOADS, JobRunner, job_paths, load_prompts, open_content_store, open_job_frames, open_job_store,
+    open_predictor_pool, open_segment_pool, open_work_queue,
+)
+from app.uploads import ReceivedUpload, UploadTooLarge, append_chunk, hash_file, receive_upload, safe_filename
+from app.cas import COMPLETE_MARKER, link_or_copy
+from app.metrics import PROFILE_NAME, StageTimer, registry
+from app.sysinfo import current_rss_bytes
+from app.readiness import Readiness
 
 app = FastAPI(title="SAM2 Mask Prop", version="1.0.0")
 
@@ -30,40 +49,176 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Static files (frontend)
-app.mount("/", StaticFiles(directory="web", html=True), name="web")
-
-DATA_ROOT = Path(settings.DATA_ROOT).resolve()
-UPLOADS = DATA_ROOT / "uploads" / "jobs"
-OUTPUTS = DATA_ROOT / "outputs" / "jobs"
-CHECKPOINT = Path(settings.SAM2_CHECKPOINT) if settings.SAM2_CHECKPOINT else None
+MAX_UPLOAD_BYTES = settings.MAX_UPLOAD_MB * 1024 * 1024
+# Uploads are received here and renamed into their job (same filesystem as UPLOADS)
+INCOMING = UPLOADS.parent / "incoming"
 
 UPLOADS.mkdir(parents=True, exist_ok=True)
+INCOMING.mkdir(parents=True, exist_ok=True)
 OUTPUTS.mkdir(parents=True, exist_ok=True)
 
-jobs = JobManager()
+jobs = open_job_store()
+scheduler = JobScheduler(jobs, max_workers=settings.MAX_WORKERS, max_queue=settings.MAX_QUEUE_SIZE)
+predictors = open_predictor_pool()
+segments = open_segment_pool(predictors) if settings.EXECUTION_MODE != "worker" else None
+runner = JobRunner(jobs, predictors, segments)
+# With EXECUTION_MODE=worker, jobs go to a durable queue served by `python -m app.worker` processes
+work_queue = open_work_queue() if settings.EXECUTION_MODE == "worker" else None
+if work_queue is not None and settings.JOB_STORE != "sqlite":
+    raise RuntimeError("EXECUTION_MODE=worker needs JOB_STORE=sqlite.")
+# Identical uploads share one copy of the video and its extracted frames (hardlinks)
+content_store = open_content_store()
+# /readyz holds traffic back until the startup model load/warmup is done; without one (or when
+# models run in workers) there is nothing to wait for
+readiness = Readiness(required=work_queue is None and (settings.PREDICTOR_PRELOAD or settings.WARMUP_ON_STARTUP))
+
+
+@app.on_event("shutdown")
+def stop_scheduler():
+    scheduler.shutdown()
+    if segments is not None:
+        segments.shutdown()
+    jobs.flush()
+
+
+@app.on_event("startup")
+def recover_jobs():
+    # Jobs left queued/running by a process that is gone (restart, crash) are queued again here.
+    # Worker mode needs no recovery: expired worker leases put jobs back in the durable queue.
+    if work_queue is not None:
+        return
+    for job in jobs.claim_orphans(process_owner()):
+        job_id, params = job["job_id"], job.get("params")
+        if not params:
+            jobs.update(job_id, status="failed", message="Interrupted by a restart.")
+            continue
+        try:
+            scheduler.submit(job_id, lambda j=job_id, pa=params: runner.run(j, pa, should_stop=scheduler.stopping.is_set),
+                             priority=params.get("priority", 0))
+            jobs.update(job_id, message="Requeued after restart.")
+        except (QueueFull, ValueError) as e:
+            jobs.update(job_id, status="failed", message=f"Not requeued after restart: {e}")
+
+
+def _model_key() -> Dict[str, str]:
+    return dict(model_type=settings.SAM2_MODEL_TYPE, checkpoint_path=str(CHECKPOINT) if CHECKPOINT else "",
+                device=settings.DEVICE)
+
+
+def _warm_model() -> Dict[str, Any]:
+    # Warm whatever runs the jobs: the segment processes, or the pooled predictor
+    return (segments if segments is not None else predictors).warmup(**_model_key())
+
+
+@app.on_event("startup")
+def preload_predictor():
+    # In the background: the process answers /healthz (and serves files and status) meanwhile
+    if work_queue is not None:
+        return
+    if settings.WARMUP_ON_STARTUP:
+        readiness.start(_warm_model)
+    elif settings.PREDICTOR_PRELOAD:
+        readiness.start(lambda: dict(load_time_s=round(predictors.preload(**_model_key()), 3)))
+
+
+@app.get("/healthz")
+def healthz():
+    # Liveness only: never touches the model
+    return {"status": "ok"}
 
 
-def _job_paths(job_id: str) -> Dict[str, Path]:
-    job_root_u = UPLOADS / job_id
-    job_root_o = OUTPUTS / job_id
-    return dict(
-        job_id=job_id,
-        upload_root=job_root_u,
-        output_root=job_root_o,
-        video_dir=job_root_u / "video",
-        frames_dir=job_root_u / "frames",
-        ls_dir=job_root_u / "labelstudio",
-        masks_dir=job_root_o / "masks",
-        overlays_dir=job_root_o / "overlays",
-        export_zip=job_root_o / "export.zip",
-    )
+@app.get("/readyz")
+def readyz():
+    body = readiness.status()
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
+@app.post("/api/warmup")
+def warmup():
+    if work_queue is not None:
+        raise HTTPException(409, "Models run in the workers (EXECUTION_MODE=worker); set WARMUP_ON_STARTUP for them.")
+    readiness.start(_warm_model)
+    return JSONResponse(readiness.status(), status_code=202)
+
+
+# Frame sources opened for serving, kept per job so their decoded-frame LRU survives between requests
+_frame_sources: "OrderedDict[str, FrameSource]" = OrderedDict()
+_frame_sources_lock = threading.Lock()
+_FRAME_SOURCES_MAX = 8
+
+
+def _frame_source(job_id: str) -> Optional[FrameSource]:
+    with _frame_sources_lock:
+        src = _frame_sources.get(job_id)
+        if src is not None:
+            _frame_sources.move_to_end(job_id)
+            return src
+    src = open_job_frames(job_id)
+    if src is None:
+        return None
+    with _frame_sources_lock:
+        _frame_sources[job_id] = src
+        while len(_frame_sources) > _FRAME_SOURCES_MAX:
+            _frame_sources.popitem(last=False)[1].close()
+    return src
+
+
+def _forget_frame_source(job_id: str):
+    with _frame_sources_lock:
+        src = _frame_sources.pop(job_id, None)
+    if src is not None:
+        src.close()
+
+
+_mask_stores: Dict[str, Any] = {}
+_mask_stores_lock = threading.Lock()
+
+
+def _mask_store(job_id: str) -> Optional[MaskStore]:
+    # Opened stores are cached until their header changes (a new propagation run recreates it)
+    header = job_paths(job_id)["masks_dir"] / MASK_STORE_HEADER
+    try:
+        st = header.stat()
+    except FileNotFoundError:
+        return None
+    version = (st.st_ino, st.st_mtime_ns)
+    with _mask_stores_lock:
+        cached = _mask_stores.get(job_id)
+        if cached and cached[0] == version:
+            return cached[1]
+    store = MaskStore.open(header.parent)
+    with _mask_stores_lock:
+        _mask_stores[job_id] = (version, store)
+    return store
+
+
+def _load_mask(job_id: str, name: str, label: Optional[str] = None):
+    """
+    (uint8 mask, version) for a mask PNG name, from the mask store or the PNG on disk; None if
+    missing. With label, that object's 0/255 mask instead of the job's mask view.
+    """
+    store = _mask_store(job_id)
+    if store is not None:
+        idx = store.frame_index(name)
+        k = store.label_index(label) if label is not None else None
+        if idx is None or not store.written()[idx] or (label is not None and k is None):
+            return None
+        return store.mask_image(idx, k), store.signature()
+    masks_dir = job_paths(job_id)["masks_dir"]
+    path = (masks_dir / label_dirname(label) if label is not None else masks_dir) / (Path(name).stem + ".png")
+    if not path.exists():
+        return None
+    return cv2.imread(str(path), cv2.IMREAD_GRAYSCALE), path.stat().st_mtime_ns
+
+
+overlay_renderer = OverlayRenderer(alpha=0.4)
+overlay_cache = BytesLRU(settings.OVERLAY_CACHE_MB * 1024 * 1024)
 
 
 @app.post("/api/new_job")
 def new_job():
     job_id = uuid.uuid4().hex[:8]
-    p = _job_paths(job_id)
+    p = job_paths(job_id)
     for k, d in p.items():
         if k.endswith("_dir") or k.endswith("_root"):
             Path(d).mkdir(parents=True, exist_ok=True)
@@ -71,88 +226,345 @@ def new_job():
     return {"job_id": job_id}
 
 
-@app.post("/api/upload_video")
-async def upload_video(job_id: str = Form(...), file: UploadFile = File(...)):
-    p = _job_paths(job_id)
-    if not (UPLOADS / job_id).exists():
-        raise HTTPException(400, "Invalid job_id. Create a job first.")
-
-    # Save video file
-    video_path = p["video_dir"] / file.filename
-    with open(video_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+def _record_ingest(job_id: str, timings: StageTimer, started: float):
+    # Upload-side stage times go to meta.ingest (kept across runs) and to /metrics
+    stages = timings.summary()
+    job = jobs.get(job_id) or {}
+    meta = dict(job.get("meta") or {}, ingest=dict(seconds=round(time.perf_counter() - started, 3), stages=stages))
+    jobs.update(job_id, meta=meta)
+    registry.observe_stages(stages, phase="ingest")
 
-    # Extract frames
-    frames_dir = p["frames_dir"]
-    frames_dir.mkdir(parents=True, exist_ok=True)
-    count = extract_frames_from_video(str(video_path), str(frames_dir), ext=settings.FRAME_EXT)
-    if count == 0:
-        raise HTTPException(400, "Failed to extract frames from video.")
 
-    ensure_zero_padded_names(frames_dir)
+def _unlink_frames(frames_dir: Path):
+    # Unlink rather than overwrite: the files may be hardlinks shared with other jobs
+    if frames_dir.exists():
+        for fp in frames_dir.iterdir():
+            if fp.is_file():
+                fp.unlink()
 
-    return {"message": "Video uploaded and frames extracted.", "frame_count": count}
 
+def _link_shared_frames(job_id: str, key: str, build) -> int:
+    """
+    Replace the job's frames with the content store entry `key`, building the entry with
+    build(dir) -> frame count if no job has produced it yet. Returns the frame count. The old
+    frames are removed only once the new ones are built, so a failed build leaves them as they were.
+    """
+    frames_dir = job_paths(job_id)["frames_dir"]
+    frames_dir.mkdir(parents=True, exist_ok=True)
+    if content_store is None:
+        staging = frames_dir.with_name(f".{frames_dir.name}.{uuid.uuid4().hex[:8]}.tmp")
+        staging.mkdir()
+        try:
+            count = build(staging)
+            _unlink_frames(frames_dir)
+            for fp in staging.iterdir():
+                fp.replace(frames_dir / fp.name)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return count
+    # The new entry is held under a pending reference while it is built; the job keeps its old one
+    pending = f"{job_id}:pending"
+    try:
+        if content_store.acquire(pending, "frames", key):
+            jobs.update(job_id, message="Reusing frames of an identical upload...")
+        else:
+            content_store.put("frames", key, build)
+        content_store.acquire(job_id, "frames", key)
+    finally:
+        content_store.release(pending, "frames")
+    _unlink_frames(frames_dir)
+    count = 0
+    for fp in sorted(content_store.path("frames", key).iterdir()):
+        if fp.is_file() and fp.name != COMPLETE_MARKER:
+            link_or_copy(fp, frames_dir / fp.name)
+            count += fp.name != MANIFEST_NAME
+    return count
+
+
+def _index_frames(frames_dir: Path, timings: StageTimer) -> FrameManifest:
+    # Built right after the frames are written, so a content store entry holds it with its frames
+    with timings.stage("frame_manifest"):
+        manifest = build_frames_manifest(frames_dir, settings.FRAME_EXT)
+    if manifest is None:
+        raise HTTPException(400, "No frames found.")
+    manifest.save(frames_dir)
+    return manifest
+
+
+def _dedupe_video(job_id: str, video_path: Path, sha256: str):
+    # Keep one copy per distinct upload: the job's file becomes a hardlink to the shared copy
+    if content_store is None:
+        return
+    if not content_store.acquire(job_id, "videos", sha256):
+        content_store.put("videos", sha256, lambda d: link_or_copy(video_path, d / ("video" + video_path.suffix.lower())))
+    shared = next(fp for fp in content_store.path("videos", sha256).iterdir() if fp.name != COMPLETE_MARKER)
+    link_or_copy(shared, video_path)
+
+
+def _ingest_video(job_id: str, video_path: Path, sha256: str, timings: StageTimer, started: float) -> int:
+    _forget_frame_source(job_id)
+    with timings.stage("dedupe"):
+        _dedupe_video(job_id, video_path, sha256)
+    if settings.VIDEO_FRAME_MODE == "decode":
+        # Frames are decoded on demand from the video; nothing is written to frames_dir
+        try:
+            with timings.stage("video_probe"):
+                src = VideoFrameSource(video_path, ext=settings.FRAME_EXT, cache_size=0)
+        except IOError:
+            raise HTTPException(400, "Failed to open video.")
+        try:
+            count = len(src)
+            manifest = video_manifest(video_path, count, *src.shape(), src.codec(), ext=settings.FRAME_EXT) if count else None
+        except IOError:  # the first frame does not decode
+            manifest = None
+        finally:
+            src.close()
+        if manifest is None:
+            raise HTTPException(400, "Failed to read frames from video.")
+        # Recorded where extracted frames would go; opening the job's frames then needs no probing
+        manifest.save(job_paths(job_id)["frames_dir"])
+        _record_ingest(job_id, timings, started)
+        return count
 
-@app.post("/api/upload_frames_zip")
-async def upload_frames_zip(job_id: str = Form(...), file: UploadFile = File(...)):
-    p = _job_paths(job_id)
-    if not (UPLOADS / job_id).exists():
+    # Extract frames
+    jobs.update(job_id, status="ingesting", progress=0, message="Extracting frames...")
+
+    def on_progress(done: int, total: int):
+        pct = int(100.0 * done / total) if total else 0
+        jobs.update(job_id, progress=pct, message=f"Extracted {done}/{total} frames")
+
+    def extract(out_dir: Path) -> int:
+        count = extract_frames_from_video(
+            str(video_path),
+            str(out_dir),
+            ext=settings.FRAME_EXT,
+            workers=settings.EXTRACT_WORKERS or (os.cpu_count() or 1),
+            writer_threads=settings.EXTRACT_WRITER_THREADS,
+            png_compression=settings.FRAME_PNG_COMPRESSION,
+            jpeg_quality=settings.FRAME_JPEG_QUALITY,
+            progress_cb=on_progress,
+            timings=timings,
+        )
+        if count == 0:
+            jobs.update(job_id, status="created", progress=0, message="Frame extraction failed.")
+            raise HTTPException(400, "Failed to extract frames from video.")
+        # Extraction already writes zero-padded names: no rename pass
+        return _index_frames(out_dir, timings).count
+
+    # Frames depend on the video bytes and on how they are encoded
+    key = f"{sha256}-{settings.FRAME_EXT}" + (f"-q{settings.FRAME_JPEG_QUALITY}" if settings.FRAME_EXT == "jpg" else "")
+    count = _link_shared_frames(job_id, key, extract)
+    jobs.update(job_id, status="created", progress=0, message=f"Extracted {count} frames.")
+    _record_ingest(job_id, timings, started)
+    return count
+
+
+async def _receive_upload(request: Request, *fields: str, digest: bool = True) -> ReceivedUpload:
+    """
+    Read an upload form with a file and the given text fields (job_id first, which must name an
+    existing job). Any failure discards the received file.
+    """
+    try:
+        upload = await receive_upload(request, INCOMING, max_bytes=MAX_UPLOAD_BYTES, chunk_size=settings.UPLOAD_CHUNK_BYTES,
+                                      digest=digest)
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
+    except ValueError as e:
+        raise HTTPException(400, f"Invalid upload: {e}")
+    missing = [f for f in fields if f not in upload.fields] + (["file"] if upload.path is None else [])
+    if missing:
+        upload.discard()
+        raise HTTPException(422, f"Missing form field(s): {', '.join(missing)}.")
+    if not (UPLOADS / upload.fields["job_id"]).exists():
+        upload.discard()
         raise HTTPException(400, "Invalid job_id. Create a job first.")
+    return upload
 
-    frames_dir = p["frames_dir"]
-    frames_dir.mkdir(parents=True, exist_ok=True)
-    tmp_zip = frames_dir / "frames.zip"
-    with open(tmp_zip, "wb") as f:
-        f.write(await file.read())
 
-    # Extract ZIP
-    with zipfile.ZipFile(tmp_zip, "r") as zf:
-        zf.extractall(frames_dir)
-    tmp_zip.unlink(missing_ok=True)
+def _upload_form(*fields: str) -> Dict[str, Any]:
+    # OpenAPI description of a form read by _receive_upload (FastAPI does not see the body)
+    props = {f: {"type": "string"} for f in fields}
+    props["file"] = {"type": "string", "format": "binary"}
+    schema = {"type": "object", "properties": props, "required": list(props)}
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": schema}}}}
 
-    # Validate frame files
-    count = validate_frame_zip(frames_dir, ext=settings.FRAME_EXT)
-    if count == 0:
-        raise HTTPException(400, "No frames detected in ZIP. Expected images with zero-padded names.")
 
-    ensure_zero_padded_names(frames_dir)
-    return {"message": "Frames ZIP uploaded and extracted.", "frame_count": count}
+@app.post("/api/upload_video", openapi_extra=_upload_form("job_id"))
+async def upload_video(request: Request):
+    # Save video file
+    started = time.perf_counter()
+    timings = StageTimer()
+    with timings.stage("receive_upload"):
+        upload = await _receive_upload(request, "job_id")
+    job_id, size, sha256 = upload.fields["job_id"], upload.size, upload.sha256
+    video_path = job_paths(job_id)["video_dir"] / safe_filename(upload.filename, "video")
+    video_path.parent.mkdir(parents=True, exist_ok=True)
+    upload.path.replace(video_path)
+
+    count = await run_in_threadpool(_ingest_video, job_id, video_path, sha256, timings, started)
+    return {"message": "Video uploaded and frames extracted.", "frame_count": count, "bytes": size, "sha256": sha256}
+
+
+# Resumable upload for large videos: send consecutive pieces to /chunk (offset = bytes already
+# received, see /status after a dropped connection), then call /complete.
+@app.get("/api/upload_video/status")
+def upload_video_status(job_id: str, filename: str):
+    p = job_paths(job_id)
+    if not (UPLOADS / job_id).exists():
+        raise HTTPException(400, "Invalid job_id. Create a job first.")
+    part = p["video_dir"] / (safe_filename(filename, "video") + ".part")
+    return {"received": part.stat().st_size if part.exists() else 0}
 
 
-@app.post("/api/upload_labelstudio")
-async def upload_labelstudio(job_id: str = Form(...), file: UploadFile = File(...)):
-    p = _job_paths(job_id)
+@app.post("/api/upload_video/chunk", openapi_extra=_upload_form("job_id", "filename", "offset"))
+async def upload_video_chunk(request: Request):
+    # Pieces are not hashed: /complete hashes the assembled file
+    upload = await _receive_upload(request, "job_id", "filename", "offset", digest=False)
+    try:
+        if not upload.fields["offset"].isdigit():
+            raise HTTPException(422, "offset must be a non-negative integer.")
+        part = job_paths(upload.fields["job_id"])["video_dir"] / (safe_filename(upload.fields["filename"], "video") + ".part")
+        part.parent.mkdir(parents=True, exist_ok=True)
+        received = await append_chunk(upload.path, part, int(upload.fields["offset"]), max_bytes=MAX_UPLOAD_BYTES,
+                                      chunk_size=settings.UPLOAD_CHUNK_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+    finally:
+        upload.discard()
+    return {"received": received}
+
+
+@app.post("/api/upload_video/complete")
+async def upload_video_complete(
+    job_id: str = Form(...),
+    filename: str = Form(...),
+    sha256: Optional[str] = Form(None),
+):
+    p = job_paths(job_id)
     if not (UPLOADS / job_id).exists():
         raise HTTPException(400, "Invalid job_id. Create a job first.")
+    video_path = p["video_dir"] / safe_filename(filename, "video")
+    part = video_path.with_name(video_path.name + ".part")
+    if not part.exists():
+        raise HTTPException(400, "No chunks received for this file.")
+    started = time.perf_counter()
+    timings = StageTimer()
+    with timings.stage("hash_upload"):
+        digest = await run_in_threadpool(hash_file, part, settings.UPLOAD_CHUNK_BYTES)
+    if sha256 and sha256.lower() != digest:
+        part.unlink(missing_ok=True)
+        raise HTTPException(400, "Checksum mismatch; upload discarded.")
+    size = part.stat().st_size
+    part.replace(video_path)
+
+    count = await run_in_threadpool(_ingest_video, job_id, video_path, digest, timings, started)
+    return {"message": "Video uploaded and frames extracted.", "frame_count": count, "bytes": size, "sha256": digest}
+
+
+@app.post("/api/upload_frames_zip", openapi_extra=_upload_form("job_id"))
+async def upload_frames_zip(request: Request):
+    # The job's current frames stay until the new ZIP is received, unpacked and validated
+    started = time.perf_counter()
+    timings = StageTimer()
+    with timings.stage("receive_upload"):
+        upload = await _receive_upload(request, "job_id")
+    job_id, tmp_zip, sha256 = upload.fields["job_id"], upload.path, upload.sha256
+
+    def unpack(out_dir: Path) -> int:
+        try:
+            with timings.stage("unzip"), zipfile.ZipFile(tmp_zip, "r") as zf:
+                zf.extractall(out_dir)
+        except zipfile.BadZipFile:
+            raise HTTPException(400, "Not a valid ZIP file.")
+        # Validate frame files
+        with timings.stage("validate_frames"):
+            count = validate_frame_zip(out_dir, ext=settings.FRAME_EXT)
+        if count == 0:
+            raise HTTPException(400, "No frames detected in ZIP. Expected images with zero-padded names.")
+        with timings.stage("rename_frames"):
+            ensure_zero_padded_names(out_dir)
+        return _index_frames(out_dir, timings).count
 
-    ls_dir = p["ls_dir"]
-    ls_dir.mkdir(parents=True, exist_ok=True)
-    ls_path = ls_dir / file.filename
-    with open(ls_path, "wb") as f:
-        f.write(await file.read())
+    try:
+        count = await run_in_threadpool(_link_shared_frames, job_id, f"zip-{sha256}-{settings.FRAME_EXT}", unpack)
+    finally:
+        tmp_zip.unlink(missing_ok=True)
+    _forget_frame_source(job_id)
+    _record_ingest(job_id, timings, started)
+    return {"message": "Frames ZIP uploaded and extracted.", "frame_count": count, "sha256": sha256}
 
-    # Light validation
+
+@app.post("/api/upload_labelstudio", openapi_extra=_upload_form("job_id"))
+async def upload_labelstudio(request: Request):
+    upload = await _receive_upload(request, "job_id")
+
+    # Light validation: only check the top-level shape, the full document is parsed at propagation time
     try:
-        with open(ls_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if not isinstance(data, list):
+        with open(upload.path, "r", encoding="utf-8") as f:
+            head = f.read(4096).lstrip("\ufeff \t\r\n")
+        if not head.startswith("["):
             raise ValueError("Expected a list of tasks.")
     except Exception as e:
+        upload.discard()
         raise HTTPException(400, f"Invalid Label Studio JSON: {e}")
 
+    ls_dir = job_paths(upload.fields["job_id"])["ls_dir"]
+    ls_dir.mkdir(parents=True, exist_ok=True)
+    upload.path.replace(ls_dir / safe_filename(upload.filename, "export.json"))
     return {"message": "Label Studio export uploaded."}
 
 
+def _is_active(job_id: str) -> bool:
+    if work_queue is not None:
+        return work_queue.is_active(job_id)
+    if scheduler.is_active(job_id):
+        return True
+    # Queued or running in another live API process sharing the job store
+    job = jobs.get(job_id)
+    return bool(job) and job["status"] in ("queued", "running") and job.get("owner") != process_owner() and owner_alive(job.get("owner"))
+
+
+def _queue_position(job_id: str) -> Optional[int]:
+    return work_queue.position(job_id) if work_queue is not None else scheduler.position(job_id)
+
+
+def _submit(job_id: str, params: Dict[str, Any], prompts=None, timings: Optional[StageTimer] = None) -> int:
+    # Inline jobs keep their parsed prompts (and the time parsing took); workers re-parse them from params
+    priority = params.get("priority", 0)
+    if work_queue is None:
+        jobs.update(job_id, params=params)
+        return scheduler.submit(job_id, lambda: runner.run(job_id, params, prompts, should_stop=scheduler.stopping.is_set,
+                                                           timings=timings), priority=priority)
+    prev = jobs.get(job_id)
+    # Mark queued first: a worker may pick the job up the moment it is in the queue
+    jobs.update(job_id, params=params, status="queued", progress=0, message="Queued", cancel_requested=False, owner=None)
+    try:
+        return work_queue.submit(job_id, params, priority=priority)
+    except Exception:
+        jobs.update(job_id, status=prev["status"], message=prev["message"])
+        raise
+
+
+def _labels_mode(value: str) -> str:
+    mode = value or settings.MASK_OUTPUT_MODE
+    if mode not in MASK_MODES:
+        raise HTTPException(400, f"Invalid labels_mode {mode!r}; expected one of {', '.join(MASK_MODES)}.")
+    return mode
+
+
 @app.post("/api/propagate")
 def propagate(
-    background_tasks: BackgroundTasks,
     job_id: str = Form(...),
-    labels_mode: str = Form("composite"),  # or 'per_label'
+    labels_mode: str = Form(""),  # single | composite | per_label; default MASK_OUTPUT_MODE
+    priority: int = Form(0),  # lower runs first
+    profile: bool = Form(False),  # cProfile this job (needs ENABLE_PROFILING), see /api/profile/{job_id}
 ):
-    p = _job_paths(job_id)
-    frames_dir: Path = p["frames_dir"]
+    labels_mode = _labels_mode(labels_mode)
+    if profile and not settings.ENABLE_PROFILING:
+        raise HTTPException(400, "Profiling is disabled; set ENABLE_PROFILING=true.")
+    p = job_paths(job_id)
     ls_dir: Path = p["ls_dir"]
     masks_dir: Path = p["masks_dir"]
     overlays_dir: Path = p["overlays_dir"]
@@ -160,19 +572,17 @@ def propagate(
     overlays_dir.mkdir(parents=True, exist_ok=True)
 
     # Check inputs
-    if not frames_dir.exists() or len(list(frames_dir.glob(f"*.{settings.FRAME_EXT}"))) == 0:
+    source = _frame_source(job_id)
+    if source is None or len(source) == 0:
         raise HTTPException(400, "No frames found. Upload a video or frames ZIP first.")
-    ls_files = list(ls_dir.glob("*.json"))
-    if not ls_files:
+    if not list(ls_dir.glob("*.json")):
         raise HTTPException(400, "No Label Studio export found. Upload a JSON export first.")
 
     # Parse Label Studio prompts
+    timings = StageTimer()
     try:
-        prompts = parse_labelstudio_export(
-            ls_json_path=str(ls_files[0]),
-            frames_dir=str(frames_dir),
-            frame_ext=settings.FRAME_EXT,
-        )
+        with timings.stage("parse_prompts"):
+            prompts = load_prompts(job_id, {}, source)
         if prompts.is_empty():
             raise ValueError("No usable prompts found in Label Studio export.")
     except Exception as e:
@@ -181,36 +591,116 @@ def propagate(
     job = jobs.get(job_id)
     if not job:
         raise HTTPException(400, "Invalid job_id.")
+    if _is_active(job_id):
+        raise HTTPException(409, "Job is already queued or running.")
 
-    # Run propagation in background
-    def task():
-        try:
-            jobs.update(job_id, status="running", progress=0, message="Initializing SAM2 model...")
-            propagator = SAM2VideoPropagator(
-                model_type=settings.SAM2_MODEL_TYPE,
-                checkpoint_path=str(CHECKPOINT) if CHECKPOINT else "",
-                device=settings.DEVICE,
-            )
-            jobs.update(job_id, message="Loading frames...")
-            frame_paths = sorted(frames_dir.glob(f"*.{settings.FRAME_EXT}"))
-            result: PropagationResult = propagator.propagate(
-                frame_paths=frame_paths,
-                prompts=prompts,
-                labels_mode=labels_mode,
-                progress_cb=lambda p, msg=None: jobs.update(job_id, progress=p, message=msg or ""),
-                output_masks_dir=str(masks_dir),
-                output_overlays_dir=str(overlays_dir),
-            )
-            jobs.update(job_id, status="completed", progress=100, message="Propagation complete.", meta=dict(
-                frame_count=len(frame_paths),
-                objects=len(result.object_labels),
-            ))
-        except Exception as e:
-            jobs.update(job_id, status="failed", message=str(e))
-
-    background_tasks.add_task(task)
-    jobs.update(job_id, status="queued", progress=0, message="Queued")
-    return {"message": "Propagation started.", "job_id": job_id}
+    try:
+        params = dict(labels_mode=labels_mode, priority=priority)
+        if profile:
+            params["profile"] = True
+        position = _submit(job_id, params, prompts, timings)
+    except QueueFull as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "30"})
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+    return {"message": "Propagation queued.", "job_id": job_id, "queue_position": position}
+
+
+@app.post("/api/propagate_batch")
+def propagate_batch(
+    job_id: str = Form(...),
+    labels_mode: str = Form(""),
+    priority: int = Form(0),
+):
+    """
+    One child job per annotated task of the uploaded export. The export is parsed as a stream
+    (tasks fanned out over PARSE_WORKERS processes) and each child is queued as soon as its task
+    is parsed. Children share the parent's frames, get their own one-task export, and have their
+    own outputs.
+    """
+    labels_mode = _labels_mode(labels_mode)
+    p = job_paths(job_id)
+    if not jobs.get(job_id):
+        raise HTTPException(400, "Invalid job_id.")
+    source = _frame_source(job_id)
+    if source is None or len(source) == 0:
+        raise HTTPException(400, "No frames found. Upload a video or frames ZIP first.")
+    ls_files = list(p["ls_dir"].glob("*.json"))
+    if not ls_files:
+        raise HTTPException(400, "No Label Studio export found. Upload a JSON export first.")
+
+    workers = settings.PARSE_WORKERS or os.cpu_count() or 1
+    queued: List[Dict[str, Any]] = []
+    skipped = 0
+    unqueued = 0
+    try:
+        for task, task_id, prompts in iter_labelstudio_task_prompts(str(ls_files[0]), len(source), source.shape(),
+                                                                    workers=workers):
+            if prompts.is_empty():
+                skipped += 1
+                continue
+            if unqueued:
+                unqueued += 1
+                continue
+            child_id = f"{job_id}-t{re.sub(r'[^A-Za-z0-9_-]', '_', task_id)}"
+            if _is_active(child_id):
+                skipped += 1
+                continue
+            _link_child_job(job_id, child_id)
+            _save_child_task(child_id, task)
+            params = dict(labels_mode=labels_mode, priority=priority, parent_job=job_id, task_id=task_id)
+            jobs.create(child_id)
+            jobs.update(child_id, meta=dict(parent_job=job_id, task_id=task_id))
+            try:
+                position = _submit(child_id, params, prompts)
+            except QueueFull:
+                jobs.update(child_id, status="failed", message="Queue is full; resubmit the batch.")
+                unqueued += 1
+                continue
+            queued.append({"job_id": child_id, "task_id": task_id, "queue_position": position})
+    except ValueError as e:
+        if not queued:
+            raise HTTPException(400, f"Failed to parse Label Studio export: {e}")
+        jobs.update(job_id, message=f"Label Studio export parse stopped: {e}")
+    if not queued:
+        if unqueued:
+            raise HTTPException(429, "Job queue is full.", headers={"Retry-After": "30"})
+        raise HTTPException(400, "No usable prompts found in Label Studio export.")
+    return {"message": f"Queued {len(queued)} task job(s).", "jobs": queued, "skipped": skipped, "unqueued": unqueued}
+
+
+def _link_child_job(parent_id: str, child_id: str):
+    """
+    Child jobs get hardlinks to the parent's frames and video (no copies) and references to the
+    parent's content store entries, so they keep working after the parent is deleted.
+    """
+    parent, child = job_paths(parent_id), job_paths(child_id)
+    for k in ("upload_root", "masks_dir", "overlays_dir"):
+        child[k].mkdir(parents=True, exist_ok=True)
+    _forget_frame_source(child_id)
+    for k in ("frames_dir", "video_dir"):
+        d = child[k]
+        d.mkdir(exist_ok=True)
+        for fp in d.iterdir():
+            if fp.is_file():
+                fp.unlink()
+        if parent[k].exists():
+            for fp in parent[k].iterdir():
+                if fp.is_file() and not fp.name.endswith(".part"):
+                    link_or_copy(fp, d / fp.name)
+    if content_store is not None:
+        content_store.share(parent_id, child_id)
+
+
+def _save_child_task(child_id: str, task: Dict[str, Any]):
+    # The child's task as its own one-task export, so it never re-reads the parent's
+    ls_dir = job_paths(child_id)["ls_dir"]
+    ls_dir.mkdir(parents=True, exist_ok=True)
+    for fp in ls_dir.glob("*.json"):
+        fp.unlink()
+    tmp = ls_dir / "task.json.part"
+    tmp.write_text(json.dumps([task]), encoding="utf-8")
+    tmp.replace(ls_dir / "task.json")
 
 
 @app.get("/api/status/{job_id}")
@@ -218,57 +708,268 @@ def status(job_id: str):
     job = jobs.get(job_id)
     if not job:
         raise HTTPException(404, "Job not found.")
+    job["queue_position"] = _queue_position(job_id)
     return job
 
 
+_EVENT_MAX_MASKS = 1000
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/api/events/{job_id}")
+async def job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events for one job. Job state is sampled every EVENTS_MIN_INTERVAL seconds and
+    sent only when it changed ("status"), together with the masks of frames finished since the
+    last message ("frames"). The stream ends after a terminal status.
+    """
+    if not await run_in_threadpool(jobs.get, job_id):
+        raise HTTPException(404, "Job not found.")
+    interval = max(0.05, settings.EVENTS_MIN_INTERVAL)
+
+    def mask_urls(start: int, end: int) -> Optional[List[str]]:
+        # Mask URLs only for modest batches; clients re-list after a large jump
+        src = _frame_source(job_id) if end - start <= _EVENT_MAX_MASKS else None
+        return [f"/data/{job_id}/masks/{Path(src.name(i)).stem}.png" for i in range(start, end)] if src else None
+
+    def poll(version: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+        change = jobs.changes(job_id, version)
+        if change is not None:
+            change[1]["queue_position"] = _queue_position(job_id)
+        return change
+
+    async def stream():
+        # The job store, scheduler and frame source are blocking calls: they run in the threadpool
+        version = 0
+        sent_frames = 0
+        last_write = time.monotonic()
+        yield f"retry: {int(interval * 4000)}\n\n"
+        while not await request.is_disconnected():
+            change = await run_in_threadpool(poll, version)
+            if change is not None:
+                version, state = change
+                done = state["frames_done"]
+                if done < sent_frames:  # a new run started
+                    sent_frames = 0
+                if done > sent_frames:
+                    masks = await run_in_threadpool(mask_urls, sent_frames, done)
+                    yield _sse("frames", {"start": sent_frames, "end": done, "masks": masks})
+                    sent_frames = done
+                yield _sse("status", state)
+                last_write = time.monotonic()
+                if state["status"] in TERMINAL_STATUSES and not await run_in_threadpool(_is_active, job_id):
+                    return
+            elif time.monotonic() - last_write > 15:
+                yield ": keep-alive\n\n"
+                last_write = time.monotonic()
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/api/cancel/{job_id}")
+def cancel(job_id: str):
+    if not jobs.get(job_id):
+        raise HTTPException(404, "Job not found.")
+    if work_queue is not None and work_queue.cancel(job_id):
+        jobs.update(job_id, status="cancelled", message="Cancelled before start.")
+    elif not scheduler.cancel(job_id):
+        # Queued or running in another process: it picks the flag up from the shared store
+        if jobs.get(job_id)["status"] not in ("queued", "running") or not jobs.request_cancel(job_id):
+            raise HTTPException(409, "Job is not queued or running.")
+    return {"message": "Cancellation requested.", "job_id": job_id}
+
+
+@app.delete("/api/jobs/{job_id}")
+def delete_job(job_id: str):
+    # Removes the job's files and state; shared uploads stay until no job references them
+    if not jobs.get(job_id):
+        raise HTTPException(404, "Job not found.")
+    if _is_active(job_id):
+        raise HTTPException(409, "Job is queued or running; cancel it first.")
+    _forget_frame_source(job_id)
+    with _mask_stores_lock:
+        _mask_stores.pop(job_id, None)
+    shutil.rmtree(UPLOADS / job_id, ignore_errors=True)
+    shutil.rmtree(OUTPUTS / job_id, ignore_errors=True)
+    if content_store is not None:
+        content_store.release(job_id)
+    jobs.delete(job_id)
+    return {"message": "Job deleted.", "job_id": job_id}
+
+
+def _page(total: int, offset: int, limit: Optional[int]) -> Tuple[int, int]:
+    # [start, end) of one page of a listing; limit defaults to LIST_PAGE_SIZE
+    limit = settings.LIST_PAGE_SIZE if limit is None else limit
+    start = min(offset, total)
+    return start, min(total, start + limit)
+
+
 @app.get("/api/frames/{job_id}/list")
-def list_frames(job_id: str):
-    p = _job_paths(job_id)
-    frames_dir: Path = p["frames_dir"]
-    if not frames_dir.exists():
+def list_frames(job_id: str, offset: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1)):
+    source = _frame_source(job_id)
+    if source is None:
         raise HTTPException(404, "Frames not found.")
-    frames = [f"/data/{job_id}/frames/{fp.name}" for fp in sorted(frames_dir.glob(f"*.{settings.FRAME_EXT}"))]
-    return {"frames": frames}
+    start, end = _page(len(source), offset, limit)
+    frames = [f"/data/{job_id}/frames/{source.name(i)}" for i in range(start, end)]
+    return {"frames": frames, "total": len(source), "offset": start}
 
 
 @app.get("/api/masks/{job_id}/list")
-def list_masks(job_id: str):
-    p = _job_paths(job_id)
+def list_masks(job_id: str, offset: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1)):
+    p = job_paths(job_id)
     masks_dir: Path = p["masks_dir"]
     if not masks_dir.exists():
         raise HTTPException(404, "Masks not found.")
-    masks = [f"/data/{job_id}/masks/{fp.name}" for fp in sorted(masks_dir.glob("*.png"))]
-    return {"masks": masks}
+    store = _mask_store(job_id)
+    if store is not None:
+        written = np.flatnonzero(store.written())
+        start, end = _page(len(written), offset, limit)
+        masks = [f"/data/{job_id}/masks/{store.frames[i]}.png" for i in written[start:end]]
+        total, labels, mode = len(written), store.labels, store.mode
+    else:
+        names = sorted(fp.name for fp in masks_dir.glob("*.png"))
+        start, end = _page(len(names), offset, limit)
+        masks = [f"/data/{job_id}/masks/{name}" for name in names[start:end]]
+        job = jobs.get(job_id) or {}
+        total = len(names)
+        labels = (job.get("meta") or {}).get("labels") or []
+        mode = (job.get("artifacts") or {}).get("labels_mode")
+    # Per-object masks: append ?label=<label> to a mask URL
+    return {"masks": masks, "total": total, "offset": start, "labels": labels, "labels_mode": mode}
 
 
 @app.get("/api/export/{job_id}")
-def export_masks(job_id: str):
-    p = _job_paths(job_id)
+def export_masks(job_id: str, if_none_match: Optional[str] = Header(None)):
+    p = job_paths(job_id)
     masks_dir: Path = p["masks_dir"]
-    export_zip: Path = p["export_zip"]
     if not masks_dir.exists():
         raise HTTPException(404, "Masks not found.")
-    # Zip masks
-    with zipfile.ZipFile(export_zip, "w", zipfile.ZIP_DEFLATED) as zf:
-        for fp in sorted(masks_dir.glob("*.png")):
-            zf.write(fp, arcname=fp.name)
-    return FileResponse(export_zip, filename=f"{job_id}_masks.zip")
+    store = _mask_store(job_id)
+    etag = export_etag(masks_dir, store)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    filename = f"{job_id}_masks.zip"
+    cached = p["exports_dir"] / f"{etag}.zip"
+    if cached.exists():
+        registry.inc("exports_total", 1, "Mask exports served, by source", source="cache")
+        return FileResponse(cached, filename=filename, headers=headers)
+    # Masks still being written are streamed but not cached: the archive may lag the etag
+    cache_path = None if _is_active(job_id) else cached
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(_timed_export(stream_export(masks_dir, store, cache_path)), media_type="application/zip",
+                             headers=headers)
+
+
+def _timed_export(chunks):
+    # Includes the time the client takes to read the stream, so slow downloads count too
+    started = time.perf_counter()
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        yield chunk
+    registry.inc("exports_total", 1, "Mask exports served, by source", source="stream")
+    registry.inc("export_bytes_total", size, "Bytes of mask archives built")
+    registry.observe("export_seconds", time.perf_counter() - started, "Time to build and send a mask archive")
+
+
+@app.get("/api/profile/{job_id}")
+def download_profile(job_id: str):
+    path = job_paths(job_id)["output_root"] / PROFILE_NAME
+    if not path.exists():
+        raise HTTPException(404, "No profile for this job; submit it with profile=true (needs ENABLE_PROFILING).")
+    return FileResponse(path, filename=f"{job_id}.pstats", media_type="application/octet-stream")
+
+
+@app.get("/metrics")
+def metrics():
+    # Gauges sampled at scrape time; job and stage totals are counted as jobs finish in this process
+    registry.set("queue_length", work_queue.queue_length() if work_queue is not None else scheduler.queue_length(),
+                 "Jobs waiting to run")
+    pool = predictors.stats()
+    registry.set("predictor_pool_size", pool["size"], "Loaded predictors")
+    registry.set("predictor_pool_hits", pool["hits"], "Jobs that reused a loaded predictor")
+    registry.set("predictor_pool_misses", pool["misses"], "Jobs that had to load a predictor")
+    rss = current_rss_bytes()
+    if rss is not None:
+        registry.set("process_resident_bytes", rss, "Resident memory of the API process")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # Static data access for frames and masks (served under /data/{job_id}/...)
 @app.get("/data/{job_id}/frames/{filename}")
 def serve_frame(job_id: str, filename: str):
-    p = _job_paths(job_id)
-    path = p["frames_dir"] / filename
-    if not path.exists():
+    p = job_paths(job_id)
+    path = p["frames_dir"] / Path(filename).name
+    if path.exists() and path.suffix != ".npy":
+        return FileResponse(path)
+    # No browser-readable file on disk: decode from the job's frame source (video-backed or raw .npy frames)
+    source = _frame_source(job_id)
+    idx = source.index_of(filename) if source is not None else None
+    if idx is None:
         raise HTTPException(404, "Frame not found.")
-    return FileResponse(path)
+    ext = Path(filename).suffix.lower()
+    if ext not in (".png", ".jpg", ".jpeg"):
+        ext = ".png"
+    ok, buf = cv2.imencode(ext, source.read(idx))
+    if not ok:
+        raise HTTPException(500, "Failed to encode frame.")
+    return Response(content=buf.tobytes(), media_type="image/png" if ext == ".png" else "image/jpeg")
 
 
 @app.get("/data/{job_id}/masks/{filename}")
-def serve_mask(job_id: str, filename: str):
-    p = _job_paths(job_id)
-    path = p["masks_dir"] / filename
-    if not path.exists():
+def serve_mask(job_id: str, filename: str, label: Optional[str] = None):
+    p = job_paths(job_id)
+    if _mask_store(job_id) is None:
+        masks_dir = p["masks_dir"] / label_dirname(label) if label is not None else p["masks_dir"]
+        path = masks_dir / Path(filename).name
+        if not path.exists():
+            raise HTTPException(404, "Mask not found.")
+        return FileResponse(path)
+    # Materialize the PNG from the mask store on request
+    loaded = _load_mask(job_id, filename, label)
+    if loaded is None:
         raise HTTPException(404, "Mask not found.")
-    return FileResponse(path)
\ No newline at end of file
+    ok, buf = cv2.imencode(".png", loaded[0], [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    if not ok:
+        raise HTTPException(500, "Failed to encode mask.")
+    return Response(content=buf.tobytes(), media_type="image/png")
+
+
+
+@app.get("/data/{job_id}/overlays/{filename}")
+def serve_overlay(job_id: str, filename: str):
+    p = job_paths(job_id)
+    name = Path(filename).name
+    path = p["overlays_dir"] / name
+    if path.exists():
+        return FileResponse(path)
+    # Render lazily from frame + mask; cached by mask version so a re-run invalidates entries
+    source = _frame_source(job_id)
+    idx = source.index_of(f"{Path(name).stem}.{settings.FRAME_EXT}") if source is not None else None
+    loaded = _load_mask(job_id, name) if idx is not None else None
+    if loaded is None:
+        raise HTTPException(404, "Overlay not found.")
+    mask, version = loaded
+    key = (job_id, name, version)
+    data = overlay_cache.get(key)
+    if data is None:
+        frame = source.read(idx)
+        if frame.shape[:2] != mask.shape[:2]:
+            # Masks kept at a reduced processing resolution (PROCESSING_OUTPUT=processing)
+            frame = cv2.resize(frame, (mask.shape[1], mask.shape[0]), interpolation=cv2.INTER_AREA)
+        overlay = overlay_renderer.render(frame, mask)
+        ok, buf = cv2.imencode(".png", overlay, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            raise HTTPException(500, "Failed to encode overlay.")
+        data = buf.tobytes()
+        overlay_cache.put(key, data)
+    return Response(content=data, media_type="image/png")
+
+# Static files (frontend); mounted last so the catch-all "/" does not shadow the API routes above.
+app.mount("/", StaticFiles(directory="web", html=True), name="web")
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from app.video_utils import read_frame
+
+MANIFEST_NAME = "manifest.json"  # written into the job's frames_dir
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class FrameManifest:
+    """
+    What ingest learned about a job's frames, so nothing downstream lists, sorts or decodes them
+    again to find out: frame count, file name per 0-based index, size and codec. kind "frames" is
+    a directory of images (with a content hash per frame); kind "video" frames are decoded on
+    demand from `video` (in the job's video_dir) and carry zero-padded names but no hashes.
+    """
+    kind: str  # "frames" | "video"
+    count: int
+    height: int
+    width: int
+    codec: str  # image extension, or the video's FourCC
+    names: List[str]
+    hashes: Optional[List[str]] = None  # sha1 of each frame file
+    video: Optional[str] = None
+    version: int = MANIFEST_VERSION
+
+    @property
+    def signature(self) -> str:
+        # Changes whenever any frame (or the frame order) does
+        h = hashlib.sha1(f"{self.kind}:{self.count}:{self.height}x{self.width}:{self.codec}:{self.video}\n".encode())
+        for name, digest in zip(self.names, self.hashes or [""] * self.count):
+            h.update(f"{name}:{digest}\n".encode())
+        return h.hexdigest()
+
+    def save(self, frames_dir: Path):
+        # Replaced, not rewritten: the file may be a hardlink shared with other jobs
+        path = Path(frames_dir) / MANIFEST_NAME
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(asdict(self), separators=(",", ":")), encoding="utf-8")
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, frames_dir: Path) -> Optional["FrameManifest"]:
+        try:
+            data = json.loads((Path(frames_dir) / MANIFEST_NAME).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        return cls(**data)
+
+
+def _file_sha1(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def build_frames_manifest(frames_dir: Path, ext: str = "png", workers: int = 0) -> Optional[FrameManifest]:
+    """
+    Manifest of the images in frames_dir (already named by frame number); None if there are none.
+    Files are hashed on `workers` threads (0 = one per CPU core, hashlib releases the GIL), and
+    only the first frame is decoded, for the size.
+    """
+    paths = sorted(Path(frames_dir).glob(f"*.{ext}"))
+    if not paths:
+        return None
+    img = read_frame(paths[0])
+    if img is None:
+        raise IOError(f"Failed to decode frame {paths[0].name}.")
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        hashes = list(pool.map(_file_sha1, paths))
+    return FrameManifest(kind="frames", count=len(paths), height=img.shape[0], width=img.shape[1], codec=ext,
+                         names=[p.name for p in paths], hashes=hashes)
+
+
+def video_manifest(video_path: Path, count: int, height: int, width: int, codec: str, ext: str = "png") -> FrameManifest:
+    # Frames of a video decoded on demand, named like extract_frames_from_video would write them
+    return FrameManifest(kind="video", count=count, height=height, width=width, codec=codec,
+                         names=[f"{i + 1:08d}.{ext}" for i in range(count)], video=Path(video_path).name)
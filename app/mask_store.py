@@ -0,0 +1,251 @@
+import fcntl
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.rle import decode_counts, encode_counts
+
+STORE_FORMAT = "coco-rle-v1"
+HEADER_NAME = "store.json"
+INDEX_NAME = "store.{gen}.idx"
+DATA_NAME = "store.{gen}.dat"
+_GENERATION_FILE = re.compile(r"store\.(\d+)\.(idx|dat)")
+MASK_MODES = ("single", "composite", "per_label")
+
+
+def label_dirname(label: str) -> str:
+    # Directory/archive folder name for one label's masks in per_label mode
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", label).strip(".") or "_"
+
+
+def planes_to_mask(planes: np.ndarray, mode: str) -> np.ndarray:
+    """
+    Single uint8 image for (labels, H, W) planes: the union as 0/255 for "single", label index
+    k+1 otherwise (later labels win on overlap); per_label views use the composite.
+    """
+    if mode == "single":
+        return planes.any(axis=0).astype(np.uint8) * np.uint8(255)
+    out = np.zeros(planes.shape[1:], dtype=np.uint8)
+    for k in range(planes.shape[0]):
+        out[planes[k] > 0] = k + 1
+    return out
+
+
+class MaskStore:
+    """
+    Per-job mask store: one data file of COCO-style RLE counts (uint32, column-major) plus a
+    fixed-size index of (offset, nbytes) per (frame, label). Both files are memory-mappable and
+    any frame/label is decoded independently; nbytes == 0 marks a frame not written yet.
+
+    Layout of a store directory:
+        store.json        header: format, height, width, labels, mode, frame names, generation
+        store.<gen>.idx   uint64 array (frames, labels, 2)
+        store.<gen>.dat   concatenated RLE counts
+
+    Rewriting a frame appends its new counts and leaves the old ones as dead bytes; compact()
+    copies the live counts into the next generation of both files and switches the header to it.
+    A reader keeps the generation it opened, so it is never handed offsets into the wrong file.
+
+    mode describes how label planes become a PNG: "single" (union of all planes as 0/255),
+    "composite" (label index, later labels win on overlap) or "per_label" (one 0/255 PNG per
+    label, composite when no label is given).
+    """
+
+    def __init__(self, root: Path, header: Dict):
+        self.root = Path(root)
+        self.header = header
+        self.height = int(header["height"])
+        self.width = int(header["width"])
+        self.labels: List[str] = list(header["labels"])
+        self.mode: str = header.get("mode", "single")
+        self.frames: List[str] = list(header["frames"])
+        self.generation = int(header.get("generation", 0))
+        self._by_name = {n: i for i, n in enumerate(self.frames)}
+        self._lock = threading.Lock()
+        self._index_fd: Optional[int] = None
+        self._data_fd: Optional[int] = None
+        self._index: Optional[np.memmap] = None
+        self._reader: Optional[BinaryIO] = None  # data file of the generation self._index maps
+
+    @classmethod
+    def create(cls, root: Path, frames: Sequence[str], height: int, width: int,
+               labels: Sequence[str], mode: str = "single") -> "MaskStore":
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        header = dict(format=STORE_FORMAT, height=int(height), width=int(width),
+                      labels=list(labels), mode=mode, frames=[Path(f).stem for f in frames], generation=0)
+        for path in _generation_files(root):
+            path.unlink(missing_ok=True)
+        with open(root / INDEX_NAME.format(gen=0), "wb") as f:
+            f.truncate(len(header["frames"]) * len(header["labels"]) * 16)
+        (root / DATA_NAME.format(gen=0)).touch()
+        _save_header(root, header)
+        return cls(root, header)
+
+    @classmethod
+    def open(cls, root: Path) -> Optional["MaskStore"]:
+        path = Path(root) / HEADER_NAME
+        if not path.exists():
+            return None
+        header = json.loads(path.read_text(encoding="utf-8"))
+        if header.get("format") != STORE_FORMAT:
+            raise ValueError(f"Unsupported mask store format {header.get('format')!r}.")
+        return cls(root, header)
+
+    @staticmethod
+    def remove(root: Path):
+        (Path(root) / HEADER_NAME).unlink(missing_ok=True)
+        for path in _generation_files(Path(root)):
+            path.unlink(missing_ok=True)
+
+    def _path(self, name: str) -> Path:
+        return self.root / name.format(gen=self.generation)
+
+    # -- writing -------------------------------------------------------------------------------
+
+    def _fds(self) -> Tuple[int, int]:
+        if self._data_fd is None:
+            self._data_fd = os.open(self._path(DATA_NAME), os.O_RDWR | os.O_APPEND)
+            self._index_fd = os.open(self._path(INDEX_NAME), os.O_RDWR)
+        return self._index_fd, self._data_fd
+
+    def write(self, frame: int, planes: np.ndarray):
+        """
+        Store mask planes for a frame: (labels, H, W) or (H, W) for a single label. Safe across
+        threads and processes (segment workers write into the same store).
+        """
+        planes = np.asarray(planes)
+        if planes.ndim == 2:
+            planes = planes[None]
+        if planes.shape != (len(self.labels), self.height, self.width):
+            raise ValueError(f"Expected planes of shape {(len(self.labels), self.height, self.width)}, got {planes.shape}.")
+        blobs = [encode_counts(p).tobytes() for p in planes]
+        entries = np.zeros((len(blobs), 2), dtype=np.uint64)
+        with self._lock:
+            index_fd, data_fd = self._fds()
+            fcntl.flock(data_fd, fcntl.LOCK_EX)
+            try:
+                offset = os.lseek(data_fd, 0, os.SEEK_END)
+                for k, blob in enumerate(blobs):
+                    os.write(data_fd, blob)
+                    entries[k] = (offset, len(blob))
+                    offset += len(blob)
+                os.pwrite(index_fd, entries.tobytes(), frame * len(self.labels) * 16)
+            finally:
+                fcntl.flock(data_fd, fcntl.LOCK_UN)
+
+    def compact(self, min_dead_ratio: float = 0.0) -> bool:
+        """
+        Copy the live counts into a new generation of the data and index files and switch the
+        header to it, once at least min_dead_ratio of the data file is dead (counts of frames
+        written again since). Returns whether it compacted. For when no run writes to the store:
+        writers keep appending to the generation they opened. The previous generation stays for
+        readers that still use it and is deleted by the next compaction.
+        """
+        with self._lock:
+            self._close_fds()
+            index = np.fromfile(self._path(INDEX_NAME), dtype=np.uint64).reshape(len(self.frames), len(self.labels), 2)
+            size = self._path(DATA_NAME).stat().st_size
+            dead = size - int(index[:, :, 1].sum())
+            if dead <= 0 or dead < min_dead_ratio * size:
+                return False
+            gen = self.generation + 1
+            compacted = np.zeros_like(index)
+            offset = 0
+            with open(self._path(DATA_NAME), "rb") as src, open(self.root / DATA_NAME.format(gen=gen), "wb") as dst:
+                for f, k in np.argwhere(index[:, :, 1] > 0):
+                    src.seek(int(index[f, k, 0]))
+                    blob = src.read(int(index[f, k, 1]))
+                    dst.write(blob)
+                    compacted[f, k] = (offset, len(blob))
+                    offset += len(blob)
+            compacted.tofile(self.root / INDEX_NAME.format(gen=gen))
+            header = dict(self.header, generation=gen)
+            _save_header(self.root, header)
+            for path in _generation_files(self.root):
+                if int(_GENERATION_FILE.fullmatch(path.name).group(1)) < self.generation:
+                    path.unlink(missing_ok=True)
+            self.header, self.generation = header, gen
+            return True
+
+    def _close_fds(self):
+        for fd in (self._data_fd, self._index_fd):
+            if fd is not None:
+                os.close(fd)
+        if self._reader is not None:
+            self._reader.close()
+        self._data_fd = self._index_fd = self._reader = None
+        self._index = None
+
+    def close(self):
+        with self._lock:
+            self._close_fds()
+
+    # -- reading -------------------------------------------------------------------------------
+
+    def index(self) -> np.ndarray:
+        if self._index is None:
+            n = len(self.frames) * len(self.labels)
+            if n == 0:
+                return np.zeros((0, len(self.labels), 2), dtype=np.uint64)
+            # The data file is opened with the index, so both stay on one generation
+            self._reader = open(self._path(DATA_NAME), "rb", buffering=0)
+            self._index = np.memmap(self._path(INDEX_NAME), dtype=np.uint64, mode="r",
+                                    shape=(len(self.frames), len(self.labels), 2))
+        return self._index
+
+    def written(self) -> np.ndarray:
+        # bool per frame: all label planes present
+        idx = self.index()
+        return (idx[:, :, 1] > 0).all(axis=1) if len(self.frames) else np.zeros(0, dtype=bool)
+
+    def frame_index(self, name: str) -> Optional[int]:
+        return self._by_name.get(Path(name).stem)
+
+    def label_index(self, label: str) -> Optional[int]:
+        return self.labels.index(label) if label in self.labels else None
+
+    def read_plane(self, frame: int, label: int = 0) -> np.ndarray:
+        offset, nbytes = (int(v) for v in self.index()[frame, label])
+        if nbytes == 0:
+            raise KeyError(f"Frame {frame} label {label} has not been written.")
+        data = os.pread(self._reader.fileno(), nbytes, offset)
+        return decode_counts(np.frombuffer(data, dtype=np.uint32), self.height, self.width)
+
+    def read(self, frame: int) -> np.ndarray:
+        return np.stack([self.read_plane(frame, k) for k in range(len(self.labels))])
+
+    def mask_image(self, frame: int, label: Optional[int] = None) -> np.ndarray:
+        """uint8 mask as it would have been written to PNG, following the store's mode."""
+        if label is not None:
+            return self.read_plane(frame, label).astype(np.uint8) * 255
+        return planes_to_mask(self.read(frame), self.mode)
+
+    def iter_written(self) -> Iterator[int]:
+        for i in np.flatnonzero(self.written()):
+            yield int(i)
+
+    def signature(self) -> str:
+        # Changes whenever masks are (re)written; cheap enough to compute per request.
+        parts = []
+        for path in (self.root / HEADER_NAME, self._path(INDEX_NAME), self._path(DATA_NAME)):
+            st = path.stat()
+            parts.append(f"{st.st_size}:{st.st_mtime_ns}")
+        return "-".join(parts)
+
+
+def _save_header(root: Path, header: Dict):
+    tmp = root / (HEADER_NAME + ".tmp")
+    tmp.write_text(json.dumps(header), encoding="utf-8")
+    tmp.replace(root / HEADER_NAME)
+
+
+def _generation_files(root: Path) -> List[Path]:
+    if not root.exists():
+        return []
+    return [p for p in root.iterdir() if _GENERATION_FILE.fullmatch(p.name)]
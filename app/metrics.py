@@ -0,0 +1,137 @@
+import cProfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PROFILE_NAME = "profile.pstats"
+
+StageSummary = Dict[str, Dict[str, float]]  # stage -> {"seconds": ..., "count": ...}
+
+
+class StageTimer:
+    """
+    Wall time and call count per named stage, safe to share between the threads of one job
+    (reader, inference, writers). Stages overlap in time when they run on different threads, so
+    their seconds add up to more than the job's elapsed time; compare them with each other.
+    """
+
+    def __init__(self):
+        self._totals: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, count: int = 1):
+        with self._lock:
+            t = self._totals.get(stage)
+            if t is None:
+                self._totals[stage] = [seconds, count]
+            else:
+                t[0] += seconds
+                t[1] += count
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def merge(self, summary: Optional[StageSummary]):
+        # Fold in a summary() from another timer, e.g. one kept in a worker process
+        for stage, t in (summary or {}).items():
+            self.add(stage, t["seconds"], int(t["count"]))
+
+    def summary(self) -> StageSummary:
+        with self._lock:
+            return {k: dict(seconds=round(s, 4), count=int(n)) for k, (s, n) in self._totals.items()}
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and summaries (count and sum), rendered in the Prometheus text
+    exposition format. Names are prefixed with `prefix`; labels are keyword arguments.
+    """
+
+    def __init__(self, prefix: str = "maskprop_"):
+        self.prefix = prefix
+        self._meta: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._values: Dict[str, Dict[Tuple[Tuple[str, str], ...], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _series(self, kind: str, name: str, help: str, labels: Dict[str, str]) -> List[float]:
+        # Called with the lock held; the first use of a name fixes its type
+        if name not in self._meta:
+            self._meta[name] = (kind, help)
+            self._values[name] = {}
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        return self._values[name].setdefault(key, [0.0, 0.0])
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels):
+        with self._lock:
+            self._series("counter", name, help, labels)[0] += value
+
+    def set(self, name: str, value: float, help: str = "", **labels):
+        with self._lock:
+            self._series("gauge", name, help, labels)[0] = value
+
+    def observe(self, name: str, value: float, help: str = "", **labels):
+        with self._lock:
+            s = self._series("summary", name, help, labels)
+            s[0] += 1
+            s[1] += value
+
+    def observe_stages(self, stages: Optional[StageSummary], **labels):
+        for stage, t in (stages or {}).items():
+            self.inc("stage_seconds_total", t["seconds"], "Time spent per pipeline stage", stage=stage, **labels)
+            self.inc("stage_calls_total", t["count"], "Calls per pipeline stage", stage=stage, **labels)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted(self._meta):
+                kind, help = self._meta[name]
+                full = self.prefix + name
+                if help:
+                    lines.append(f"# HELP {full} {help}")
+                lines.append(f"# TYPE {full} {kind}")
+                for key, (a, b) in sorted(self._values[name].items()):
+                    label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+                    braces = f"{{{label_str}}}" if label_str else ""
+                    if kind == "summary":
+                        lines.append(f"{full}_count{braces} {_number(a)}")
+                        lines.append(f"{full}_sum{braces} {_number(b)}")
+                    else:
+                        lines.append(f"{full}{braces} {_number(a)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def maybe_profile(path: Optional[Path]) -> Iterator[None]:
+    """
+    cProfile the calling thread into `path` (pstats format: snakeviz, gprof2dot, flameprof, or
+    pstats itself); a no-op when path is None. Threads started inside are not profiled.
+    """
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(path))
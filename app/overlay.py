@@ -0,0 +1,91 @@
+import colorsys
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+import numpy as np
+
+from app.lazy_imports import cv2
+
+
+def make_palette() -> np.ndarray:
+    """
+    256-entry BGR lookup table indexed by mask value. 0 is background; label indices 1..254 get
+    well-separated hues (1 is red); 255, the value of binary masks, is red as well.
+    """
+    palette = np.zeros((256, 3), dtype=np.uint8)
+    for i in range(1, 255):
+        h = ((i - 1) * 0.618033988749895) % 1.0
+        r, g, b = colorsys.hsv_to_rgb(h, 0.9, 1.0)
+        palette[i] = (int(b * 255), int(g * 255), int(r * 255))
+    palette[255] = (0, 0, 255)
+    return palette
+
+
+class OverlayRenderer:
+    """
+    Alpha-blends a label/binary mask over a BGR frame in uint8 without per-frame allocations:
+    the palette lookup, blend and selection buffers are reused per thread and per frame size.
+    The input image is never modified unless it is passed as `out`. Propagation writers render
+    one frame at a time as it finishes; frames of a video share a size, so each writer thread
+    allocates its buffers once.
+    """
+
+    def __init__(self, alpha: float = 0.4, palette: Optional[np.ndarray] = None):
+        self.alpha = float(alpha)
+        self.palette = make_palette() if palette is None else np.ascontiguousarray(palette, dtype=np.uint8)
+        self._local = threading.local()
+
+    def _scratch(self, h: int, w: int) -> Tuple[np.ndarray, np.ndarray]:
+        buf = getattr(self._local, "buf", None)
+        if buf is None or buf[0].shape[:2] != (h, w):
+            buf = (np.empty((h, w, 3), dtype=np.uint8), np.empty((h, w), dtype=bool))
+            self._local.buf = buf
+        return buf
+
+    def render(self, image: np.ndarray, mask: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        h, w = image.shape[:2]
+        if mask.shape[:2] != (h, w):
+            raise ValueError(f"Mask shape {mask.shape[:2]} does not match frame {(h, w)}.")
+        if mask.dtype != np.uint8:
+            mask = mask.astype(np.uint8)
+        color, sel = self._scratch(h, w)
+        if out is None:
+            out = np.empty_like(image)
+        np.take(self.palette, mask, axis=0, out=color)
+        cv2.addWeighted(image, 1.0 - self.alpha, color, self.alpha, 0.0, dst=color)
+        np.greater(mask, 0, out=sel)
+        if out is not image:
+            np.copyto(out, image)
+        np.copyto(out, color, where=sel[..., None])
+        return out
+
+
+class BytesLRU:
+    """Thread-safe LRU of encoded blobs bounded by total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max(0, max_bytes)
+        self._items: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: Hashable, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
@@ -0,0 +1,189 @@
+import gc
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from app.sam2_infer import SAM2VideoPropagator, resolve_device
+from app.sysinfo import available_memory_bytes, cuda_free_bytes
+
+PoolKey = Tuple[str, str, str]  # (model_type, checkpoint_path, device)
+
+
+@dataclass
+class _PoolEntry:
+    lock: threading.Lock
+    loaded: threading.Event  # set once the load finished, whether or not it succeeded
+    propagator: Optional[SAM2VideoPropagator] = None
+    error: Optional[BaseException] = None
+    load_time_s: float = 0.0
+    users: int = 0  # jobs that looked the entry up and have not finished with it; pins it in the pool
+
+
+class PredictorPool:
+    """
+    Process-wide registry of loaded SAM2 propagators keyed by (model_type, checkpoint, device).
+
+    A propagator is built on first use (or via preload) and reused by later jobs. It is built
+    outside the pool lock: the entry is registered first, and other jobs wanting the same model
+    wait for that one load while everything else (other models, stats) carries on. Each entry is
+    guarded by its own lock, so jobs sharing a model run one at a time while jobs on different
+    models proceed independently. The predictor is reset before and after every job.
+
+    Idle entries are evicted LRU-first when the pool is full or free memory (host RAM, plus GPU
+    memory for CUDA entries) drops below min_free_mb. An entry is pinned from lookup until its
+    job is done, so one waiting for the entry lock is not evicted (and loaded again) under it.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1,
+        min_free_mb: int = 0,
+        factory: Callable[..., SAM2VideoPropagator] = SAM2VideoPropagator,
+    ):
+        self.max_size = max(1, max_size)
+        self.min_free_bytes = max(0, min_free_mb) * 1024 * 1024
+        self._factory = factory
+        self._entries: "OrderedDict[PoolKey, _PoolEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def factory(self) -> Callable[..., SAM2VideoPropagator]:
+        return self._factory
+
+    @staticmethod
+    def make_key(model_type: str, checkpoint_path: str, device: str) -> PoolKey:
+        return (model_type, checkpoint_path or "", resolve_device(device))
+
+    def _memory_low(self, device: str) -> bool:
+        if not self.min_free_bytes:
+            return False
+        free = available_memory_bytes()
+        if free is not None and free < self.min_free_bytes:
+            return True
+        if device == "cuda":
+            free = cuda_free_bytes()
+            if free is not None and free < self.min_free_bytes:
+                return True
+        return False
+
+    def _evict_one(self) -> bool:
+        # Oldest idle entry first; entries in use, waited for or still loading are never evicted.
+        for key, entry in self._entries.items():
+            if entry.propagator is not None and not entry.users:
+                del self._entries[key]
+                self.evictions += 1
+                return True
+        return False
+
+    def _release_memory(self, device: str):
+        gc.collect()
+        if device == "cuda":
+            try:
+                import torch
+                torch.cuda.empty_cache()
+            except Exception:
+                pass
+
+    def _unpin(self, entry: _PoolEntry):
+        with self._lock:
+            entry.users -= 1
+
+    def _get_or_load(self, key: PoolKey) -> Tuple[_PoolEntry, bool]:
+        # The entry comes back pinned; the caller unpins it once done
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                hit = True
+            else:
+                self.misses += 1
+                evicted = False
+                while self._entries and (len(self._entries) >= self.max_size or self._memory_low(key[2])):
+                    if not self._evict_one():
+                        break
+                    evicted = True
+                if evicted:
+                    self._release_memory(key[2])
+                # Registered before loading, so concurrent first jobs wait for this load instead of starting another
+                entry = _PoolEntry(lock=threading.Lock(), loaded=threading.Event())
+                self._entries[key] = entry
+                hit = False
+            entry.users += 1
+
+        if hit:
+            entry.loaded.wait()
+            if entry.error is not None:
+                self._unpin(entry)
+                raise entry.error
+            return entry, True
+
+        t0 = time.perf_counter()
+        try:
+            entry.propagator = self._factory(model_type=key[0], checkpoint_path=key[1], device=key[2])
+        except BaseException as e:
+            entry.error = e
+            with self._lock:
+                entry.users -= 1
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            raise
+        finally:
+            entry.load_time_s = time.perf_counter() - t0
+            entry.loaded.set()
+        return entry, False
+
+    @contextmanager
+    def acquire(
+        self, model_type: str, checkpoint_path: str, device: str
+    ) -> Iterator[Tuple[SAM2VideoPropagator, Dict[str, Any]]]:
+        key = self.make_key(model_type, checkpoint_path, device)
+        wait_t0 = time.perf_counter()
+        entry, hit = self._get_or_load(key)
+        try:
+            with entry.lock:
+                info = dict(
+                    pool_hit=hit,
+                    load_time_s=0.0 if hit else round(entry.load_time_s, 3),
+                    wait_time_s=round(time.perf_counter() - wait_t0, 3),
+                    pool_hits=self.hits,
+                    pool_misses=self.misses,
+                )
+                entry.propagator.reset()
+                try:
+                    yield entry.propagator, info
+                finally:
+                    entry.propagator.reset()
+        finally:
+            self._unpin(entry)
+
+    def preload(self, model_type: str, checkpoint_path: str, device: str) -> float:
+        entry, _ = self._get_or_load(self.make_key(model_type, checkpoint_path, device))
+        self._unpin(entry)
+        return entry.load_time_s
+
+    def warmup(self, model_type: str, checkpoint_path: str, device: str) -> Dict[str, Any]:
+        # Load the predictor if needed and run one dummy frame through it
+        with self.acquire(model_type, checkpoint_path, device) as (propagator, info):
+            return dict(info, warmup_s=round(propagator.warmup(), 3))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(
+                size=len(self._entries),
+                max_size=self.max_size,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                entries=[
+                    dict(model_type=k[0], checkpoint=k[1], device=k[2], in_use=e.lock.locked(),
+                         loading=not e.loaded.is_set(), load_time_s=round(e.load_time_s, 3))
+                    for k, e in self._entries.items()
+                ],
+            )
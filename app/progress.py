@@ -1,28 +1,342 @@
-from typing import Dict, Any
-from dataclasses import dataclass, asdict
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass, asdict, fields
 
 @dataclass
 class JobState:
     job_id: str
-    status: str = "created"  # created|queued|running|completed|failed
+    status: str = "created"  # created|queued|running|completed|failed|cancelled
     progress: int = 0
     message: str = ""
     meta: Dict[str, Any] = None
+    cancel_requested: bool = False
+    frames_done: int = 0  # leading frames whose outputs are on disk
+    params: Dict[str, Any] = None  # how the job was submitted (labels_mode, priority, ...); used to requeue it
+    artifacts: Dict[str, Any] = None  # output paths of the last completed run
+    created_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    owner: Optional[str] = None  # host:pid of the process that queued/runs the job
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+def process_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def owner_alive(owner: Optional[str]) -> bool:
+    # Only processes on this host can be checked; foreign owners are assumed alive.
+    if not owner:
+        return False
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _stamp(values: Dict[str, Any]):
+    # Derive timings from status transitions
+    status = values.get("status")
+    now = time.time()
+    if status == "queued":
+        values.setdefault("started_at", None)
+        values.setdefault("finished_at", None)
+    elif status == "running":
+        values.setdefault("started_at", now)
+    elif status in TERMINAL_STATUSES:
+        values.setdefault("finished_at", now)
+
+
+class JobStore:
+    """
+    Job state storage. Every update bumps a per-job version so event streams can poll cheaply
+    for changes and coalesce any number of updates into one message.
+    """
+
+    def create(self, job_id: str):
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def update(self, job_id: str, **kwargs):
+        raise NotImplementedError
+
+    def changes(self, job_id: str, since: Any = 0) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        # (version, state) if the job changed after version `since`, else None. Versions are opaque.
+        raise NotImplementedError
+
+    def delete(self, job_id: str):
+        raise NotImplementedError
+
+    def request_cancel(self, job_id: str) -> bool:
+        raise NotImplementedError
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        raise NotImplementedError
+
+    def claim_orphans(self, owner: str) -> List[Dict[str, Any]]:
+        # Queued/running jobs whose owning process is gone, reassigned to `owner`.
+        return []
+
+    def flush(self):
+        pass
+
+
+class JobManager(JobStore):
+    """In-memory job store: fast, but per process and lost on restart."""
 
-class JobManager:
     def __init__(self):
         self._jobs: Dict[str, JobState] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
 
     def create(self, job_id: str):
-        self._jobs[job_id] = JobState(job_id=job_id)
+        with self._lock:
+            self._jobs[job_id] = JobState(job_id=job_id, created_at=time.time())
+            self._versions[job_id] = self._versions.get(job_id, 0) + 1
 
     def get(self, job_id: str):
-        j = self._jobs.get(job_id)
-        return asdict(j) if j else None
+        with self._lock:
+            j = self._jobs.get(job_id)
+            return asdict(j) if j else None
 
     def update(self, job_id: str, **kwargs):
-        j = self._jobs.get(job_id)
-        if not j:
-            return
-        for k, v in kwargs.items():
-            setattr(j, k, v)
\ No newline at end of file
+        _stamp(kwargs)
+        with self._lock:
+            j = self._jobs.get(job_id)
+            if not j:
+                return
+            for k, v in kwargs.items():
+                setattr(j, k, v)
+            self._versions[job_id] += 1
+
+    def changes(self, job_id: str, since: Any = 0) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        with self._lock:
+            j = self._jobs.get(job_id)
+            version = self._versions.get(job_id, 0)
+            if not j or version == since:
+                return None
+            return version, asdict(j)
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._versions[job_id] = self._versions.get(job_id, 0) + 1
+
+    def request_cancel(self, job_id: str) -> bool:
+        with self._lock:
+            j = self._jobs.get(job_id)
+            if not j:
+                return False
+            j.cancel_requested = True
+            self._versions[job_id] += 1
+            return True
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            j = self._jobs.get(job_id)
+            return bool(j and j.cancel_requested)
+
+
+_FIELDS = [f.name for f in fields(JobState)]
+_JSON_FIELDS = ("meta", "params", "artifacts")
+# Written at most every flush_interval; any other field change writes them through immediately
+_HOT_FIELDS = frozenset(("progress", "message", "frames_done"))
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Job store in a SQLite database in WAL mode, shared by every process on the host (several
+    uvicorn workers, inference workers) and kept across restarts.
+
+    Per-frame progress updates are buffered in the writing process and flushed at most once per
+    flush_interval (by a timer when no later update comes); that process always reads its own
+    buffered values, others see them with at most flush_interval delay. Status, cancel and other
+    changes are written immediately.
+    """
+
+    def __init__(self, path: Path, flush_interval: float = 1.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = max(0.0, flush_interval)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Held from taking buffered values to writing them, so an older batch never lands last
+        self._write_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._pending_seq: Dict[str, int] = {}
+        self._last_flush: Dict[str, float] = {}
+        cols = ", ".join(f"{n} {self._sql_type(n)}" for n in _FIELDS if n != "job_id")
+        self._conn().execute(
+            f"CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, {cols}, version INTEGER NOT NULL DEFAULT 0)"
+        )
+
+    @staticmethod
+    def _sql_type(name: str) -> str:
+        if name in ("progress", "frames_done", "cancel_requested"):
+            return "INTEGER"
+        if name.endswith("_at"):
+            return "REAL"
+        return "TEXT"
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _encode(name: str, value: Any) -> Any:
+        if name in _JSON_FIELDS:
+            return None if value is None else json.dumps(value)
+        if name == "cancel_requested":
+            return int(bool(value))
+        return value
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Dict[str, Any]:
+        state = {n: row[n] for n in _FIELDS}
+        for n in _JSON_FIELDS:
+            state[n] = json.loads(state[n]) if state[n] else None
+        state["cancel_requested"] = bool(state["cancel_requested"])
+        return state
+
+    def _write(self, job_id: str, values: Dict[str, Any]) -> bool:
+        unknown = set(values) - set(_FIELDS)
+        if unknown:
+            raise AttributeError(f"Unknown job fields: {sorted(unknown)}")
+        sets = ", ".join(f"{k} = ?" for k in values)
+        args = [self._encode(k, v) for k, v in values.items()]
+        cur = self._conn().execute(
+            f"UPDATE jobs SET {sets}{', ' if sets else ''}version = version + 1 WHERE job_id = ?", (*args, job_id)
+        )
+        return cur.rowcount > 0
+
+    def _row(self, job_id: str) -> Optional[sqlite3.Row]:
+        return self._conn().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+
+    def create(self, job_id: str):
+        state = JobState(job_id=job_id, created_at=time.time())
+        names = ", ".join(_FIELDS)
+        marks = ", ".join("?" for _ in _FIELDS)
+        with self._lock:
+            self._pending.pop(job_id, None)
+        self._conn().execute(
+            f"INSERT INTO jobs ({names}, version) VALUES ({marks}, 1) ON CONFLICT(job_id) DO UPDATE SET "
+            + ", ".join(f"{n} = excluded.{n}" for n in _FIELDS if n != "job_id")
+            + ", version = jobs.version + 1",
+            [self._encode(n, getattr(state, n)) for n in _FIELDS],
+        )
+
+    def get(self, job_id: str):
+        row = self._row(job_id)
+        if row is None:
+            return None
+        state = self._decode(row)
+        with self._lock:
+            state.update(self._pending.get(job_id, {}))
+        return state
+
+    def update(self, job_id: str, **kwargs):
+        _stamp(kwargs)
+        now = time.monotonic()
+        with self._lock:
+            pending = self._pending.setdefault(job_id, {})
+            pending.update(kwargs)
+            self._pending_seq[job_id] = self._pending_seq.get(job_id, 0) + 1
+            since = now - self._last_flush.get(job_id, 0.0)
+            if kwargs.keys() <= _HOT_FIELDS and since < self.flush_interval:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.flush_interval - since, self._flush_due)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        with self._write_lock:
+            with self._lock:
+                values = self._pending.pop(job_id, None)
+                self._last_flush[job_id] = now
+            if values:
+                self._write(job_id, values)
+
+    def _flush_due(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            now = time.monotonic()
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                for job_id in pending:
+                    self._last_flush[job_id] = now
+            for job_id, values in pending.items():
+                self._write(job_id, values)
+
+    def changes(self, job_id: str, since: Any = 0) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        row = self._row(job_id)
+        if row is None:
+            return None
+        with self._lock:
+            version = (row["version"], self._pending_seq.get(job_id, 0))
+            if version == since:
+                return None
+            state = self._decode(row)
+            state.update(self._pending.get(job_id, {}))
+        return version, state
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._pending.pop(job_id, None)
+        self._conn().execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def request_cancel(self, job_id: str) -> bool:
+        return self._write(job_id, {"cancel_requested": True})
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        row = self._conn().execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def claim_orphans(self, owner: str) -> List[Dict[str, Any]]:
+        claimed = []
+        rows = self._conn().execute(
+            "SELECT job_id, owner FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchall()
+        for row in rows:
+            if row["owner"] == owner or owner_alive(row["owner"]):
+                continue
+            # Compare-and-set on the old owner: with several processes starting at once only one wins
+            cur = self._conn().execute(
+                "UPDATE jobs SET owner = ?, version = version + 1 WHERE job_id = ? AND owner IS ?",
+                (owner, row["job_id"], row["owner"]),
+            )
+            if cur.rowcount:
+                claimed.append(self.get(row["job_id"]))
+        return claimed
+
+
+def make_job_store(kind: str, path: Path, flush_interval: float = 1.0) -> JobStore:
+    if kind == "memory":
+        return JobManager()
+    if kind == "sqlite":
+        return SQLiteJobStore(path, flush_interval=flush_interval)
+    raise ValueError(f"Unknown job store {kind!r} (expected 'memory' or 'sqlite').")
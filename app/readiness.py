@@ -0,0 +1,69 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.lazy_imports import import_times
+
+
+class Readiness:
+    """
+    Tracks the model warmup that /readyz reports on. state is "cold" (nothing loaded yet),
+    "warming", "ready" or "failed"; warmups run on a background thread so the process answers
+    liveness probes meanwhile, and at most one runs at a time.
+    """
+
+    def __init__(self, required: bool = True):
+        # required=False: nothing to wait for (no warmup configured, or models run elsewhere)
+        self.required = required
+        self.state = "cold"
+        self.error: Optional[str] = None
+        self.details: Dict[str, Any] = {}
+        self._started = time.perf_counter()
+        self._ready_after_s: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready" or not self.required
+
+    def start(self, warm: Callable[[], Dict[str, Any]]) -> bool:
+        """Run warm() in the background; False if a warmup is already running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            if self.state != "ready":
+                self.state = "warming"  # re-warming a warm process keeps it ready
+            self.error = None
+            self._thread = threading.Thread(target=self._run, args=(warm,), name="warmup", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, warm: Callable[[], Dict[str, Any]]):
+        try:
+            details = warm()
+        except Exception as e:
+            with self._lock:
+                self.state, self.error = "failed", str(e)
+            return
+        with self._lock:
+            self.state, self.details = "ready", dict(details)
+            if self._ready_after_s is None:
+                self._ready_after_s = round(time.perf_counter() - self._started, 3)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.ready
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(
+                ready=self.ready,
+                state=self.state,
+                error=self.error,
+                warmup=self.details,
+                ready_after_s=self._ready_after_s,  # app start to the first completed warmup
+                lazy_imports=import_times(),
+            )
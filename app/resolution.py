@@ -0,0 +1,138 @@
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.frame_source import FrameSource, ScaledFrameSource
+from app.labelstudio_parser import ParsedPrompts
+from app.lazy_imports import cv2
+
+OUTPUT_RESOLUTIONS = ("full", "processing")
+
+
+@dataclass(frozen=True)
+class ProcessingResolution:
+    """
+    Resolution inference runs at, relative to the frames: scaled by `scale`, then capped so the
+    long side is at most `max_side` (0 = no cap). Frames are never upscaled. Masks are written
+    upsampled to the frame size ("full") or as computed ("processing").
+    """
+    max_side: int = 0
+    scale: float = 1.0
+    output: str = "full"
+    refine_edges: bool = False  # guided-filter the upsampled masks against the full-size frame
+
+    @classmethod
+    def from_settings(cls, settings) -> "ProcessingResolution":
+        return cls(
+            max_side=settings.PROCESSING_MAX_SIDE,
+            scale=settings.PROCESSING_SCALE,
+            output=settings.PROCESSING_OUTPUT,
+            refine_edges=settings.PROCESSING_REFINE_EDGES,
+        )
+
+    def plan(self, height: int, width: int) -> Optional["ResolutionPlan"]:
+        """The plan for frames of this size; None when they are processed as they are."""
+        if not 0 < self.scale <= 1:
+            raise ValueError(f"Processing scale must be in (0, 1], got {self.scale}.")
+        if self.max_side < 0:
+            raise ValueError(f"Processing max side must be >= 0, got {self.max_side}.")
+        if self.output not in OUTPUT_RESOLUTIONS:
+            raise ValueError(f"Unknown output resolution {self.output!r} (expected one of {', '.join(OUTPUT_RESOLUTIONS)}).")
+        factor = self.scale
+        if self.max_side and max(height, width) * factor > self.max_side:
+            factor = self.max_side / max(height, width)
+        size = (max(1, round(height * factor)), max(1, round(width * factor)))
+        if size == (height, width):
+            return None
+        return ResolutionPlan((height, width), size, full_output=self.output == "full", refine_edges=self.refine_edges)
+
+
+@dataclass(frozen=True)
+class ResolutionPlan:
+    """
+    One job's processing resolution: frames are read through frames() and prompts mapped with
+    prompts(), so tracking only ever sees the reduced size; to_output() brings each frame's mask
+    planes to the size they are stored at.
+    """
+    source_size: Tuple[int, int]  # (H, W) of the frames
+    size: Tuple[int, int]  # (H, W) inference runs at
+    full_output: bool = True
+    refine_edges: bool = False
+
+    @property
+    def output_size(self) -> Tuple[int, int]:
+        return self.source_size if self.full_output else self.size
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(source=list(self.source_size), processing=list(self.size), output=list(self.output_size),
+                    refine_edges=self.refine_edges and self.full_output)
+
+    def frames(self, source: FrameSource, cache_size: int = 8) -> FrameSource:
+        return ScaledFrameSource(source, self.size, cache_size=cache_size)
+
+    def prompts(self, prompts: ParsedPrompts) -> ParsedPrompts:
+        (H, W), (h, w) = self.source_size, self.size
+        sx, sy = w / W, h / H
+        return ParsedPrompts(
+            boxes=[replace(b, x1=b.x1 * sx, y1=b.y1 * sy, x2=b.x2 * sx, y2=b.y2 * sy) for b in prompts.boxes],
+            points=[replace(p, x=p.x * sx, y=p.y * sy) for p in prompts.points],
+            masks=[replace(m, mask=_resize_plane(np.asarray(m.mask).astype(np.uint8), (h, w)))
+                   for m in prompts.masks],
+        )
+
+    def to_output(self, planes: np.ndarray, image: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        (objects, h, w) planes at the output size. Upsampling interpolates each plane and cuts at
+        half, which smooths the staircase nearest-neighbour would leave; with refine_edges the cut
+        follows the edges of `image` (the full-size frame) instead.
+        """
+        if not self.full_output:
+            return planes
+        H, W = self.source_size
+        out = np.zeros((planes.shape[0], H, W), dtype=np.uint8)
+        guide = None
+        if self.refine_edges and image is not None:
+            guide = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY).astype(np.float32) / 255
+        for k in range(planes.shape[0]):
+            if not planes[k].any():
+                continue
+            soft = cv2.resize(planes[k] * np.uint8(255), (W, H), interpolation=cv2.INTER_LINEAR)
+            if guide is None:
+                out[k] = soft > 127
+            else:
+                _refine(soft, guide, max(2, round(H / self.size[0])), out[k])
+        return out
+
+    def from_output(self, planes: np.ndarray) -> np.ndarray:
+        # Stored planes back at the processing size (seeds for re-runs)
+        if not self.full_output:
+            return planes
+        return np.stack([_resize_plane(p, self.size) for p in planes]) if len(planes) else planes
+
+
+def _resize_plane(plane: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    h, w = size
+    return (cv2.resize(plane.astype(np.uint8) * np.uint8(255), (w, h), interpolation=cv2.INTER_AREA) > 127).astype(np.uint8)
+
+
+def _refine(soft: np.ndarray, guide: np.ndarray, radius: int, out: np.ndarray, eps: float = 1e-3):
+    """
+    Guided filter (He et al.) of an upsampled soft mask against the grey frame, cut at half into
+    `out`. Only the mask's bounding box plus a margin is filtered; elsewhere it stays empty.
+    """
+    ys, xs = np.nonzero(soft)
+    margin = 2 * radius
+    y1, y2 = max(0, ys.min() - margin), min(soft.shape[0], ys.max() + margin + 1)
+    x1, x2 = max(0, xs.min() - margin), min(soft.shape[1], xs.max() + margin + 1)
+    p = soft[y1:y2, x1:x2].astype(np.float32) / 255
+    g = guide[y1:y2, x1:x2]
+    ksize = (2 * radius + 1, 2 * radius + 1)
+
+    def box(x: np.ndarray) -> np.ndarray:
+        return cv2.boxFilter(x, -1, ksize, borderType=cv2.BORDER_REFLECT)
+
+    mean_g, mean_p = box(g), box(p)
+    a = (box(g * p) - mean_g * mean_p) / (box(g * g) - mean_g * mean_g + eps)
+    b = mean_p - a * mean_g
+    out[y1:y2, x1:x2] = (box(a) * g + box(b)) > 0.5
@@ -0,0 +1,195 @@
+from typing import Sequence
+
+import numpy as np
+
+
+def encode_counts(mask: np.ndarray) -> np.ndarray:
+    """
+    COCO-style uncompressed RLE of a 2D mask: run lengths in column-major order, starting with
+    a (possibly empty) run of zeros. Returns uint32 counts.
+    """
+    flat = np.ascontiguousarray(np.asarray(mask).T).reshape(-1) != 0
+    n = flat.size
+    if n == 0:
+        return np.zeros(0, dtype=np.uint32)
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    bounds = np.concatenate(([0], change, [n]))
+    counts = np.diff(bounds)
+    if flat[0]:
+        counts = np.concatenate(([0], counts))
+    return counts.astype(np.uint32)
+
+
+def decode_counts(counts: Sequence[int], height: int, width: int) -> np.ndarray:
+    """Inverse of encode_counts: expands alternating 0/1 runs with np.repeat. Returns bool (H, W)."""
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    if total != height * width:
+        raise ValueError(f"RLE covers {total} pixels, expected {height * width}.")
+    values = (np.arange(counts.size) & 1).astype(bool)
+    flat = np.repeat(values, counts)
+    return flat.reshape(width, height).T
+
+
+
+# -- COCO compressed string counts (as produced by pycocotools) -----------------------------------
+
+def counts_from_string(s: str) -> np.ndarray:
+    # LEB128-like 5-bit groups offset by 48, with counts after the third delta-coded (pycocotools rleFrString)
+    counts = []
+    p = 0
+    n = len(s)
+    while p < n:
+        x = 0
+        k = 0
+        more = True
+        while more:
+            c = ord(s[p]) - 48
+            x |= (c & 0x1F) << (5 * k)
+            more = bool(c & 0x20)
+            p += 1
+            k += 1
+            if not more and (c & 0x10):
+                x |= -1 << (5 * k)
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return np.asarray(counts, dtype=np.int64)
+
+
+def counts_to_string(counts: Sequence[int]) -> str:
+    out = []
+    counts = [int(c) for c in counts]
+    for i, x in enumerate(counts):
+        if i > 2:
+            x -= counts[i - 2]
+        more = True
+        while more:
+            c = x & 0x1F
+            x >>= 5
+            more = (x != -1) if (c & 0x10) else (x != 0)
+            if more:
+                c |= 0x20
+            out.append(chr(c + 48))
+    return "".join(out)
+
+
+# -- Label Studio brush RLE -----------------------------------------------------------------------
+#
+# Bit stream (MSB first): 32 bits value count, 5 bits word size - 1, 4 x 4 bits run-length field
+# sizes - 1, then tokens: 1 bit run flag, 2 bits size index, <size> bits n - 1, followed by one
+# word (run of n equal values) or n words (literals). The decoded values are a flattened RGBA
+# image (H, W, 4); the mask is the alpha channel.
+
+LS_RLE_SIZES = (3, 4, 8, 16)
+
+
+def _read_bits(buf: bytes, pos: int, n: int) -> int:
+    b = pos >> 3
+    word = int.from_bytes(buf[b:b + 8], "big")
+    return (word >> (64 - (pos & 7) - n)) & ((1 << n) - 1)
+
+
+def _brush_runs(rle: Sequence[int]):
+    """Parse a Label Studio brush RLE into (num, values, lengths) runs over the flat value array."""
+    buf = bytes(rle) + b"\x00" * 8
+    nbits = len(rle) * 8
+    num = _read_bits(buf, 0, 32)
+    word = _read_bits(buf, 32, 5) + 1
+    sizes = [_read_bits(buf, 37 + 4 * k, 4) + 1 for k in range(4)]
+    wmask = (1 << word) - 1
+    pos = 53
+    values = []
+    lengths = []
+    i = 0
+    # One 64-bit window per token: flag, size index, length field and (for runs) the value word
+    while i < num:
+        b = pos >> 3
+        win = int.from_bytes(buf[b:b + 8], "big") << (pos & 7)
+        size = sizes[(win >> 61) & 3]
+        n = ((win >> (61 - size)) & ((1 << size) - 1)) + 1
+        pos += 3 + size
+        if (win >> 63) & 1:
+            if 61 - size - word >= 0:
+                values.append((win >> (61 - size - word)) & wmask)
+            else:
+                values.append(_read_bits(buf, pos, word))
+            lengths.append(n)
+            pos += word
+        else:
+            for _ in range(n):
+                values.append(_read_bits(buf, pos, word))
+                lengths.append(1)
+                pos += word
+        i += n
+        if pos > nbits:
+            raise ValueError("Truncated brush RLE.")
+    return num, np.asarray(values, dtype=np.uint8), np.asarray(lengths, dtype=np.int64)
+
+
+def decode_ls_brush_mask(rle: Sequence[int], height: int, width: int) -> np.ndarray:
+    num, values, lengths = _brush_runs(rle)
+    if num == height * width * 4:
+        # Map runs over RGBA values onto alpha-channel pixels: flat [s, e) covers pixels [s//4, e//4)
+        ends = np.minimum(np.cumsum(lengths), num)
+        starts = ends - lengths
+        px = ends // 4 - np.maximum(starts, 0) // 4
+        return np.repeat(values > 0, px).reshape(height, width)
+    if num == height * width:
+        return (np.repeat(values, lengths)[:num] > 0).reshape(height, width)
+    raise ValueError(f"Brush RLE has {num} values, expected {height * width * 4} for a {width}x{height} image.")
+
+
+def _runs(flat: np.ndarray):
+    n = flat.size
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    starts = np.concatenate(([0], change))
+    lengths = np.diff(np.concatenate((starts, [n])))
+    return flat[starts], lengths
+
+
+def encode_ls_brush(mask: np.ndarray) -> list:
+    """
+    Encode a 2D mask as Label Studio brush RLE (all four RGBA channels set to 255 where the mask
+    is set), using the same token choices as label_studio_converter. Tokens are assembled with
+    vectorized bit arithmetic rather than string concatenation.
+    """
+    flat = (np.asarray(mask).reshape(-1) != 0).astype(np.uint8) * 255
+    num = flat.size * 4
+    if flat.size == 0:
+        values, lengths = np.zeros(0, np.uint8), np.zeros(0, np.int64)
+    else:
+        values, lengths = _runs(flat)
+        lengths = lengths.astype(np.int64) * 4  # each pixel is 4 equal channel values
+
+    # Split runs longer than the 16-bit field allows
+    max_run = 1 << 16
+    reps = np.maximum(1, -(-lengths // max_run))
+    values = np.repeat(values, reps)
+    chunk_len = np.repeat(lengths, reps)
+    first = np.repeat(np.cumsum(reps) - reps, reps)
+    k = np.arange(values.size) - first
+    lengths = np.minimum(chunk_len - k * max_run, max_run)
+
+    # size index per token: literal (n == 1) and n <= 8 -> 0, <= 16 -> 1, <= 256 -> 2, else 3
+    idx = np.select([lengths <= 8, lengths <= 16, lengths <= 256], [0, 1, 2], 3)
+    field = np.asarray(LS_RLE_SIZES, dtype=np.int64)[idx]
+    flag = (lengths > 1).astype(np.int64)
+    tok = (((flag << 2 | idx) << field | (lengths - 1)) << 8) | values.astype(np.int64)
+    tok_bits = 3 + field + 8
+
+    header = (num << 21) | (7 << 16)
+    for j, s in enumerate(LS_RLE_SIZES):
+        header |= (s - 1) << (12 - 4 * j)
+    tok = np.concatenate(([header], tok))
+    tok_bits = np.concatenate(([53], tok_bits))
+
+    total = int(tok_bits.sum())
+    ends = np.cumsum(tok_bits)
+    owner = np.repeat(np.arange(tok.size), tok_bits)
+    shift = ends[owner] - 1 - np.arange(total)
+    bits = ((tok[owner] >> shift) & 1).astype(np.uint8)
+    if total % 8 == 0:
+        # label_studio_converter always appends 1-8 padding bits
+        bits = np.concatenate((bits, np.zeros(8, np.uint8)))
+    return np.packbits(bits).tolist()
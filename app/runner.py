@@ -0,0 +1,267 @@
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.cas import ContentStore
+from app.config import settings
+from app.cpu_accel import CPUProfile, describe
+from app.export import prune_exports
+from app.frame_source import FrameSource, open_frame_source
+from app.incremental import dirty_frames, prompt_digests, remove_manifest, run_key, save_manifest, source_signature
+from app.labelstudio_parser import ParsedPrompts, parse_labelstudio_export
+from app.mask_store import MaskStore
+from app.metrics import PROFILE_NAME, StageTimer, maybe_profile, registry
+from app.predictor_pool import PredictorPool
+from app.progress import JobStore, make_job_store
+from app.resolution import ProcessingResolution
+from app.sam2_infer import PropagationResult, PropagationCancelled, SAM2VideoPropagator, group_prompts, resolve_device
+from app.segments import SegmentPool
+from app.sysinfo import PeakRSSMonitor
+from app.work_queue import WorkQueue
+
+# Shared by the API process and the inference workers
+DATA_ROOT = Path(settings.DATA_ROOT).resolve()
+UPLOADS = DATA_ROOT / "uploads" / "jobs"
+OUTPUTS = DATA_ROOT / "outputs" / "jobs"
+CHECKPOINT = Path(settings.SAM2_CHECKPOINT) if settings.SAM2_CHECKPOINT else None
+
+
+def job_paths(job_id: str) -> Dict[str, Path]:
+    job_root_u = UPLOADS / job_id
+    job_root_o = OUTPUTS / job_id
+    return dict(
+        job_id=job_id,
+        upload_root=job_root_u,
+        output_root=job_root_o,
+        video_dir=job_root_u / "video",
+        frames_dir=job_root_u / "frames",
+        ls_dir=job_root_u / "labelstudio",
+        masks_dir=job_root_o / "masks",
+        overlays_dir=job_root_o / "overlays",
+        exports_dir=job_root_o / "exports",
+    )
+
+
+def build_propagator(model_type: str, checkpoint_path: str, device: str) -> SAM2VideoPropagator:
+    # Predictor factory with the configured CPU profile; module level so segment workers can unpickle it
+    return SAM2VideoPropagator(model_type, checkpoint_path, device=device,
+                               cpu_profile=CPUProfile.from_settings(settings))
+
+
+def open_predictor_pool() -> PredictorPool:
+    return PredictorPool(max_size=settings.PREDICTOR_POOL_SIZE, min_free_mb=settings.PREDICTOR_MIN_FREE_MB,
+                         factory=build_propagator)
+
+
+def open_job_store() -> JobStore:
+    return make_job_store(
+        settings.JOB_STORE,
+        Path(settings.JOB_STORE_PATH) if settings.JOB_STORE_PATH else DATA_ROOT / "jobs.db",
+        flush_interval=settings.JOB_PROGRESS_FLUSH_S,
+    )
+
+
+def open_work_queue() -> WorkQueue:
+    path = Path(settings.QUEUE_PATH) if settings.QUEUE_PATH else DATA_ROOT / "queue.db"
+    return WorkQueue(path, max_queue=settings.MAX_QUEUE_SIZE)
+
+
+def open_content_store() -> Optional[ContentStore]:
+    return ContentStore(DATA_ROOT / "cas") if settings.DEDUPE_UPLOADS else None
+
+
+def open_segment_pool(predictors: PredictorPool) -> Optional[SegmentPool]:
+    # SEGMENT_WORKERS=1 keeps the single sequential pass on the pooled predictor
+    if settings.SEGMENT_WORKERS == 1:
+        return None
+    return SegmentPool(workers=settings.SEGMENT_WORKERS, factory=predictors.factory)
+
+
+def open_job_frames(job_id: str) -> Optional[FrameSource]:
+    p = job_paths(job_id)
+    return open_frame_source(p["frames_dir"], p["video_dir"], ext=settings.FRAME_EXT, cache_size=settings.FRAME_CACHE_SIZE)
+
+
+def clear_mask_outputs(masks_dir: Path):
+    # Drop results of a previous run so stale masks of the other storage format are never served
+    MaskStore.remove(masks_dir)
+    for fp in masks_dir.rglob("*.png"):
+        fp.unlink(missing_ok=True)
+    for d in masks_dir.iterdir():
+        if d.is_dir() and not any(d.iterdir()):
+            d.rmdir()  # per-label folders of a previous run
+
+
+def load_prompts(job_id: str, params: Dict[str, Any], source: FrameSource) -> ParsedPrompts:
+    # Batch children hold their task as a one-task export of their own, so every job reads its own
+    p = job_paths(job_id)
+    ls_files = list(p["ls_dir"].glob("*.json"))
+    if not ls_files:
+        raise ValueError("No Label Studio export found. Upload a JSON export first.")
+    return parse_labelstudio_export(
+        ls_json_path=str(ls_files[0]),
+        frames_dir=str(p["frames_dir"]),
+        frame_ext=settings.FRAME_EXT,
+        frame_count=len(source),
+        frame_size=source.shape(),
+    )
+
+
+class JobRunner:
+    """
+    Runs one propagation job end to end and reports its outcome through the job store. Used by
+    the in-process scheduler and by app.worker alike. With a SegmentPool, frames are propagated
+    from every prompted keyframe in parallel processes instead of in one sequential pass. Only a
+    stop requested through should_stop (not a user cancel) escapes as PropagationCancelled.
+    """
+
+    def __init__(self, jobs: JobStore, predictors: PredictorPool, segments: Optional[SegmentPool] = None):
+        self.jobs = jobs
+        self.predictors = predictors
+        self.segments = segments
+
+    def _plan_rerun(self, frames: FrameSource, prompts: ParsedPrompts, labels_mode: str, masks_dir: Path
+                    ) -> Tuple[Optional[str], Optional[List[str]], Optional[List[int]]]:
+        # (run key, per-frame prompt digests, frames to recompute); dirty None means a full run
+        if not settings.INCREMENTAL_PROPAGATION or settings.MASK_STORAGE != "store" or self.segments is not None:
+            return None, None, None
+        signature = source_signature(frames)
+        if signature is None:
+            return None, None, None
+        model = PredictorPool.make_key(settings.SAM2_MODEL_TYPE, str(CHECKPOINT) if CHECKPOINT else "", settings.DEVICE)
+        key = run_key(
+            model=model,
+            cpu=CPUProfile.from_settings(settings).numerics() if model[2] == "cpu" else None,
+            resolution=asdict(ProcessingResolution.from_settings(settings)),
+            frames=signature,
+            labels_mode=labels_mode,
+            memory_frames=settings.PROPAGATION_MEMORY_FRAMES,
+        )
+        digests = prompt_digests(prompts, len(frames))
+        return key, digests, dirty_frames(masks_dir, key, digests, group_prompts(prompts)[0])
+
+    def run(self, job_id: str, params: Dict[str, Any], prompts: Optional[ParsedPrompts] = None,
+            should_stop: Optional[Callable[[], bool]] = None, timings: Optional[StageTimer] = None):
+        # timings may carry stages measured before the job was queued (e.g. prompt parsing)
+        jobs = self.jobs
+        p = job_paths(job_id)
+        started = time.perf_counter()
+        timings = timings if timings is not None else StageTimer()
+        profile_path = p["output_root"] / PROFILE_NAME
+        profile_path.unlink(missing_ok=True)
+        if not (params.get("profile") and settings.ENABLE_PROFILING):
+            profile_path = None
+        masks_dir: Path = p["masks_dir"]
+        overlays_dir: Path = p["overlays_dir"]
+        labels_mode = params.get("labels_mode") or settings.MASK_OUTPUT_MODE
+        base_meta = (jobs.get(job_id) or {}).get("meta") or {}  # e.g. parent_job/task_id of batch children
+
+        def stop() -> bool:
+            return jobs.is_cancel_requested(job_id) or bool(should_stop and should_stop())
+
+        try:
+            # The job stays queued until it holds the model: jobs on one pooled predictor (or one
+            # segment pool) run one at a time, whatever MAX_WORKERS allows
+            jobs.update(job_id, message="Waiting for the SAM2 model...")
+            # Keyframe-segmented runs propagate in the segment pool's processes, each with its own model
+            pool = self.segments if self.segments is not None else self.predictors
+            with pool.acquire(
+                model_type=settings.SAM2_MODEL_TYPE,
+                checkpoint_path=str(CHECKPOINT) if CHECKPOINT else "",
+                device=settings.DEVICE,
+            ) as (propagator, pool_info):
+                if stop():
+                    raise PropagationCancelled("Cancelled before start.")
+                timings.add("model_acquire", pool_info.get("wait_time_s", 0.0))
+                jobs.update(job_id, status="running", progress=0, frames_done=0, message="Loading frames...",
+                            meta=dict(base_meta, predictor=pool_info))
+                # A private source: the serving one is shared with /data requests
+                frames = open_job_frames(job_id)
+                if frames is None:
+                    raise ValueError("No frames found.")
+                try:
+                    if prompts is None:
+                        # Queued by another process or requeued after a restart: only params were kept
+                        with timings.stage("parse_prompts"):
+                            prompts = load_prompts(job_id, params, frames)
+                    masks_dir.mkdir(parents=True, exist_ok=True)
+                    # A re-run after prompt corrections only recomputes the frames they affect
+                    with timings.stage("plan_rerun"):
+                        key, digests, dirty = self._plan_rerun(frames, prompts, labels_mode, masks_dir)
+                    remove_manifest(masks_dir)
+                    if dirty is None:
+                        clear_mask_outputs(masks_dir)
+                    prune_exports(p["exports_dir"])
+                    common = dict(
+                        frames=frames,
+                        prompts=prompts,
+                        labels_mode=labels_mode,
+                        progress_cb=lambda p, msg=None: jobs.update(job_id, progress=p, message=msg or ""),
+                        output_masks_dir=str(masks_dir),
+                        output_overlays_dir=str(overlays_dir),
+                        should_stop=stop,
+                        write_overlays=settings.WRITE_OVERLAYS,
+                        prefetch=settings.PIPELINE_PREFETCH,
+                        writers=settings.PIPELINE_WRITERS,
+                        memory_frames=settings.PROPAGATION_MEMORY_FRAMES,
+                        frame_cb=lambda i: jobs.update(job_id, frames_done=i + 1),
+                        resolution=ProcessingResolution.from_settings(settings),
+                    )
+                    with PeakRSSMonitor() as rss, maybe_profile(profile_path):
+                        if dirty is not None:
+                            result: PropagationResult = propagator.repropagate(dirty=dirty, **common)
+                        else:
+                            result = propagator.propagate(mask_format=settings.MASK_STORAGE, **common)
+                    if key is not None:
+                        save_manifest(masks_dir, key, digests)
+                    store = MaskStore.open(masks_dir) if settings.MASK_STORAGE == "store" else None
+                    if store is not None:
+                        # Frames written again (re-runs) leave their old counts behind in the data file
+                        with timings.stage("compact_masks"):
+                            store.compact(settings.MASK_STORE_COMPACT_RATIO)
+                        store.close()
+                finally:
+                    frames.close()
+            timings.merge(result.timings)
+            throughput = result.throughput()
+            # Segmented runs build their propagators in the segment processes, from the same settings
+            accel = propagator.accel.report if isinstance(propagator, SAM2VideoPropagator) else describe(
+                CPUProfile.from_settings(settings), resolve_device(settings.DEVICE))
+            jobs.update(job_id, status="completed", progress=100, message="Propagation complete.", meta=dict(
+                base_meta,
+                frame_count=len(frames),
+                objects=len(result.object_labels),
+                labels=result.object_labels,
+                throughput=throughput,
+                timings=timings.summary(),
+                predictor=pool_info,
+                cpu_accel=accel,
+                resolution=result.resolution or None,
+                memory=rss.summary(),
+            ), artifacts=dict(
+                masks_dir=str(masks_dir),
+                mask_format=settings.MASK_STORAGE,
+                labels_mode=labels_mode,
+                overlays_dir=str(overlays_dir) if settings.WRITE_OVERLAYS else None,
+                profile=str(profile_path) if profile_path is not None else None,
+            ))
+            registry.inc("frames_propagated_total", throughput["computed"], "Frames propagated")
+            registry.observe_stages(timings.summary(), phase="propagate")
+            if rss.peak_bytes is not None:
+                registry.set("job_peak_rss_bytes", rss.peak_bytes, "Peak process RSS during the last completed job")
+            self._count_job("completed", started)
+        except PropagationCancelled as e:
+            if not jobs.is_cancel_requested(job_id):
+                self._count_job("interrupted", started)
+                raise  # stopped by the caller's should_stop: the caller decides what the job becomes
+            jobs.update(job_id, status="cancelled", message=str(e))
+            self._count_job("cancelled", started)
+        except Exception as e:
+            jobs.update(job_id, status="failed", message=str(e))
+            self._count_job("failed", started)
+
+    @staticmethod
+    def _count_job(outcome: str, started: float):
+        registry.inc("jobs_total", 1, "Propagation jobs run, by outcome", outcome=outcome)
+        registry.observe("job_seconds", time.perf_counter() - started, "Propagation job wall time", outcome=outcome)
@@ -1,24 +1,195 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import List, Callable, Iterable, Dict
+from typing import Any, List, Callable, Deque, Iterable, Iterator, Dict, Optional, Sequence, Tuple, Union
+import queue
+import threading
+import time
 from pathlib import Path
 import numpy as np
-import cv2
-import torch
 
+from app.cpu_accel import CPUAccelerator, CPUProfile
 from app.labelstudio_parser import ParsedPrompts, BoxPrompt, PointPrompt, MaskPrompt
+from app.lazy_imports import cv2
+from app.metrics import StageSummary, StageTimer
+from app.frame_source import FrameSource, as_frame_source
+from app.overlay import OverlayRenderer
+from app.mask_store import MASK_MODES, MaskStore, label_dirname, planes_to_mask
+from app.resolution import ProcessingResolution, ResolutionPlan
 
 ProgressCB = Callable[[int, str], None]
+FrameCB = Callable[[int], None]
+StopCB = Callable[[], bool]
+Prompt = Union[BoxPrompt, PointPrompt, MaskPrompt]
+
+class PropagationCancelled(Exception):
+    pass
+
+class _FramePrefetcher:
+    """
+    Decodes frames on a background thread, staying at most `depth` frames ahead of the consumer.
+    Descending runs of indices are decoded in ascending pieces of `reverse_chunk` frames and handed
+    out in reverse, so a video source reads forward instead of seeking back for every frame.
+    """
+
+    _END = object()
+
+    def __init__(self, source: FrameSource, indices: Iterable[int], depth: int = 4,
+                 timings: Optional[StageTimer] = None, reverse_chunk: int = 16):
+        self._q: "queue.Queue" = queue.Queue(maxsize=max(1, depth))
+        self._stop = threading.Event()
+        self._timings = timings if timings is not None else StageTimer()
+        self._reverse_chunk = max(1, reverse_chunk)
+        self._thread = threading.Thread(target=self._run, args=(source, list(indices)), daemon=True)
+        self._thread.start()
+
+    def _chunks(self, indices: List[int]) -> Iterator[List[int]]:
+        # Pieces of descending runs (i, i - 1, ...); any other index is a piece of its own
+        chunk: List[int] = []
+        for i in indices:
+            if chunk and (i != chunk[-1] - 1 or len(chunk) >= self._reverse_chunk):
+                yield chunk
+                chunk = []
+            chunk.append(i)
+        if chunk:
+            yield chunk
+
+    def _run(self, source: FrameSource, indices: List[int]):
+        try:
+            for chunk in self._chunks(indices):
+                decoded = {}
+                for i in sorted(chunk):
+                    if self._stop.is_set():
+                        return
+                    with self._timings.stage("decode"):
+                        decoded[i] = source.read(i)
+                for i in chunk:
+                    self._put((i, decoded.pop(i)))
+        except BaseException as e:
+            self._put(e)
+            return
+        self._put(self._END)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        while True:
+            item = self._q.get()
+            if item is self._END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
 
 @dataclass
 class PropagationResult:
     object_labels: List[str] = field(default_factory=list)
+    frames: int = 0
+    elapsed_s: float = 0.0
+    computed: Optional[int] = None  # frames actually propagated when a re-run reused the rest
+    timings: StageSummary = field(default_factory=dict)  # per-stage seconds and calls (see StageTimer)
+    resolution: Dict[str, Any] = field(default_factory=dict)  # ResolutionPlan.describe() of a downscaled run
+
+    def throughput(self) -> Dict[str, float]:
+        # Frames/s for the whole video and object-frames/s (every object is segmented on every frame)
+        computed = self.frames if self.computed is None else self.computed
+        fps = computed / self.elapsed_s if self.elapsed_s > 0 else 0.0
+        return dict(objects=len(self.object_labels), frames=self.frames, computed=computed,
+                    seconds=round(self.elapsed_s, 3), fps=round(fps, 2),
+                    object_fps=round(fps * len(self.object_labels), 2))
+
+def resolve_device(device: str) -> str:
+    if device != "cuda":
+        return "cpu"
+    import torch  # deferred: importing the app must not pay for torch
+    return device if torch.cuda.is_available() else "cpu"
+
+def group_prompts(prompts: ParsedPrompts) -> Tuple[List[str], Dict[int, List[Prompt]]]:
+    # Object labels in first-appearance order (one mask plane each) and prompts by 1-based frame
+    obj_labels: List[str] = []
+    by_frame: Dict[int, List[Prompt]] = {}
+    for pr in (*prompts.boxes, *prompts.points, *prompts.masks):
+        if pr.label not in obj_labels:
+            obj_labels.append(pr.label)
+        by_frame.setdefault(pr.frame, []).append(pr)
+    return obj_labels or ["object"], by_frame
+
+def scale_inputs(
+    source: FrameSource,
+    prompts: ParsedPrompts,
+    resolution: Optional[ProcessingResolution],
+) -> Tuple[FrameSource, ParsedPrompts, Optional[ResolutionPlan]]:
+    """The frames and prompts tracking runs on, and the plan mapping them back (None at full size)."""
+    plan = resolution.plan(*source.shape()) if resolution is not None and len(source) else None
+    if plan is None:
+        return source, prompts, None
+    return plan.frames(source), plan.prompts(prompts), plan
+
+def prepare_outputs(
+    source: FrameSource,
+    prompts: ParsedPrompts,
+    labels_mode: str,
+    output_masks_dir: str,
+    output_overlays_dir: str,
+    write_overlays: bool,
+    mask_format: str,
+    plan: Optional[ResolutionPlan] = None,
+) -> Tuple[List[str], Dict[int, List[Prompt]], Optional[MaskStore]]:
+    """Validates a propagation request and creates its output directories (and mask store)."""
+    if len(source) == 0:
+        raise ValueError("No frames to process.")
+    if labels_mode not in MASK_MODES:
+        raise ValueError(f"Unknown labels_mode {labels_mode!r} (expected one of {', '.join(MASK_MODES)}).")
+    H, W = plan.output_size if plan is not None else source.shape()
+    obj_labels, by_frame = group_prompts(prompts)
+    if labels_mode == "composite" and len(obj_labels) > 254:
+        raise ValueError(f"Composite masks hold at most 254 labels, got {len(obj_labels)}.")
+
+    out_masks_dir = Path(output_masks_dir)
+    out_masks_dir.mkdir(parents=True, exist_ok=True)
+    if write_overlays:
+        Path(output_overlays_dir).mkdir(parents=True, exist_ok=True)
+    store = None
+    if mask_format == "store":
+        store = MaskStore.create(out_masks_dir, source.names(), H, W, labels=obj_labels, mode=labels_mode)
+    elif labels_mode == "per_label":
+        for label in obj_labels:
+            (out_masks_dir / label_dirname(label)).mkdir(exist_ok=True)
+    return obj_labels, by_frame, store
 
 class SAM2VideoPropagator:
-    def __init__(self, model_type: str, checkpoint_path: str, device: str = "cuda"):
+    # Whether _segment_frame runs predictor.model. It does not yet (see its TODO), so the CPU model
+    # modes are neither applied nor reported; subclasses that run the model set this
+    runs_model = False
+
+    def __init__(self, model_type: str, checkpoint_path: str, device: str = "cuda", predictor=None,
+                 cpu_profile: Optional[CPUProfile] = None):
         self.model_type = model_type
         self.checkpoint_path = checkpoint_path
-        self.device = device if torch.cuda.is_available() and device == "cuda" else "cpu"
-        self.predictor = self._load_predictor()
+        self.device = resolve_device(device)
+        # Without a GPU, cpu_profile selects threads, layout, bf16/int8 and compilation (see app.cpu_accel)
+        self.accel = CPUAccelerator(cpu_profile or CPUProfile(), self.device)
+        self.predictor = predictor if predictor is not None else self._load_predictor()
+        if self.runs_model and getattr(self.predictor, "model", None) is not None:
+            self.predictor.model = self.accel.optimize(self.predictor.model)
+        self.overlay = OverlayRenderer(alpha=0.4)
+
+    def reset(self):
+        # Clear per-video state so a loaded predictor can be reused by the next job.
+        try:
+            self.predictor.reset()
+        except Exception:
+            pass
 
     def _load_predictor(self):
         """
@@ -55,117 +226,362 @@ class SAM2VideoPropagator:
         predictor = SAM2VideoPredictor(model, device=self.device)
         return predictor
 
-    def _draw_overlay(self, image: np.ndarray, mask: np.ndarray, color=(0, 0, 255), alpha=0.4) -> np.ndarray:
-        overlay = image.copy()
-        red = np.zeros_like(image)
-        red[..., 2] = 255
-        mask_bool = mask.astype(bool)
-        overlay[mask_bool] = (1 - alpha) * overlay[mask_bool] + alpha * red[mask_bool]
-        return overlay
+    def warmup(self, height: int = 256, width: int = 256) -> float:
+        """
+        Segments one blank frame with a box prompt and encodes the mask, so one-off costs (deferred
+        imports, kernel selection, allocator growth) are paid before the first job. Returns seconds.
+        """
+        t0 = time.perf_counter()
+        box = BoxPrompt(frame=1, x1=width / 4, y1=height / 4, x2=3 * width / 4, y2=3 * height / 4, label="warmup")
+        with self.accel.inference():
+            planes = self._segment_frame(np.zeros((height, width, 3), np.uint8), [box], {"warmup": 0})
+        cv2.imencode(".png", planes_to_mask(planes, "single"))
+        self.reset()
+        return time.perf_counter() - t0
+
+    def _draw_overlay(self, image: np.ndarray, mask: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        # Binary masks (255) render red, label-index masks get one palette color per label.
+        return self.overlay.render(image, mask, out=out)
 
     def propagate(
         self,
-        frame_paths: Iterable[Path],
+        frames: Union[FrameSource, Iterable[Path]],
         prompts: ParsedPrompts,
         labels_mode: str,
         progress_cb: ProgressCB,
         output_masks_dir: str,
         output_overlays_dir: str,
+        should_stop: Optional[StopCB] = None,
+        write_overlays: bool = True,
+        prefetch: int = 4,
+        writers: int = 2,
+        memory_frames: int = 1,
+        mask_format: str = "png",
+        frame_cb: Optional[FrameCB] = None,
+        resolution: Optional[ProcessingResolution] = None,
     ) -> PropagationResult:
-        frame_paths = list(frame_paths)
-        H, W = None, None
-        if not frame_paths:
-            raise ValueError("No frames to process.")
-
-        # Read first frame shape
-        img0 = cv2.imread(str(frame_paths[0]))
-        H, W = img0.shape[:2]
-
-        # Group prompts by label/object
-        # This allows multi-object propagation if the predictor API supports it.
-        by_label: Dict[str, Dict[str, List]] = {}
-        for b in prompts.boxes:
-            by_label.setdefault(b.label, {}).setdefault("boxes", []).append(b)
-        for p in prompts.points:
-            by_label.setdefault(p.label, {}).setdefault("points", []).append(p)
-        for m in prompts.masks:
-            by_label.setdefault(m.label, {}).setdefault("masks", []).append(m)
-
-        obj_labels = list(by_label.keys()) if by_label else ["object"]
-
-        # Pseudo-code: Add prompts for each labeled frame, then run propagation.
-        # Actual SAM2 API may differ. Replace the following pseudo with the correct calls.
-
-        # Prepare output dirs
-        out_masks_dir = Path(output_masks_dir)
-        out_overlays_dir = Path(output_overlays_dir)
-        out_masks_dir.mkdir(parents=True, exist_ok=True)
-        out_overlays_dir.mkdir(parents=True, exist_ok=True)
-
-        total = len(frame_paths)
-        # Placeholder mask accumulator (for simple single-object scenario)
-        # For multi-object, you'd compose or save per-object.
-        accumulated_masks = [np.zeros((H, W), dtype=np.uint8) for _ in frame_paths]
-
-        # Add prompts to predictor (example-style, to be adapted to API)
+        """
+        Runs as a three-stage pipeline: a reader thread prefetches up to `prefetch` decoded frames,
+        the calling thread computes masks, and a pool of `writers` threads renders overlays and
+        encodes/writes PNGs. At most 2 * writers frames wait on the writers (backpressure), and
+        progress_cb (and frame_cb with the 0-based index) is called in frame order once a frame's
+        outputs are on disk.
+
+        Memory is independent of video length: only the last `memory_frames` masks are kept as
+        temporal state, and finished frames are released once written.
+
+        All labelled objects are propagated in the same pass, one mask plane per object. labels_mode
+        selects the PNG written per frame: "single" (union of all objects as 0/255), "composite"
+        (label index k+1 per object, later labels win on overlap) or "per_label" (composite view
+        plus one 0/255 PNG per object in a subdirectory named after the label).
+
+        mask_format "png" writes PNGs into output_masks_dir; "store" writes a single MaskStore with
+        every object plane there instead (PNGs are then produced on request).
+
+        With a `resolution` that reduces the frames, tracking runs on downscaled frames and prompts
+        and the writers upsample each frame's masks to the frame size (unless the output stays at
+        the processing size, see ProcessingResolution).
+        """
+        source = as_frame_source(frames)
+        work, prompts, plan = scale_inputs(source, prompts, resolution)
+        obj_labels, by_frame, store = prepare_outputs(
+            source, prompts, labels_mode, output_masks_dir, output_overlays_dir, write_overlays, mask_format, plan)
+        label_index = {label: k for k, label in enumerate(obj_labels)}
+        timings = StageTimer()
+        write = self._mask_writer(source, labels_mode, obj_labels, output_masks_dir, output_overlays_dir,
+                                  store, write_overlays, timings, plan)
+        total = len(source)
+
+        def done(i: int):
+            if frame_cb is not None:
+                frame_cb(i)
+            progress_cb(int(100.0 * (i+1) / total), f"Processed frame {i+1}/{total}")
+
+        self.reset()
+        started = time.perf_counter()
         try:
-            self.predictor.reset()
-        except Exception:
-            pass
-
-        # The following block is conceptual; replace with actual predictor methods
-        # when integrating with the real SAM2 video API.
-        # For each label/object, add prompts at their respective frames.
-        # Then call something like predictor.propagate(frame_paths) -> returns masks per frame per object.
-
-        # Begin naive loop fallback (if no API ready): per-frame SAM segmentation using box/point/mask on that frame only.
-        # This is NOT true temporal propagation, but serves as a safe fallback structure.
-        # Replace this with the actual video propagation call for production use.
-        for i, fp in enumerate(frame_paths):
-            img = cv2.imread(str(fp))
-            frame_index_1based = i + 1
-
-            # Select prompts that belong to this frame (1-based)
-            frame_boxes = [b for b in prompts.boxes if b.frame == frame_index_1based]
-            frame_points = [p for p in prompts.points if p.frame == frame_index_1based]
-            frame_masks = [m for m in prompts.masks if m.frame == frame_index_1based]
-
-            # TODO: Replace with predictor.add_box/frame, predictor.add_point/frame, predictor.add_mask/frame style calls.
-            # For now, compose a heuristic mask from provided prompts:
-            mask = np.zeros((img.shape[0], img.shape[1]), dtype=np.uint8)
-
-            # Convert boxes to masks
-            for b in frame_boxes:
-                x1, y1, x2, y2 = map(int, [b.x1, b.y1, b.x2, b.y2])
-                mask[y1:y2, x1:x2] = 255
-
-            # Inflate points into small disks as a stand-in
-            for p in frame_points:
-                cx, cy = int(p.x), int(p.y)
-                cv2.circle(mask, (cx, cy), radius=8, color=255, thickness=-1)
-
-            # Merge any direct masks
-            for m in frame_masks:
-                mm = (m.mask.astype(bool)).astype(np.uint8) * 255
-                mask = np.maximum(mask, mm)
-
-            # If no per-frame prompt present, carry forward last mask (super naive temporal prior)
-            if mask.sum() == 0 and i > 0:
-                mask = accumulated_masks[i-1].copy()
-
-            accumulated_masks[i] = mask
-
-            # Save mask and overlay
-            mask_name = fp.name.replace(fp.suffix, ".png")
-            overlay = self._draw_overlay(img, mask, color=(0, 0, 255), alpha=0.4)
-
-            cv2.imwrite(str(out_masks_dir / mask_name), mask)
-            cv2.imwrite(str(out_overlays_dir / mask_name), overlay)
-
-            pct = int(100.0 * (i+1) / total)
-            progress_cb(pct, f"Processed frame {i+1}/{total}")
+            self._track(work, range(total), by_frame, label_index, write, done, should_stop,
+                        prefetch=prefetch, writers=writers, memory_frames=memory_frames, timings=timings)
+        finally:
+            if store is not None:
+                store.close()
 
         # Note: Replace the above fallback with the true SAM2 propagation pipeline
         # using your installed SAM2 video predictor API.
 
-        return PropagationResult(object_labels=obj_labels)
\ No newline at end of file
+        return PropagationResult(object_labels=obj_labels, frames=total, elapsed_s=time.perf_counter() - started,
+                                 timings=timings.summary(), resolution=plan.describe() if plan else {})
+
+    def repropagate(
+        self,
+        frames: Union[FrameSource, Iterable[Path]],
+        prompts: ParsedPrompts,
+        labels_mode: str,
+        dirty: Sequence[int],
+        progress_cb: ProgressCB,
+        output_masks_dir: str,
+        output_overlays_dir: str,
+        should_stop: Optional[StopCB] = None,
+        write_overlays: bool = True,
+        prefetch: int = 4,
+        writers: int = 2,
+        memory_frames: int = 1,
+        frame_cb: Optional[FrameCB] = None,
+        resolution: Optional[ProcessingResolution] = None,
+    ) -> PropagationResult:
+        """
+        Re-run over the MaskStore of a previous propagate() whose prompts changed only on the
+        `dirty` frames (0-based). Tracking resumes at each dirty frame from the stored masks of the
+        frame before it, and stops once it produces exactly the stored masks again on a frame with
+        unchanged prompts: from there on the old results are what a full run would compute.
+        """
+        source = as_frame_source(frames)
+        store = MaskStore.open(Path(output_masks_dir))
+        if store is None:
+            raise ValueError("No mask store to re-run over.")
+        work, prompts, plan = scale_inputs(source, prompts, resolution)
+        obj_labels, by_frame = group_prompts(prompts)
+        label_index = {label: k for k, label in enumerate(obj_labels)}
+        if write_overlays:
+            Path(output_overlays_dir).mkdir(parents=True, exist_ok=True)
+        timings = StageTimer()
+        write = self._mask_writer(source, labels_mode, obj_labels, output_masks_dir, output_overlays_dir,
+                                  store, write_overlays, timings, plan)
+        total = len(source)
+        todo = sorted(set(dirty))
+        dirty_set = set(todo)
+
+        def done(i: int):
+            if frame_cb is not None:
+                frame_cb(i)
+            progress_cb(int(100.0 * (i+1) / total), f"Re-propagated frame {i+1}/{total}")
+
+        def converged(i: int, planes: np.ndarray) -> bool:
+            if i in dirty_set:
+                return False
+            with timings.stage("compare_stored"):
+                if plan is not None:
+                    planes = plan.to_output(planes, source.read(i) if plan.refine_edges else None)
+                return np.array_equal(planes, store.read(i))
+
+        self.reset()
+        started = time.perf_counter()
+        computed = 0
+        try:
+            while todo:
+                start = todo[0]
+                seed = store.read(start - 1) if start > 0 else None
+                if seed is not None and plan is not None:
+                    seed = plan.from_output(seed)
+                n = self._track(work, range(start, total), by_frame, label_index, write, done, should_stop,
+                                prefetch=prefetch, writers=writers, memory_frames=memory_frames,
+                                seed=seed, stop_when=converged, timings=timings)
+                computed += n
+                todo = [i for i in todo if i >= start + max(n, 1)]
+        finally:
+            store.close()
+        if frame_cb is not None:
+            frame_cb(total - 1)
+        progress_cb(100, f"Re-propagated {computed}/{total} frames")
+        return PropagationResult(object_labels=obj_labels, frames=total, elapsed_s=time.perf_counter() - started,
+                                 computed=computed, timings=timings.summary(),
+                                 resolution=plan.describe() if plan else {})
+
+    def _mask_writer(
+        self,
+        source: FrameSource,
+        labels_mode: str,
+        obj_labels: List[str],
+        output_masks_dir: str,
+        output_overlays_dir: str,
+        store: Optional[MaskStore],
+        write_overlays: bool,
+        timings: Optional[StageTimer] = None,
+        plan: Optional[ResolutionPlan] = None,
+    ) -> Callable[[int, np.ndarray, np.ndarray], None]:
+        # With a plan, frames and planes arrive at the processing size; source has the full-size frames
+        out_masks_dir = Path(output_masks_dir)
+        timings = timings if timings is not None else StageTimer()
+        out_overlays_dir = Path(output_overlays_dir)
+        overlay_bufs = threading.local()
+
+        def write(i: int, img: np.ndarray, planes: np.ndarray):
+            if plan is not None and plan.full_output:
+                with timings.stage("mask_upsample"):
+                    if write_overlays or plan.refine_edges:
+                        img = source.read(i)
+                    planes = plan.to_output(planes, img if plan.refine_edges else None)
+            mask_name = Path(source.name(i)).stem + ".png"
+            view = planes_to_mask(planes, labels_mode)
+            with timings.stage("mask_write"):
+                if store is not None:
+                    store.write(i, planes)
+                else:
+                    cv2.imwrite(str(out_masks_dir / mask_name), view)
+                    if labels_mode == "per_label":
+                        for k, label in enumerate(obj_labels):
+                            cv2.imwrite(str(out_masks_dir / label_dirname(label) / mask_name), planes[k] * np.uint8(255))
+            if write_overlays:
+                # One output buffer per writer thread; frames may be shared with the source cache
+                buf = getattr(overlay_bufs, "buf", None)
+                if buf is None or buf.shape != img.shape:
+                    buf = overlay_bufs.buf = np.empty_like(img)
+                with timings.stage("overlay_render"):
+                    overlay = self._draw_overlay(img, view, out=buf)
+                with timings.stage("overlay_write"):
+                    cv2.imwrite(str(out_overlays_dir / mask_name), overlay)
+
+        return write
+
+    def _track(
+        self,
+        source: FrameSource,
+        order: Sequence[int],
+        by_frame: Dict[int, List[Prompt]],
+        label_index: Dict[str, int],
+        write: Callable[[int, np.ndarray, np.ndarray], None],
+        done_cb: FrameCB,
+        should_stop: Optional[StopCB] = None,
+        prefetch: int = 4,
+        writers: int = 2,
+        memory_frames: int = 1,
+        seed: Optional[np.ndarray] = None,
+        stop_when: Optional[Callable[[int, np.ndarray], bool]] = None,
+        timings: Optional[StageTimer] = None,
+    ) -> int:
+        """
+        Tracks every object over the frames in `order` (ascending or descending) with the pipeline
+        described in propagate(); done_cb gets each 0-based index in `order` once it is written.
+        seed holds the planes carried into the first frame (state propagated from outside `order`).
+        Tracking ends early, without writing that frame, once stop_when(i, planes) is true.
+
+        Stage times go to `timings`: decode (reader), inference, mask/overlay writes (writers), and
+        the time inference spent waiting on the reader (decode_wait) or on the writers (write_wait),
+        which tells which end of the pipeline is the bottleneck.
+        """
+        total = len(order)
+        timings = timings if timings is not None else StageTimer()
+        # Temporal state: ring buffer of the most recent (objects, H, W) mask planes
+        history: Deque[np.ndarray] = deque(maxlen=max(1, memory_frames))
+        if seed is not None:
+            history.append(seed)
+
+        writers = max(1, writers)
+        pool = ThreadPoolExecutor(max_workers=writers, thread_name_prefix="mask-writer")
+        in_flight = threading.BoundedSemaphore(writers * 2)
+        pending: Deque[Tuple[int, Future]] = deque()
+
+        def write_outputs(i: int, img: np.ndarray, planes: np.ndarray):
+            try:
+                write(i, img, planes)
+            finally:
+                in_flight.release()
+
+        def report_done(block: bool):
+            # Report completed frames strictly in order; raises if a write failed.
+            while pending and (block or pending[0][1].done()):
+                i, fut = pending.popleft()
+                fut.result()
+                done_cb(i)
+
+        n = 0
+        reader = _FramePrefetcher(source, order, depth=prefetch, timings=timings)
+        try:
+            waited = time.perf_counter()
+            for i, img in reader:
+                timings.add("decode_wait", time.perf_counter() - waited)
+                if should_stop is not None and should_stop():
+                    raise PropagationCancelled(f"Cancelled after {n}/{total} frames.")
+
+                # All objects of a frame are segmented in one step over the same decoded frame
+                with timings.stage("inference"), self.accel.inference():
+                    planes = self._segment_frame(img, by_frame.get(i + 1, ()), label_index)
+
+                # Objects without a prompt on this frame carry their last mask forward
+                # (super naive temporal prior)
+                if history:
+                    empty = ~planes.reshape(len(label_index), -1).any(axis=1)
+                    planes[empty] = history[-1][empty]
+
+                if stop_when is not None and stop_when(i, planes):
+                    break
+                history.append(planes)
+
+                # Save mask and overlay on the writer pool; blocks while the writers are saturated
+                with timings.stage("write_wait"):
+                    in_flight.acquire()
+                pending.append((i, pool.submit(write_outputs, i, img, planes)))
+                report_done(block=False)
+                n += 1
+                waited = time.perf_counter()
+
+            report_done(block=True)
+        finally:
+            reader.close()
+            pool.shutdown(wait=True)
+        return n
+
+    def _seed_planes(
+        self,
+        source: FrameSource,
+        by_frame: Dict[int, List[Prompt]],
+        label_index: Dict[str, int],
+        seed: int,
+        forward: bool,
+    ) -> np.ndarray:
+        """
+        Object planes a segment starting at keyframe `seed` (0-based) inherits: each object takes
+        its mask from the nearest prompted frame behind the direction of travel (at or before the
+        seed going forward, at or after it going backward) and, if it has none there, from the
+        nearest one ahead.
+        """
+        keyframes = sorted(f - 1 for f in by_frame if 0 < f <= len(source))
+        behind = [k for k in keyframes if (k <= seed if forward else k >= seed)]
+        ahead = [k for k in keyframes if (k > seed if forward else k < seed)]
+        behind.sort(key=lambda k: abs(k - seed))
+        ahead.sort(key=lambda k: abs(k - seed))
+        planes = None
+        for k in behind + ahead:
+            with self.accel.inference():
+                frame_planes = self._segment_frame(source.read(k), by_frame[k + 1], label_index)
+            if planes is None:
+                planes = frame_planes
+                continue
+            empty = ~planes.reshape(len(label_index), -1).any(axis=1)
+            if not empty.any():
+                break
+            planes[empty] = frame_planes[empty]
+        if planes is None:
+            H, W = source.shape()
+            planes = np.zeros((len(label_index), H, W), dtype=np.uint8)
+        return planes
+
+    def _segment_frame(
+        self,
+        img: np.ndarray,
+        frame_prompts: Iterable[Prompt],
+        label_index: Dict[str, int],
+    ) -> np.ndarray:
+        """
+        Masks of every object on one frame as uint8 0/1 planes (objects, H, W).
+
+        The frame is encoded once and shared by all objects; with the SAM2 video predictor this is
+        where the per-frame image embedding is computed and the prompts of all objects are
+        decoded against it in one batch.
+        TODO: Replace with predictor.add_box/frame, predictor.add_point/frame, predictor.add_mask/frame style calls.
+        For now, compose a heuristic mask per object from its prompts on this frame.
+        """
+        planes = np.zeros((len(label_index), img.shape[0], img.shape[1]), dtype=np.uint8)
+        for pr in frame_prompts:
+            plane = planes[label_index[pr.label]]
+            if isinstance(pr, BoxPrompt):
+                # Convert boxes to masks
+                x1, y1, x2, y2 = map(int, [pr.x1, pr.y1, pr.x2, pr.y2])
+                plane[y1:y2, x1:x2] = 1
+            elif isinstance(pr, PointPrompt):
+                # Inflate points into small disks as a stand-in
+                cv2.circle(plane, (int(pr.x), int(pr.y)), radius=8, color=1, thickness=-1)
+            else:
+                # Merge direct masks
+                np.maximum(plane, pr.mask.astype(bool), out=plane, casting="unsafe")
+        return planes
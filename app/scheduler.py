@@ -0,0 +1,135 @@
+import heapq
+import itertools
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.progress import JobStore, process_owner
+from app.sam2_infer import PropagationCancelled
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobScheduler:
+    """
+    Bounded worker pool for propagation jobs.
+
+    Jobs wait in a priority queue (lower value runs first, FIFO within a priority) and are executed
+    by at most max_workers threads. submit() raises QueueFull once max_queue jobs are waiting.
+    Queued jobs are cancelled by removing them from the queue; running jobs are cancelled
+    cooperatively through JobStore.request_cancel, which the job polls between frames. A cancel
+    requested through the store by another process also skips a job that has not started yet.
+
+    shutdown() does not cancel running jobs: jobs pass `stopping.is_set` as their should_stop, stop
+    between frames, and are left queued under this (then dead) process, so the next start's
+    recover_jobs resumes them.
+    """
+
+    def __init__(self, jobs: JobStore, max_workers: int = 1, max_queue: int = 16):
+        self.jobs = jobs
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._heap: List[Tuple[int, int, str]] = []
+        self._fns: Dict[str, Callable[[], None]] = {}
+        self._running: Dict[str, threading.Thread] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+        self.stopping = threading.Event()
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._stopped = False
+            self.stopping.clear()
+            for i in range(self.max_workers):
+                t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def shutdown(self, timeout: float = 30.0):
+        # Running jobs stop at their next frame; wait (up to timeout) so their state is written
+        with self._cond:
+            self._stopped = True
+            self.stopping.set()
+            self._cond.notify_all()
+            running = list(self._running.values())
+        for t in running:
+            t.join(timeout)
+        self._threads = []
+
+    def submit(self, job_id: str, fn: Callable[[], None], priority: int = 0) -> int:
+        self.start()
+        with self._cond:
+            if job_id in self._fns or job_id in self._running:
+                raise ValueError(f"Job {job_id} is already queued or running.")
+            if len(self._heap) >= self.max_queue:
+                raise QueueFull(f"Job queue is full ({self.max_queue} waiting).")
+            self._fns[job_id] = fn
+            heapq.heappush(self._heap, (priority, next(self._seq), job_id))
+            self.jobs.update(job_id, status="queued", progress=0, message="Queued", cancel_requested=False,
+                             owner=process_owner())
+            self._cond.notify()
+            return self._position_locked(job_id)
+
+    def _position_locked(self, job_id: str) -> Optional[int]:
+        for pos, (_, _, jid) in enumerate(sorted(self._heap), start=1):
+            if jid == job_id:
+                return pos
+        return None
+
+    def position(self, job_id: str) -> Optional[int]:
+        # 1-based position among waiting jobs; None if the job is not waiting.
+        with self._cond:
+            if job_id not in self._fns:
+                return None
+            return self._position_locked(job_id)
+
+    def queue_length(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def is_active(self, job_id: str) -> bool:
+        with self._cond:
+            return job_id in self._fns or job_id in self._running
+
+    def cancel(self, job_id: str) -> bool:
+        with self._cond:
+            if job_id in self._fns:
+                del self._fns[job_id]
+                self._heap = [e for e in self._heap if e[2] != job_id]
+                heapq.heapify(self._heap)
+                self.jobs.update(job_id, status="cancelled", message="Cancelled before start.")
+                return True
+            if job_id in self._running:
+                return self.jobs.request_cancel(job_id)
+        return False
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                _, _, job_id = heapq.heappop(self._heap)
+                fn = self._fns.pop(job_id)
+                self._running[job_id] = threading.current_thread()
+            try:
+                if self.jobs.is_cancel_requested(job_id):
+                    self.jobs.update(job_id, status="cancelled", message="Cancelled before start.")
+                    continue
+                fn()
+            except PropagationCancelled as e:
+                if self.stopping.is_set():
+                    self.jobs.update(job_id, status="queued", progress=0, message="Server stopped; resumes on restart.")
+                else:
+                    self.jobs.update(job_id, status="failed", message=str(e))
+            except Exception as e:
+                self.jobs.update(job_id, status="failed", message=str(e))
+            finally:
+                with self._cond:
+                    self._running.pop(job_id, None)
@@ -0,0 +1,285 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from app.frame_source import FrameSource, as_frame_source
+from app.labelstudio_parser import ParsedPrompts
+from app.mask_store import MaskStore
+from app.metrics import StageSummary, StageTimer
+from app.predictor_pool import PredictorPool
+from app.resolution import ProcessingResolution, ResolutionPlan
+from app.sam2_infer import (
+    FrameCB, ProgressCB, PropagationCancelled, PropagationResult, SAM2VideoPropagator, StopCB,
+    group_prompts, prepare_outputs, scale_inputs,
+)
+
+
+@dataclass(frozen=True)
+class Segment:
+    seed: int  # 0-based keyframe the segment starts from
+    frames: range  # 0-based frames in propagation order (descending for backward segments)
+
+    @property
+    def forward(self) -> bool:
+        return self.frames.step > 0
+
+
+def plan_segments(total: int, keyframes: Iterable[int]) -> List[Segment]:
+    """
+    Partition frames [0, total) at the prompted keyframes (0-based). Every frame belongs to its
+    nearest keyframe (ties go to the earlier one, frames before the first keyframe to the first,
+    after the last to the last), and each keyframe propagates backward and forward into its frames
+    as two independent segments. The keyframe itself is in both; the forward segment writes it.
+    """
+    keys = sorted({k for k in keyframes if 0 <= k < total})
+    if not keys:
+        return [Segment(seed=0, frames=range(0, total))]
+    segments = []
+    for j, k in enumerate(keys):
+        lo = (keys[j - 1] + k) // 2 + 1 if j else 0
+        hi = (k + keys[j + 1]) // 2 if j + 1 < len(keys) else total - 1
+        if lo < k:
+            segments.append(Segment(seed=k, frames=range(k - 1, lo - 1, -1)))
+        segments.append(Segment(seed=k, frames=range(k, hi + 1)))
+    # Longest first so short segments fill in behind them
+    return sorted(segments, key=lambda s: -len(s.frames))
+
+
+def _usable_cores() -> int:
+    # Honours CPU pinning (app.worker --cpus): spawned processes inherit the affinity
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# -- worker process side ---------------------------------------------------------------------------
+
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(factory, model_type: str, checkpoint_path: str, device: str, events, stop, threads: int):
+    _worker.update(factory=factory, key=(model_type, checkpoint_path, device), events=events, stop=stop)
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+
+def _worker_propagator() -> SAM2VideoPropagator:
+    # Loaded on the first segment and kept for the life of the process
+    if "propagator" not in _worker:
+        model_type, checkpoint_path, device = _worker["key"]
+        _worker["propagator"] = _worker["factory"](model_type=model_type, checkpoint_path=checkpoint_path, device=device)
+    return _worker["propagator"]
+
+
+def _run_segment(token: str, segment: Segment, source: FrameSource, prompts: ParsedPrompts, labels_mode: str,
+                 output_masks_dir: str, output_overlays_dir: str, write_overlays: bool, mask_format: str,
+                 prefetch: int, writers: int, memory_frames: int, plan: Optional[ResolutionPlan]) -> StageSummary:
+    # Returns the segment's stage timings, merged into the job's by the parent; prompts are already
+    # at the plan's processing size
+    propagator = _worker_propagator()
+    events, stop = _worker["events"], _worker["stop"]
+    obj_labels, by_frame = group_prompts(prompts)
+    label_index = {label: k for k, label in enumerate(obj_labels)}
+    store = MaskStore.open(Path(output_masks_dir)) if mask_format == "store" else None
+    timings = StageTimer()
+    write = propagator._mask_writer(source, labels_mode, obj_labels, output_masks_dir, output_overlays_dir,
+                                    store, write_overlays, timings, plan)
+    work = plan.frames(source) if plan is not None else source
+    propagator.reset()
+    try:
+        seed = propagator._seed_planes(work, by_frame, label_index, segment.seed, segment.forward)
+        propagator._track(
+            work, segment.frames, by_frame, label_index, write,
+            done_cb=lambda i: events.put((token, i)),
+            should_stop=stop.is_set,
+            prefetch=prefetch, writers=writers, memory_frames=memory_frames,
+            seed=seed, timings=timings,
+        )
+        return timings.summary()
+    finally:
+        propagator.reset()
+        source.close()
+        if store is not None:
+            store.close()
+
+
+def _warm_worker() -> float:
+    return _worker_propagator().warmup()
+
+
+# -- API/worker process side -----------------------------------------------------------------------
+
+class _SegmentedPropagator:
+    """propagate() with the signature of SAM2VideoPropagator.propagate, run over a segment pool."""
+
+    def __init__(self, executor: ProcessPoolExecutor, events, stop, workers: int):
+        self._executor = executor
+        self._events = events
+        self._stop = stop
+        self.workers = workers
+
+    def propagate(
+        self,
+        frames: Union[FrameSource, Iterable[Path]],
+        prompts: ParsedPrompts,
+        labels_mode: str,
+        progress_cb: ProgressCB,
+        output_masks_dir: str,
+        output_overlays_dir: str,
+        should_stop: Optional[StopCB] = None,
+        write_overlays: bool = True,
+        prefetch: int = 4,
+        writers: int = 2,
+        memory_frames: int = 1,
+        mask_format: str = "png",
+        frame_cb: Optional[FrameCB] = None,
+        resolution: Optional[ProcessingResolution] = None,
+    ) -> PropagationResult:
+        """
+        Segments run concurrently, so frames finish out of order: frame_cb gets the last frame of
+        the finished leading run, progress_cb the share of all frames written.
+        """
+        source = as_frame_source(frames)
+        _, prompts, plan = scale_inputs(source, prompts, resolution)
+        obj_labels, by_frame, store = prepare_outputs(
+            source, prompts, labels_mode, output_masks_dir, output_overlays_dir, write_overlays, mask_format, plan)
+        if store is not None:
+            store.close()  # the workers write into it
+        total = len(source)
+        segments = plan_segments(total, (f - 1 for f in by_frame))
+
+        token = uuid.uuid4().hex
+        self._stop.clear()
+        started = time.perf_counter()
+        futures: List[Future] = [
+            self._executor.submit(
+                _run_segment, token, seg, source, prompts, labels_mode, output_masks_dir, output_overlays_dir,
+                write_overlays, mask_format, prefetch, writers, memory_frames, plan,
+            )
+            for seg in segments
+        ]
+        done = bytearray(total)
+        n_done = 0
+        leading = 0
+
+        def drain(timeout: float):
+            nonlocal n_done, leading
+            try:
+                item = self._events.get(timeout=timeout)
+                while True:
+                    msg_token, i = item
+                    if msg_token == token and not done[i]:
+                        done[i] = 1
+                        n_done += 1
+                    item = self._events.get_nowait()
+            except queue.Empty:
+                pass
+            prev = leading
+            while leading < total and done[leading]:
+                leading += 1
+            if leading > prev and frame_cb is not None:
+                frame_cb(leading - 1)
+            progress_cb(int(100.0 * n_done / total), f"Processed {n_done}/{total} frames in {len(segments)} segments")
+
+        try:
+            while not all(f.done() for f in futures):
+                if should_stop is not None and should_stop():
+                    self._stop.set()
+                drain(timeout=0.1)
+            if self._stop.is_set():
+                raise PropagationCancelled(f"Cancelled after {n_done}/{total} frames.")
+            timings = StageTimer()
+            for f in futures:
+                timings.merge(f.result())  # first failure wins
+        except BaseException:
+            # Stop the remaining segments before the pool is handed to the next job
+            self._stop.set()
+            for f in futures:
+                f.cancel()
+            wait(futures)
+            raise
+        # Every segment returned, so every frame is written (late progress events are not awaited)
+        if frame_cb is not None and leading < total:
+            frame_cb(total - 1)
+        progress_cb(100, f"Processed {total}/{total} frames in {len(segments)} segments")
+
+        return PropagationResult(object_labels=obj_labels, frames=total, elapsed_s=time.perf_counter() - started,
+                                 timings=timings.summary(), resolution=plan.describe() if plan else {})
+
+
+class SegmentPool:
+    """
+    Worker processes for keyframe-segmented propagation (see plan_segments). Each process loads
+    its own propagator on its first segment and keeps it, so model loading is paid once per process
+    rather than per job. One (model_type, checkpoint, device) is kept at a time; jobs take the pool
+    one at a time, like jobs sharing a PredictorPool entry.
+
+    factory must be picklable (a module-level callable): the processes are spawned.
+    """
+
+    def __init__(self, workers: int = 0, factory: Callable[..., SAM2VideoPropagator] = SAM2VideoPropagator):
+        self.workers = workers if workers > 0 else _usable_cores()
+        self._factory = factory
+        self._ctx = multiprocessing.get_context("spawn")  # callers are threaded; avoid fork
+        self._key: Optional[Tuple[str, str, str]] = None
+        self._propagator: Optional[_SegmentedPropagator] = None
+        self._lock = threading.Lock()
+
+    def _start(self, key: Tuple[str, str, str]) -> _SegmentedPropagator:
+        self.shutdown()
+        events, stop = self._ctx.Queue(), self._ctx.Event()
+        threads = max(1, _usable_cores() // self.workers)
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=self._ctx, initializer=_init_worker,
+            initargs=(self._factory, *key, events, stop, threads),
+        )
+        self._key = key
+        self._propagator = _SegmentedPropagator(executor, events, stop, self.workers)
+        return self._propagator
+
+    @contextmanager
+    def acquire(
+        self, model_type: str, checkpoint_path: str, device: str
+    ) -> Iterator[Tuple[_SegmentedPropagator, Dict[str, Any]]]:
+        key = PredictorPool.make_key(model_type, checkpoint_path, device)
+        wait_t0 = time.perf_counter()
+        with self._lock:
+            hit = self._key == key and self._propagator is not None
+            propagator = self._propagator if hit else self._start(key)
+            try:
+                yield propagator, dict(
+                    segment_workers=self.workers,
+                    pool_hit=hit,
+                    wait_time_s=round(time.perf_counter() - wait_t0, 3),
+                )
+            except BrokenProcessPool:
+                self.shutdown()  # a worker died; the next job starts fresh processes
+                raise
+
+    def warmup(self, model_type: str, checkpoint_path: str, device: str) -> Dict[str, Any]:
+        """
+        Start the processes and have each load its model and run one dummy frame. Best effort:
+        one warmup task is queued per process, and the executor normally hands them out one each.
+        """
+        with self.acquire(model_type, checkpoint_path, device) as (propagator, info):
+            t0 = time.perf_counter()
+            for f in [propagator._executor.submit(_warm_worker) for _ in range(self.workers)]:
+                f.result()
+            return dict(info, warmup_s=round(time.perf_counter() - t0, 3))
+
+    def shutdown(self):
+        if self._propagator is not None:
+            self._propagator._executor.shutdown(wait=True, cancel_futures=True)
+            self._propagator = None
+            self._key = None
@@ -0,0 +1,81 @@
+import os
+import threading
+from typing import Any, Dict, Optional
+
+
+def available_memory_bytes() -> Optional[int]:
+    # MemAvailable from /proc/meminfo (Linux). None when it cannot be determined.
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except Exception:
+        pass
+    return None
+
+
+def cuda_free_bytes() -> Optional[int]:
+    try:
+        import torch
+        if torch.cuda.is_available():
+            free, _total = torch.cuda.mem_get_info()
+            return int(free)
+    except Exception:
+        pass
+    return None
+
+
+def current_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    try:
+        import resource
+        # ru_maxrss is the process high-water mark (KiB on Linux), a fallback when statm is unavailable
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return None
+
+
+class PeakRSSMonitor:
+    """
+    Samples process RSS on a background thread while active. RSS is process-wide, so with
+    concurrent jobs the peak includes memory held by the other jobs.
+    """
+
+    def __init__(self, interval_s: float = 0.25):
+        self.interval_s = interval_s
+        self.start_bytes: Optional[int] = None
+        self.peak_bytes: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss is not None and (self.peak_bytes is None or rss > self.peak_bytes):
+            self.peak_bytes = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self._sample()
+
+    def __enter__(self) -> "PeakRSSMonitor":
+        self.start_bytes = current_rss_bytes()
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        return False
+
+    def summary(self) -> Dict[str, Any]:
+        mb = lambda b: round(b / (1024 * 1024), 1) if b is not None else None
+        return dict(rss_start_mb=mb(self.start_bytes), peak_rss_mb=mb(self.peak_bytes))
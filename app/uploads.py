@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import aiofiles
+from fastapi import Request
+
+try:
+    from python_multipart import MultipartParser
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart import MultipartParser
+    from multipart.multipart import parse_options_header
+
+FORM_OVERHEAD = 64 * 1024  # allowance for boundaries, part headers and text fields around the file
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def safe_filename(name: str, default: str = "upload") -> str:
+    # Drop any client-supplied directory components.
+    name = Path(name or "").name
+    return name if name not in ("", ".", "..") else default
+
+
+@dataclass
+class ReceivedUpload:
+    """A multipart form read off the request: its text fields and its one file, staged on disk."""
+    fields: Dict[str, str]
+    filename: Optional[str] = None  # None: the form had no file part
+    path: Optional[Path] = None
+    size: int = 0
+    sha256: str = ""
+
+    def discard(self):
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+
+async def receive_upload(request: Request, staging_dir: Path, max_bytes: int = 0,
+                         chunk_size: int = 8 * 1024 * 1024, digest: bool = True) -> ReceivedUpload:
+    """
+    Parse a multipart form straight off the request stream instead of letting the framework
+    spool it first. The file part is hashed (unless digest is false), size-checked and written in
+    chunk_size pieces to a new file in staging_dir as it arrives, so it is on disk once; callers
+    move it into place with a rename (keep staging_dir on the same filesystem). Hashing runs on a
+    worker thread, off the event loop. A Content-Length that is already over the limit is refused
+    before any of the body is read.
+    """
+    declared = request.headers.get("content-length", "")
+    if max_bytes and declared.isdigit() and int(declared) > max_bytes + FORM_OVERHEAD:
+        raise UploadTooLarge(f"Upload exceeds limit of {max_bytes} bytes.")
+    ctype, params = parse_options_header(request.headers.get("content-type", ""))
+    if ctype != b"multipart/form-data" or b"boundary" not in params:
+        raise ValueError("Expected a multipart/form-data body.")
+
+    upload = ReceivedUpload(fields={})
+    h = hashlib.sha256()
+    pending = bytearray()  # file bytes parsed but not yet written
+    part: Dict[str, Any] = {}
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers=[], name=b"", value=b"", data=bytearray())
+
+    def on_header_field(data: bytes, start: int, end: int):
+        part["name"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"].append((part["name"].lower(), part["value"]))
+        part["name"], part["value"] = b"", b""
+
+    def on_headers_finished():
+        disposition = dict(part["headers"]).get(b"content-disposition", b"")
+        _, options = parse_options_header(disposition)
+        part["field"] = options.get(b"name", b"").decode("utf-8", "replace")
+        part["file"] = b"filename" in options
+        if part["file"]:
+            if upload.path is not None:
+                raise ValueError("Only one file per upload.")
+            upload.filename = options[b"filename"].decode("utf-8", "replace")
+            upload.path = staging_dir / f"{uuid.uuid4().hex}.part"
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if part.get("file"):
+            upload.size += end - start
+            if max_bytes and upload.size > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds limit of {max_bytes} bytes.")
+            pending.extend(data[start:end])
+        else:
+            part["data"].extend(data[start:end])
+            if len(part["data"]) > FORM_OVERHEAD:
+                raise ValueError(f"Form field {part['field']!r} is too large.")
+
+    def on_part_end():
+        if not part.get("file"):
+            upload.fields[part["field"]] = part["data"].decode("utf-8", "replace")
+
+    parser = MultipartParser(params[b"boundary"], dict(
+        on_part_begin=on_part_begin, on_header_field=on_header_field, on_header_value=on_header_value,
+        on_header_end=on_header_end, on_headers_finished=on_headers_finished, on_part_data=on_part_data,
+        on_part_end=on_part_end,
+    ))
+    f = None
+
+    async def flush():
+        if digest:
+            await asyncio.to_thread(h.update, pending)
+        await f.write(pending)
+        pending.clear()
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if upload.path is not None and f is None:
+                f = await aiofiles.open(upload.path, "wb")
+            if len(pending) >= chunk_size:
+                await flush()
+        parser.finalize()
+        if f is not None:
+            await flush()
+            await f.close()
+            f = None
+    except BaseException:
+        if f is not None:
+            await f.close()
+        upload.discard()
+        raise
+    upload.sha256 = h.hexdigest() if digest else ""
+    return upload
+
+
+async def append_chunk(piece: Path, part_path: Path, offset: int, max_bytes: int = 0,
+                       chunk_size: int = 8 * 1024 * 1024) -> int:
+    """
+    Append one piece of a resumable upload to part_path. offset must equal the bytes already
+    received, so a retried or out-of-order piece is rejected instead of corrupting the file.
+    Returns the total bytes received so far.
+    """
+    received = part_path.stat().st_size if part_path.exists() else 0
+    if offset != received:
+        raise ValueError(f"Offset mismatch: expected {received}, got {offset}.")
+    size = received + piece.stat().st_size
+    if max_bytes and size > max_bytes:
+        raise UploadTooLarge(f"Upload exceeds limit of {max_bytes} bytes.")
+    async with aiofiles.open(piece, "rb") as src, aiofiles.open(part_path, "ab") as f:
+        while True:
+            chunk = await src.read(chunk_size)
+            if not chunk:
+                break
+            await f.write(chunk)
+    return size
+
+
+def hash_file(path: Path, chunk_size: int = 8 * 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
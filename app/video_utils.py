@@ -1,25 +1,156 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional
-import cv2
-import os
+from typing import Callable, List, Optional, Tuple
+import multiprocessing
+import threading
+import time
+import numpy as np
 import re
 
-def extract_frames_from_video(video_path: str, out_dir: str, ext: str = "png") -> int:
+from app.lazy_imports import cv2
+from app.metrics import StageSummary, StageTimer
+
+ExtractProgressCB = Callable[[int, int], None]  # (frames_done, frames_total)
+
+def image_write_params(ext: str, png_compression: int = 1, jpeg_quality: int = 95) -> List[int]:
+    ext = ext.lower()
+    if ext == "png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+    if ext in ("jpg", "jpeg"):
+        return [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+    return []
+
+def write_frame(path: Path, frame: np.ndarray, params: Optional[List[int]] = None):
+    # .npy stores raw BGR pixels: no encode cost, largest on disk
+    if Path(path).suffix == ".npy":
+        np.save(str(path), frame, allow_pickle=False)
+    else:
+        cv2.imwrite(str(path), frame, params or [])
+
+def read_frame(path: Path) -> Optional[np.ndarray]:
+    if Path(path).suffix == ".npy":
+        return np.load(str(path), allow_pickle=False)
+    return cv2.imread(str(path))
+
+def _extract_segment(video_path: str, out_dir: str, start: int, end: Optional[int], ext: str,
+                     params: List[int], writer_threads: int) -> Tuple[int, StageSummary]:
+    # Decode frames [start, end) (end=None: until EOF) and hand them to a pool of encoder threads.
+    # cv2.imwrite releases the GIL, so encoding overlaps with decoding of the next frames.
+    # Returns the frame count and the segment's stage timings (it may run in another process).
+    timings = StageTimer()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return 0, timings.summary()
+    if start and not (cap.set(cv2.CAP_PROP_POS_FRAMES, start) and int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == start):
+        # The backend could not land on the frame (it seeks by timestamp, not every container
+        # indexes keyframes): decode serially up to it instead
+        cap.release()
+        cap = cv2.VideoCapture(video_path)
+        t0 = time.perf_counter()
+        skipped = 0
+        while skipped < start and cap.grab():
+            skipped += 1
+        timings.add("video_decode", time.perf_counter() - t0)
+        if skipped < start:
+            cap.release()
+            return 0, timings.summary()
+    out = Path(out_dir)
+    in_flight = threading.BoundedSemaphore(max(1, writer_threads) * 2)
+    count = 0
+
+    def _write(path, frame):
+        try:
+            with timings.stage("frame_write"):
+                write_frame(path, frame, params)
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=max(1, writer_threads)) as pool:
+        futures = []
+        idx = start
+        while end is None or idx < end:
+            t0 = time.perf_counter()
+            ret, frame = cap.read()
+            timings.add("video_decode", time.perf_counter() - t0)
+            if not ret:
+                break
+            in_flight.acquire()
+            futures.append(pool.submit(_write, out / f"{idx + 1:08d}.{ext}", frame))
+            idx += 1
+            count += 1
+        for f in futures:
+            f.result()
+    cap.release()
+    return count, timings.summary()
+
+def _seeks_land(video_path: str, indices: List[int]) -> bool:
+    # Whether the backend lands exactly on each frame (it seeks by timestamp, and not every
+    # container indexes its keyframes)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return all(cap.set(cv2.CAP_PROP_POS_FRAMES, i) and int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == i
+                   for i in indices)
+    finally:
+        cap.release()
+
+def extract_frames_from_video(
+    video_path: str,
+    out_dir: str,
+    ext: str = "png",
+    workers: int = 1,
+    writer_threads: int = 1,
+    png_compression: int = 1,
+    jpeg_quality: int = 95,
+    min_segment_frames: int = 256,
+    progress_cb: Optional[ExtractProgressCB] = None,
+    timings: Optional[StageTimer] = None,
+) -> int:
+    """
+    Writes frames as 00000001.<ext>, ... ext may be png, jpg or npy (raw).
+
+    With workers > 1 the frame range is split into contiguous segments decoded by separate
+    processes; each segment seeks to its first frame (the decoder resumes from the preceding
+    keyframe) and runs until its end, the last one until EOF. The segment starts are probed
+    first: if the backend cannot seek to all of them, the video is decoded in one sequential pass
+    instead, since every segment would decode from the first frame. progress_cb is called per segment.
+    Decode and write times of all segments are added to `timings`.
+    """
+    timings = timings if timings is not None else StageTimer()
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         return 0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
     Path(out_dir).mkdir(parents=True, exist_ok=True)
-    idx = 1
+    params = image_write_params(ext, png_compression, jpeg_quality)
+
+    n_segments = min(max(1, workers), total // max(1, min_segment_frames)) if total > 0 else 1
+    if n_segments > 1:
+        bounds = [total * k // n_segments for k in range(n_segments + 1)]
+        with timings.stage("seek_probe"):
+            if not _seeks_land(video_path, bounds[1:-1]):
+                n_segments = 1
+    if n_segments <= 1:
+        count, stages = _extract_segment(video_path, out_dir, 0, None, ext, params, writer_threads)
+        timings.merge(stages)
+        if progress_cb:
+            progress_cb(count, count)
+        return count
+
     count = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        fname = f"{idx:08d}.{ext}"
-        cv2.imwrite(str(Path(out_dir) / fname), frame)
-        idx += 1
-        count += 1
-    cap.release()
+    ctx = multiprocessing.get_context("spawn")  # callers may be threaded; avoid fork
+    with ProcessPoolExecutor(max_workers=n_segments, mp_context=ctx) as pool:
+        futures = [
+            pool.submit(_extract_segment, video_path, out_dir, bounds[k],
+                        bounds[k + 1] if k < n_segments - 1 else None, ext, params, writer_threads)
+            for k in range(n_segments)
+        ]
+        for f in as_completed(futures):
+            n, stages = f.result()
+            count += n
+            timings.merge(stages)
+            if progress_cb:
+                progress_cb(count, total)
     return count
 
 def validate_frame_zip(frames_dir: Path, ext: str = "png") -> int:
@@ -35,7 +166,7 @@ def validate_frame_zip(frames_dir: Path, ext: str = "png") -> int:
 
 def ensure_zero_padded_names(frames_dir: Path):
     # Rename files to 8-digit zero padded if needed
-    pattern = re.compile(r"(\d+)\.(png|jpg|jpeg)$", re.IGNORECASE)
+    pattern = re.compile(r"(\d+)\.(png|jpg|jpeg|npy)$", re.IGNORECASE)
     for fp in sorted(frames_dir.iterdir()):
         m = pattern.match(fp.name)
         if not m:
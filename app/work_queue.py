@@ -0,0 +1,134 @@
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.scheduler import QueueFull
+
+
+@dataclass
+class Lease:
+    job_id: str
+    params: Dict[str, Any]
+    attempts: int  # including this one
+
+
+class WorkQueue:
+    """
+    Durable priority queue of propagation jobs in a local SQLite database (WAL), shared by the
+    API process and any number of worker processes; no broker needed.
+
+    Workers lease the next job (lower priority value first, FIFO within a priority) for
+    lease_seconds and extend the lease with heartbeat() while running. A lease that expires (the
+    worker died or hung) makes the job available again; attempts counts how often it was leased.
+    Rows are deleted when the job finishes or is cancelled before a worker picks it up.
+    """
+
+    def __init__(self, path: Path, max_queue: int = 16):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_queue = max(0, max_queue)
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS queue ("
+            " job_id TEXT PRIMARY KEY, priority INTEGER NOT NULL, seq INTEGER NOT NULL, params TEXT NOT NULL,"
+            " worker TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, enqueued_at REAL NOT NULL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS queue_order ON queue (priority, seq)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, job_id: str, params: Dict[str, Any], priority: int = 0) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM queue WHERE job_id = ?", (job_id,)).fetchone():
+                raise ValueError(f"Job {job_id} is already queued or running.")
+            waiting = conn.execute("SELECT COUNT(*) FROM queue WHERE worker IS NULL").fetchone()[0]
+            if waiting >= self.max_queue:
+                raise QueueFull(f"Job queue is full ({self.max_queue} waiting).")
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM queue").fetchone()[0]
+            conn.execute(
+                "INSERT INTO queue (job_id, priority, seq, params, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, priority, seq, json.dumps(params), time.time()),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.position(job_id)
+
+    def lease(self, worker: str, lease_seconds: float) -> Optional[Lease]:
+        # Next waiting job, or one whose lease expired
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT job_id, params, attempts FROM queue WHERE worker IS NULL OR lease_expires < ?"
+                " ORDER BY priority, seq LIMIT 1", (now,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE queue SET worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE job_id = ?",
+                    (worker, now + lease_seconds, row[0]),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return Lease(job_id=row[0], params=json.loads(row[1]), attempts=row[2] + 1)
+
+    def heartbeat(self, job_id: str, worker: str, lease_seconds: float) -> bool:
+        # False once the lease was lost (expired and taken over, or the job was removed)
+        cur = self._conn().execute(
+            "UPDATE queue SET lease_expires = ? WHERE job_id = ? AND worker = ?",
+            (time.time() + lease_seconds, job_id, worker),
+        )
+        return cur.rowcount > 0
+
+    def complete(self, job_id: str, worker: str):
+        self._conn().execute("DELETE FROM queue WHERE job_id = ? AND worker = ?", (job_id, worker))
+
+    def release(self, job_id: str, worker: str):
+        # Give a job back without counting the attempt (worker shutting down)
+        self._conn().execute(
+            "UPDATE queue SET worker = NULL, lease_expires = NULL, attempts = MAX(attempts - 1, 0)"
+            " WHERE job_id = ? AND worker = ?", (job_id, worker),
+        )
+
+    def cancel(self, job_id: str) -> bool:
+        # Only jobs no worker has picked up; running jobs are cancelled through the job store
+        cur = self._conn().execute("DELETE FROM queue WHERE job_id = ? AND worker IS NULL", (job_id,))
+        return cur.rowcount > 0
+
+    def is_active(self, job_id: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM queue WHERE job_id = ?", (job_id,)).fetchone() is not None
+
+    def position(self, job_id: str) -> Optional[int]:
+        # 1-based position among waiting jobs; None if the job is not waiting.
+        row = self._conn().execute(
+            "SELECT priority, seq FROM queue WHERE job_id = ? AND worker IS NULL", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        ahead = self._conn().execute(
+            "SELECT COUNT(*) FROM queue WHERE worker IS NULL AND (priority < ? OR (priority = ? AND seq < ?))",
+            (row[0], row[0], row[1]),
+        ).fetchone()[0]
+        return ahead + 1
+
+    def queue_length(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM queue WHERE worker IS NULL").fetchone()[0]
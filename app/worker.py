@@ -0,0 +1,155 @@
+"""
+Inference worker: pulls propagation jobs from the durable work queue and runs them outside the
+API process. Used with EXECUTION_MODE=worker.
+
+    python -m app.worker                      # one worker
+    python -m app.worker --workers 4 --cpus 0-15   # four workers, four cores each
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import threading
+from typing import List, Optional, Sequence
+
+from app.config import settings
+from app.progress import process_owner
+from app.runner import CHECKPOINT, JobRunner, open_job_store, open_predictor_pool, open_segment_pool, open_work_queue
+from app.sam2_infer import PropagationCancelled
+from app.work_queue import WorkQueue
+
+
+def parse_cpus(spec: str) -> List[int]:
+    # "0-3,8,10-11" -> [0, 1, 2, 3, 8, 10, 11]
+    cpus: List[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cpus.extend(range(int(lo), int(hi or lo) + 1))
+    return sorted(set(cpus))
+
+
+def split_cpus(cpus: Sequence[int], n: int) -> List[List[int]]:
+    # Contiguous, near-equal core sets, one per worker
+    n = max(1, n)
+    size, extra = divmod(len(cpus), n)
+    out, start = [], 0
+    for k in range(n):
+        end = start + size + (1 if k < extra else 0)
+        out.append(list(cpus[start:end]))
+        start = end
+    return out
+
+
+def _pin(cpus: Optional[Sequence[int]]):
+    if not cpus:
+        return
+    os.sched_setaffinity(0, cpus)
+    import torch
+    torch.set_num_threads(len(cpus))
+
+
+def _heartbeat(queue: WorkQueue, job_id: str, worker: str, done: threading.Event, lost: threading.Event):
+    lease = settings.WORKER_LEASE_S
+    while not done.wait(lease / 3):
+        if not queue.heartbeat(job_id, worker, lease):
+            lost.set()
+            return
+
+
+def run_worker(cpus: Optional[Sequence[int]] = None, once: bool = False):
+    """Lease and run jobs until SIGTERM/SIGINT (or, with once, until the queue is empty)."""
+    _pin(cpus)
+    jobs = open_job_store()
+    queue = open_work_queue()
+    predictors = open_predictor_pool()
+    model = dict(
+        model_type=settings.SAM2_MODEL_TYPE,
+        checkpoint_path=str(CHECKPOINT) if CHECKPOINT else "",
+        device=settings.DEVICE,
+    )
+    segments = open_segment_pool(predictors)
+    if settings.WARMUP_ON_STARTUP:
+        # Before the first lease, so no leased job waits on the model build
+        (segments if segments is not None else predictors).warmup(**model)
+    elif settings.PREDICTOR_PRELOAD:
+        predictors.preload(**model)
+    runner = JobRunner(jobs, predictors, segments)
+    worker = process_owner()
+    stopping = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopping.set())
+
+    while not stopping.is_set():
+        lease = queue.lease(worker, settings.WORKER_LEASE_S)
+        if lease is None:
+            if once:
+                break
+            stopping.wait(settings.WORKER_POLL_S)
+            continue
+        job_id = lease.job_id
+        done, lost = threading.Event(), threading.Event()
+        beat = threading.Thread(target=_heartbeat, args=(queue, job_id, worker, done, lost), daemon=True)
+        beat.start()
+        try:
+            if lease.attempts > settings.WORKER_MAX_ATTEMPTS:
+                jobs.update(job_id, status="failed", message=f"Gave up after {lease.attempts - 1} attempts (worker lost).")
+            elif jobs.is_cancel_requested(job_id):
+                jobs.update(job_id, status="cancelled", message="Cancelled before start.")
+            else:
+                jobs.update(job_id, owner=worker)
+                # Lost lease: another worker owns the job now, so stop writing its outputs
+                runner.run(job_id, lease.params, should_stop=lambda: lost.is_set() or stopping.is_set())
+        except PropagationCancelled:
+            if not lost.is_set():
+                queue.release(job_id, worker)
+                jobs.update(job_id, status="queued", progress=0, message="Worker stopped; requeued.")
+            continue
+        finally:
+            done.set()
+            beat.join()
+            jobs.flush()
+        if not lost.is_set():
+            queue.complete(job_id, worker)
+    if segments is not None:
+        segments.shutdown()
+
+
+def _worker_main(cpus: Optional[List[int]]):
+    run_worker(cpus)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    ap = argparse.ArgumentParser(description="SAM2 propagation worker")
+    ap.add_argument("--workers", type=int, default=1, help="worker processes to start")
+    ap.add_argument("--cpus", default="", help="cores to spread the workers over, e.g. 0-15 (default: no pinning)")
+    ap.add_argument("--once", action="store_true", help="exit when the queue is empty (single worker)")
+    args = ap.parse_args(argv)
+
+    if settings.JOB_STORE != "sqlite":
+        ap.error("Workers need JOB_STORE=sqlite to report job state to the API.")
+    cpu_sets = split_cpus(parse_cpus(args.cpus), args.workers) if args.cpus else [None] * args.workers
+    if args.workers <= 1:
+        run_worker(cpu_sets[0], once=args.once)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_worker_main, args=(cpus,), name=f"sam2-worker-{k}") for k, cpus in enumerate(cpu_sets)]
+    for p in procs:
+        p.start()
+
+    def forward(sig, _frame):
+        for p in procs:
+            if p.is_alive():
+                os.kill(p.pid, sig)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
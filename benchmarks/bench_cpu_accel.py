@@ -0,0 +1,145 @@
+"""
+CPU inference modes (app.cpu_accel) against plain fp32: frames per second of propagation and how far
+the masks drift from the fp32 masks (mean IoU over every frame and object, 1.0 = identical).
+
+No SAM2 weights ship with the repo, so the model is a stand-in network with SAM2's layer mix at a
+small scale (strided convolutions for the image encoder, a per-pixel MLP for the mask decoder) and
+fixed random weights. Absolute numbers say nothing about SAM2; the ratios between modes and the
+direction of the drift do. Prompted objects keep their prompt masks, every other object takes the
+network's mask, so every frame runs the network.
+
+    python -m benchmarks.bench_cpu_accel --frames 60 --height 360 --width 640 --modes fp32 bf16 int8
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+from app.cpu_accel import CPUProfile, bf16_supported
+from app.frame_source import ImageDirFrameSource
+from app.labelstudio_parser import parse_labelstudio_export
+from app.mask_store import MaskStore
+from app.sam2_infer import SAM2VideoPropagator
+from benchmarks.synthetic import _tracks, make_labelstudio_export, render_frame
+
+MODES = {
+    "fp32": CPUProfile(),
+    "channels_last": CPUProfile(channels_last=True),
+    "bf16": CPUProfile(bf16=True),
+    "int8": CPUProfile(int8=True),
+    "compile": CPUProfile(compile=True),
+    "channels_last+bf16": CPUProfile(channels_last=True, bf16=True),
+}
+
+
+class _StandInNet(torch.nn.Module):
+    def __init__(self, objects: int, width: int = 64):
+        super().__init__()
+        self.encoder = torch.nn.Sequential(
+            torch.nn.Conv2d(3, width // 2, 3, stride=2, padding=1), torch.nn.GELU(),
+            torch.nn.Conv2d(width // 2, width, 3, stride=2, padding=1), torch.nn.GELU(),
+            torch.nn.Conv2d(width, width, 3, padding=1), torch.nn.GELU(),
+        )
+        self.decoder = torch.nn.Sequential(
+            torch.nn.Linear(width, width * 2), torch.nn.GELU(), torch.nn.Linear(width * 2, objects),
+        )
+
+    def forward(self, x):
+        features = self.encoder(x)
+        logits = self.decoder(features.permute(0, 2, 3, 1))
+        return torch.nn.functional.interpolate(logits.permute(0, 3, 1, 2), size=x.shape[-2:], mode="bilinear")
+
+
+class _NetPredictor:
+    def __init__(self, model):
+        self.model = model
+
+    def reset(self):
+        pass
+
+
+class _NetPropagator(SAM2VideoPropagator):
+    runs_model = True
+
+    def _segment_frame(self, img, frame_prompts, label_index):
+        planes = super()._segment_frame(img, frame_prompts, label_index)
+        x = torch.from_numpy(img).permute(2, 0, 1).unsqueeze(0).float().div_(255)
+        logits = self.predictor.model(self.accel.prepare(x))[0, :len(label_index)].float()
+        # Untrained weights put every logit on one side of 0; threshold each object at its mean instead
+        predicted = (logits > logits.mean(dim=(1, 2), keepdim=True)).to(torch.uint8).numpy()
+        prompted = planes.reshape(len(label_index), -1).any(axis=1)
+        planes[~prompted] = predicted[~prompted]
+        return planes
+
+
+def _iou(a: np.ndarray, b: np.ndarray) -> float:
+    union = np.logical_or(a, b).sum()
+    return 1.0 if union == 0 else float(np.logical_and(a, b).sum() / union)
+
+
+def run(frames=60, height=360, width=640, objects=4, modes=tuple(MODES), repeat=2, seed=0):
+    torch.manual_seed(seed)
+    weights = _StandInNet(objects).state_dict()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        frames_dir = tmp / "frames"
+        frames_dir.mkdir()
+        tracks = _tracks(height, width, objects, seed)
+        for t in range(frames):
+            cv2.imwrite(str(frames_dir / f"{t + 1:08d}.png"), render_frame(tracks, t, height, width))
+        export = make_labelstudio_export(tmp / "export.json", frames, height, width, objects, seed, 0.05)
+        prompts = parse_labelstudio_export(str(export), str(frames_dir))
+        source = ImageDirFrameSource.from_dir(frames_dir)
+
+        for mode in ("fp32",) + tuple(m for m in modes if m != "fp32"):
+            net = _StandInNet(objects)
+            net.load_state_dict(weights)
+            prop = _NetPropagator("bench", "", device="cpu", predictor=_NetPredictor(net), cpu_profile=MODES[mode])
+            out = tmp / mode
+            best = float("inf")
+            for _ in range(repeat + 1):  # the first pass warms up (and compiles)
+                t0 = time.perf_counter()
+                prop.propagate(source, prompts, "per_label", lambda *a: None, str(out), str(out),
+                               write_overlays=False, mask_format="store")
+                best = min(best, time.perf_counter() - t0)
+            store = MaskStore.open(out)
+            masks = [store.read(i) for i in range(frames)]
+            if mode == "fp32":
+                reference = masks
+            ious = [_iou(m[k], r[k]) for m, r in zip(masks, reference) for k in range(len(m))]
+            results[mode] = dict(
+                fps=round(frames / best, 2),
+                mean_iou_vs_fp32=round(float(np.mean(ious)), 4),
+                min_iou_vs_fp32=round(float(np.min(ious)), 4),
+                applied=prop.accel.report,
+            )
+    for r in results.values():
+        r["speedup_vs_fp32"] = round(r["fps"] / results["fp32"]["fps"], 2)
+    return dict(frames=frames, height=height, width=width, objects=objects, repeat=repeat, seed=seed,
+                cpus=os.cpu_count(), torch=torch.__version__, torch_threads=torch.get_num_threads(),
+                bf16_supported=bf16_supported(), modes=results)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=60)
+    ap.add_argument("--height", type=int, default=360)
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--objects", type=int, default=4)
+    ap.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    ap.add_argument("--repeat", type=int, default=2)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    print(json.dumps(run(args.frames, args.height, args.width, args.objects, tuple(args.modes), args.repeat,
+                         args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Multi-object propagation throughput versus object count: all objects in one pass (one decode
+per frame) against one pass per object (the former one-job-per-object workaround). Frames are
+PNG-encoded in memory so each pass pays a real decode; the predictor is the built-in heuristic.
+
+    python -m benchmarks.bench_multi_object --frames 200 --objects 1 2 4 8
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from app.frame_source import FrameSource
+from app.labelstudio_parser import BoxPrompt, ParsedPrompts
+from benchmarks.synthetic import stand_in_propagator
+
+
+class _EncodedFrames(FrameSource):
+    def __init__(self, frames):
+        super().__init__(cache_size=0)
+        self._png = [cv2.imencode(".png", f)[1] for f in frames]
+
+    def __len__(self):
+        return len(self._png)
+
+    def name(self, index):
+        return f"{index + 1:08d}.png"
+
+    def _decode(self, index):
+        return cv2.imdecode(self._png[index], cv2.IMREAD_COLOR)
+
+
+def _prompts(labels, height, width, frames):
+    rng = np.random.default_rng(0)
+    boxes = []
+    for label in labels:
+        x, y = rng.integers(0, width // 2), rng.integers(0, height // 2)
+        boxes.append(BoxPrompt(frame=int(rng.integers(1, frames + 1)), x1=x, y1=y, x2=x + width // 4, y2=y + height // 4, label=label))
+    return ParsedPrompts(boxes=boxes)
+
+
+def _propagate(source, prompts, labels_mode):
+    prop = stand_in_propagator()
+    with tempfile.TemporaryDirectory() as out:
+        t0 = time.perf_counter()
+        prop.propagate(source, prompts, labels_mode, lambda *a: None, out, out,
+                       write_overlays=False, mask_format="store")
+        return time.perf_counter() - t0
+
+
+def run(frames=200, height=720, width=1280, objects=(1, 2, 4, 8)):
+    rng = np.random.default_rng(1)
+    source = _EncodedFrames([rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(frames)])
+    rows = []
+    for k in objects:
+        labels = [f"obj{j}" for j in range(k)]
+        prompts = _prompts(labels, height, width, frames)
+        single_pass = _propagate(source, prompts, "per_label")
+        per_object = sum(
+            _propagate(source, ParsedPrompts(boxes=[b for b in prompts.boxes if b.label == label]), "single")
+            for label in labels
+        )
+        rows.append(dict(
+            objects=k,
+            single_pass_s=round(single_pass, 3),
+            single_pass_fps=round(frames / single_pass, 1),
+            single_pass_object_fps=round(frames * k / single_pass, 1),
+            pass_per_object_s=round(per_object, 3),
+            speedup=round(per_object / single_pass, 2),
+        ))
+    return dict(frames=frames, height=height, width=width, results=rows)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=200)
+    ap.add_argument("--height", type=int, default=720)
+    ap.add_argument("--width", type=int, default=1280)
+    ap.add_argument("--objects", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = ap.parse_args()
+    print(json.dumps(run(args.frames, args.height, args.width, tuple(args.objects)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
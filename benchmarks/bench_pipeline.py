@@ -0,0 +1,198 @@
+"""
+End-to-end stage timings on synthetic data (benchmarks.synthetic): video frame extraction, frame
+ZIP validation and renaming, Label Studio parsing, propagation and mask export. Propagation uses a
+stand-in predictor (the built-in heuristic segmenter) so the suite runs on CPU without weights.
+Startup is measured in a fresh interpreter: importing app.main, and the time until /readyz passes
+with WARMUP_ON_STARTUP (best of --repeat, like the stages).
+
+Inputs are generated from --seed, so results from different commits are comparable; write them
+with --output and pass an earlier file as --baseline to get per-stage ratios (>1 = slower now).
+
+    python -m benchmarks.bench_pipeline --frames 300 --height 720 --width 1280 --objects 4 --output bench.json
+    python -m benchmarks.bench_pipeline --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.export import stream_export
+from app.frame_source import ImageDirFrameSource
+from app.labelstudio_parser import parse_labelstudio_export
+from app.mask_store import MaskStore
+from app.video_utils import ensure_zero_padded_names, extract_frames_from_video, validate_frame_zip
+from benchmarks.synthetic import make_frames_zip, make_labelstudio_export, make_video, stand_in_propagator
+
+
+_STARTUP_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app.main as main
+import_s = time.perf_counter() - t0
+heavy = sorted(m for m in ("cv2", "sam2", "torch") if m in sys.modules)
+from benchmarks.synthetic import stand_in_propagator
+main.predictors._factory = stand_in_propagator
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:  # runs the startup hooks
+    while True:
+        r = client.get("/readyz")
+        if r.status_code == 200 or r.json()["state"] == "failed":
+            break
+        time.sleep(0.005)
+    ready_s = time.perf_counter() - t0
+print(json.dumps(dict(import_s=import_s, ready_s=ready_s, ready=r.status_code == 200, heavy=heavy)))
+"""
+
+
+def startup(repeat=3):
+    # A fresh interpreter per sample: this one has imported everything already
+    root = Path(__file__).resolve().parent.parent
+    samples = []
+    for _ in range(max(1, repeat)):
+        with tempfile.TemporaryDirectory() as data_root:
+            env = dict(os.environ, DATA_ROOT=data_root, DEVICE="cpu", EXECUTION_MODE="inline", SEGMENT_WORKERS="1",
+                       WARMUP_ON_STARTUP="true")
+            out = subprocess.run([sys.executable, "-c", _STARTUP_PROBE], cwd=root, env=env, capture_output=True,
+                                 text=True, timeout=600, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    if not all(s["ready"] for s in samples):
+        raise RuntimeError("Warmup failed in the startup probe.")
+    return dict(import_app_s=min(s["import_s"] for s in samples), time_to_ready_s=min(s["ready_s"] for s in samples),
+                heavy_modules_at_import=samples[0]["heavy"])
+
+
+def _time(fn, repeat, setup=None):
+    # Best of `repeat` after one warm-up; setup() runs untimed before each call and its result is passed on
+    args = () if setup is None else (setup(),)
+    fn(*args)
+    best = float("inf")
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _fresh(path: Path) -> Path:
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+    return path
+
+
+def _environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return dict(commit=commit, python=platform.python_version(), platform=platform.platform(),
+                cpus=os.cpu_count(), numpy=np.__version__, opencv=cv2.__version__)
+
+
+def run(frames=300, height=720, width=1280, objects=4, prompt_density=0.05, repeat=3, seed=0, ext="png"):
+    stages = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        video = make_video(tmp / "video.avi", frames, height, width, objects, seed)
+        frames_zip = make_frames_zip(tmp / "frames.zip", frames, height, width, objects, seed, ext)
+        export = make_labelstudio_export(tmp / "export.json", frames, height, width, objects, seed, prompt_density)
+
+        extracted = tmp / "extracted"
+        stages["extract_frames_from_video_s"] = _time(
+            lambda d: extract_frames_from_video(str(video), str(d), ext=ext), repeat, lambda: _fresh(extracted))
+
+        def unzip():
+            d = _fresh(tmp / "unzipped")
+            with zipfile.ZipFile(frames_zip) as zf:
+                zf.extractall(d)
+            return d
+
+        def ingest_zip(d):
+            validate_frame_zip(d, ext)
+            ensure_zero_padded_names(d)
+        stages["validate_and_rename_zip_s"] = _time(ingest_zip, repeat, unzip)
+
+        prompts = parse_labelstudio_export(str(export), str(extracted), frame_ext=ext)
+        stages["parse_labelstudio_export_s"] = _time(
+            lambda: parse_labelstudio_export(str(export), str(extracted), frame_ext=ext), repeat)
+
+        source = ImageDirFrameSource.from_dir(extracted, ext)
+        prop = stand_in_propagator("bench", "", "cpu")
+        outputs = {}
+        for mask_format in ("store", "png"):
+            out = tmp / f"masks_{mask_format}"
+            outputs[mask_format] = out
+            stages[f"propagate_{mask_format}_s"] = _time(
+                lambda d: prop.propagate(source, prompts, "per_label", lambda *a: None, str(d), str(d),
+                                         write_overlays=False, mask_format=mask_format),
+                repeat, lambda: _fresh(out))
+
+        for mask_format, out in outputs.items():
+            store = MaskStore.open(out)
+            stages[f"export_masks_{mask_format}_s"] = _time(
+                lambda: sum(len(chunk) for chunk in stream_export(out, store)), repeat)
+        archive_bytes = sum(len(chunk) for chunk in stream_export(outputs["store"], MaskStore.open(outputs["store"])))
+
+        n_prompts = len(prompts.boxes) + len(prompts.points) + len(prompts.masks)
+        video_bytes, zip_bytes, export_bytes = (p.stat().st_size for p in (video, frames_zip, export))
+
+    boot = startup(repeat)
+    stages["import_app_s"] = boot.pop("import_app_s")
+    stages["time_to_ready_s"] = boot.pop("time_to_ready_s")
+    stages = {k: round(v, 4) for k, v in stages.items()}
+    return dict(
+        environment=_environment(),
+        settings=dict(frames=frames, height=height, width=width, objects=objects, prompt_density=prompt_density,
+                      repeat=repeat, seed=seed, ext=ext),
+        inputs=dict(video_bytes=video_bytes, zip_bytes=zip_bytes, export_bytes=export_bytes, prompts=n_prompts,
+                    archive_bytes=archive_bytes),
+        stages=stages,
+        startup=boot,
+        propagate_fps=round(frames / stages["propagate_store_s"], 1),
+    )
+
+
+def compare(results, baseline):
+    # Current / baseline per stage; only meaningful when both ran with the same settings
+    ratios = {k: round(v / baseline["stages"][k], 2) for k, v in results["stages"].items()
+              if baseline.get("stages", {}).get(k)}
+    return dict(commit=baseline.get("environment", {}).get("commit"),
+                same_settings=baseline.get("settings") == results["settings"], ratios=ratios)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--height", type=int, default=720)
+    ap.add_argument("--width", type=int, default=1280)
+    ap.add_argument("--objects", type=int, default=4)
+    ap.add_argument("--prompt-density", type=float, default=0.05, help="fraction of frames prompted per object")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--ext", default="png", choices=["png", "jpg"])
+    ap.add_argument("--output", help="also write the results to this JSON file")
+    ap.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    args = ap.parse_args()
+    results = run(args.frames, args.height, args.width, args.objects, args.prompt_density, args.repeat,
+                  args.seed, args.ext)
+    if args.baseline:
+        results["baseline"] = compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Keyframe-segmented propagation (SegmentPool) against one sequential pass, for a growing number of
+prompted keyframes. The predictor stand-in blurs every frame `encoder_passes` times on one thread
+to stand in for the per-frame image encoder; frames are PNGs on disk as in a real job.
+
+    python -m benchmarks.bench_segments --frames 400 --keyframes 1 2 4 8 --workers 8
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.frame_source import ImageDirFrameSource
+from app.labelstudio_parser import BoxPrompt, ParsedPrompts
+from app.sam2_infer import SAM2VideoPropagator
+from app.segments import SegmentPool, plan_segments
+from benchmarks.synthetic import NoPredictor
+
+ENCODER_PASSES = int(os.environ.get("BENCH_ENCODER_PASSES", 20))
+
+
+class _BenchPropagator(SAM2VideoPropagator):
+    def _segment_frame(self, img, frame_prompts, label_index):
+        x = img
+        for _ in range(ENCODER_PASSES):
+            x = cv2.GaussianBlur(x, (9, 9), 0)
+        return super()._segment_frame(img, frame_prompts, label_index)
+
+
+def bench_propagator(model_type, checkpoint_path, device):
+    # Module level so spawned segment workers can unpickle it
+    cv2.setNumThreads(1)
+    return _BenchPropagator(model_type, checkpoint_path, device=device, predictor=NoPredictor())
+
+
+def _prompts(frames, keyframes):
+    # Keyframes spread evenly, one box per keyframe on the same object
+    marks = [int((k + 0.5) * frames / keyframes) + 1 for k in range(keyframes)]
+    return ParsedPrompts(boxes=[BoxPrompt(frame=f, x1=8, y1=8, x2=64, y2=64, label="object") for f in marks])
+
+
+def run(frames=400, height=360, width=640, keyframes=(1, 2, 4, 8), workers=0):
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        frames_dir = Path(tmp) / "frames"
+        frames_dir.mkdir()
+        for i in range(frames):
+            cv2.imwrite(str(frames_dir / f"{i + 1:08d}.png"), rng.integers(0, 255, (height, width, 3), dtype=np.uint8))
+        source = ImageDirFrameSource.from_dir(frames_dir)
+        sequential = bench_propagator("bench", "", "cpu")
+        pool = SegmentPool(workers=workers, factory=bench_propagator)
+
+        def segmented(prompts, out):
+            with pool.acquire("bench", "", "cpu") as (prop, _):
+                t0 = time.perf_counter()
+                prop.propagate(source, prompts, "single", lambda *a: None, out, out, write_overlays=False,
+                               mask_format="store")
+                return time.perf_counter() - t0
+
+        try:
+            # Spawning the workers and loading their models is paid once per pool, not per job
+            t0 = time.perf_counter()
+            segmented(_prompts(frames, pool.workers), str(Path(tmp) / "warmup"))
+            startup = time.perf_counter() - t0
+
+            rows = []
+            for k in keyframes:
+                prompts = _prompts(frames, k)
+                out = str(Path(tmp) / f"out{k}")
+                t0 = time.perf_counter()
+                sequential.propagate(source, prompts, "single", lambda *a: None, out, out, write_overlays=False,
+                                     mask_format="store")
+                seq = time.perf_counter() - t0
+                seg = segmented(prompts, out)
+                rows.append(dict(
+                    keyframes=k,
+                    segments=len(plan_segments(frames, (b.frame - 1 for b in prompts.boxes))),
+                    sequential_s=round(seq, 3),
+                    segmented_s=round(seg, 3),
+                    speedup=round(seq / seg, 2),
+                ))
+        finally:
+            pool.shutdown()
+    return dict(frames=frames, height=height, width=width, workers=pool.workers,
+                encoder_passes=ENCODER_PASSES, pool_startup_s=round(startup, 3), results=rows)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=400)
+    ap.add_argument("--height", type=int, default=360)
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--keyframes", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--workers", type=int, default=0, help="segment processes, 0 = one per CPU core")
+    args = ap.parse_args()
+    print(json.dumps(run(args.frames, args.height, args.width, tuple(args.keyframes), args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Deterministic synthetic inputs for the benchmarks: a video of moving objects, the same frames as
+an upload ZIP, and a Label Studio export prompting those objects. Everything is derived from a
+seed, so two runs (or two commits) benchmark byte-identical data. Also the stand-in propagator the
+benchmarks run instead of SAM2, whose weights do not ship with the repo.
+"""
+import json
+import zipfile
+from pathlib import Path
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+from app.rle import encode_ls_brush
+from app.sam2_infer import SAM2VideoPropagator
+
+PROMPT_KINDS = ("rectangle", "keypoint", "brush")
+
+
+class NoPredictor:
+    # Without a predictor the propagator carries each object's prompt mask along
+    def reset(self):
+        pass
+
+
+def stand_in_propagator(model_type: str = "bench", checkpoint_path: str = "", device: str = "cpu") -> SAM2VideoPropagator:
+    # Module level, with PredictorPool's factory signature, so app code and spawned workers can use it
+    return SAM2VideoPropagator(model_type, checkpoint_path, device=device, predictor=NoPredictor())
+
+
+def _tracks(height: int, width: int, objects: int, seed: int) -> List[dict]:
+    # One ellipse per object moving on a straight line that bounces off the frame edges
+    rng = np.random.default_rng(seed)
+    tracks = []
+    for _ in range(objects):
+        rx, ry = int(rng.integers(width // 24, width // 8 + 1)), int(rng.integers(height // 24, height // 8 + 1))
+        tracks.append(dict(
+            start=(float(rng.uniform(rx, width - rx)), float(rng.uniform(ry, height - ry))),
+            velocity=(float(rng.uniform(-4, 4)), float(rng.uniform(-4, 4))),
+            axes=(max(1, rx), max(1, ry)),
+            color=tuple(int(c) for c in rng.integers(40, 256, 3)),
+        ))
+    return tracks
+
+
+def _bounce(p: float, v: float, t: int, lo: float, hi: float) -> float:
+    span = max(hi - lo, 1.0)
+    x = (p - lo + v * t) % (2 * span)
+    return lo + (x if x <= span else 2 * span - x)
+
+
+def object_box(track: dict, t: int, height: int, width: int) -> Tuple[int, int, int, int]:
+    rx, ry = track["axes"]
+    cx = _bounce(track["start"][0], track["velocity"][0], t, rx, width - rx)
+    cy = _bounce(track["start"][1], track["velocity"][1], t, ry, height - ry)
+    return int(cx - rx), int(cy - ry), int(cx + rx), int(cy + ry)
+
+
+def render_frame(tracks: List[dict], t: int, height: int, width: int) -> np.ndarray:
+    # Gradient background so frames do not compress to nothing
+    img = np.empty((height, width, 3), np.uint8)
+    img[:] = (np.arange(width, dtype=np.uint16) * 255 // max(width - 1, 1)).astype(np.uint8)[None, :, None]
+    img[..., 1] = (t * 3) % 256
+    for tr in tracks:
+        x1, y1, x2, y2 = object_box(tr, t, height, width)
+        cv2.ellipse(img, ((x1 + x2) // 2, (y1 + y2) // 2), tr["axes"], 0, 0, 360, tr["color"], -1)
+    return img
+
+
+def make_video(path: Path, frames: int, height: int, width: int, objects: int, seed: int = 0, fps: float = 25.0) -> Path:
+    """MJPG-in-AVI: every OpenCV build can write and read it back without external codecs."""
+    path = Path(path)
+    tracks = _tracks(height, width, objects, seed)
+    vw = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    if not vw.isOpened():
+        raise RuntimeError(f"Cannot open a video writer for {path}")
+    try:
+        for t in range(frames):
+            vw.write(render_frame(tracks, t, height, width))
+    finally:
+        vw.release()
+    return path
+
+
+def make_frames_zip(path: Path, frames: int, height: int, width: int, objects: int, seed: int = 0,
+                    ext: str = "png") -> Path:
+    """Frames as users upload them: inside a folder and without zero padding (frame_1.png, ...)."""
+    path = Path(path)
+    tracks = _tracks(height, width, objects, seed)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as zf:
+        for t in range(frames):
+            _, buf = cv2.imencode(f".{ext}", render_frame(tracks, t, height, width))
+            zf.writestr(f"clip/frame_{t + 1}.{ext}", buf.tobytes())
+    return path
+
+
+def make_labelstudio_export(path: Path, frames: int, height: int, width: int, objects: int, seed: int = 0,
+                            prompt_density: float = 0.05, kinds=PROMPT_KINDS) -> Path:
+    """
+    One task prompting every object on a fraction (prompt_density) of the frames, at least once.
+    Objects cycle through kinds, so the parser exercises boxes, points and brush RLE.
+    """
+    path = Path(path)
+    tracks = _tracks(height, width, objects, seed)
+    rng = np.random.default_rng(seed + 1)
+    per_object = max(1, min(frames, round(frames * prompt_density)))
+    results = []
+    for k, tr in enumerate(tracks):
+        kind = kinds[k % len(kinds)]
+        label = f"object_{k + 1}"
+        for t in sorted(rng.choice(frames, per_object, replace=False).tolist()):
+            x1, y1, x2, y2 = object_box(tr, t, height, width)
+            if kind == "rectangle":
+                value = dict(x=100 * x1 / width, y=100 * y1 / height, width=100 * (x2 - x1) / width,
+                             height=100 * (y2 - y1) / height, rectanglelabels=[label])
+            elif kind == "keypoint":
+                value = dict(x=50 * (x1 + x2) / width, y=50 * (y1 + y2) / height, keypointlabels=[label])
+            else:
+                mask = np.zeros((height, width), np.uint8)
+                cv2.ellipse(mask, ((x1 + x2) // 2, (y1 + y2) // 2), tr["axes"], 0, 0, 360, 1, -1)
+                value = dict(format="rle", rle=encode_ls_brush(mask > 0), brushlabels=[label])
+            value["frame"] = t  # 0-based, as in Label Studio exports
+            results.append(dict(id=f"{k + 1}-{t}", type=f"{kind}labels",
+                                original_width=width, original_height=height, value=value))
+    task = dict(id=1, data=dict(video="synthetic.avi"), annotations=[dict(id=1, result=results)])
+    path.write_text(json.dumps([task]), encoding="utf-8")
+    return path
@@ -0,0 +1,71 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+import pytest
+
+# app.main creates its job store and upload directories under DATA_ROOT on import; keep them out
+# of the working tree
+if "DATA_ROOT" not in os.environ:
+    os.environ["DATA_ROOT"] = tempfile.mkdtemp(prefix="sam2-tests-")
+    atexit.register(shutil.rmtree, os.environ["DATA_ROOT"], True)
+
+VIDEO_FRAMES = 120
+
+
+@pytest.fixture(scope="session")
+def video(tmp_path_factory):
+    # MPEG-4 part 2 with a short GOP, so most frames lie between keyframes; a moving box makes
+    # every frame distinct
+    path = tmp_path_factory.mktemp("video") / "clip.mp4"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 25, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("No mp4v encoder in this OpenCV build.")
+    rng = np.random.default_rng(0)
+    for t in range(VIDEO_FRAMES):
+        img = rng.integers(0, 40, (48, 64, 3), dtype=np.uint8)
+        cv2.rectangle(img, (t % 50, 10), (t % 50 + 12, 30), (255, 255, 255), -1)
+        writer.write(img)
+    writer.release()
+    return path
+
+
+class _NoSeekCapture:
+    # A capture whose seeks never land, like backends that cannot seek in some containers
+    def __init__(self, path):
+        self._cap = cv2.VideoCapture(path)
+
+    def set(self, prop, value):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._cap, name)
+
+
+class _NoSeekCV2:
+    VideoCapture = _NoSeekCapture
+
+    def __getattr__(self, name):
+        return getattr(cv2, name)
+
+
+@pytest.fixture
+def no_seek_cv2():
+    # Stands in for the cv2 module of the code under test (monkeypatch it in)
+    return _NoSeekCV2()
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Without the context manager the startup hooks (model preload, orphan recovery) do not run
+    from fastapi.testclient import TestClient
+    from app.main import app
+    return TestClient(app)
+
+
+@pytest.fixture
+def job_id(client):
+    return client.post("/api/new_job").json()["job_id"]
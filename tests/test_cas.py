@@ -0,0 +1,120 @@
+import pytest
+
+from app.cas import COMPLETE_MARKER, ContentStore, link_or_copy
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ContentStore(tmp_path / "cas")
+
+
+def _build(text):
+    def build(d):
+        (d / "data.txt").write_text(text)
+    return build
+
+
+def _leftovers(store, kind):
+    # Staging and trash directories; none should survive a call
+    return [p.name for p in (store.root / kind).iterdir() if p.name.startswith(".")]
+
+
+def test_acquire_reports_completeness(store):
+    assert not store.acquire("a", "frames", "k1")
+    path = store.put("frames", "k1", _build("one"))
+    assert (path / "data.txt").read_text() == "one"
+    assert (path / COMPLETE_MARKER).exists()
+    assert store.acquire("b", "frames", "k1")
+    assert store.refs("a") == store.refs("b") == {"frames": "k1"}
+
+
+def test_put_keeps_the_first_published_entry(store):
+    store.acquire("a", "frames", "k1")
+    store.put("frames", "k1", _build("first"))
+    store.put("frames", "k1", _build("second"))
+    assert (store.path("frames", "k1") / "data.txt").read_text() == "first"
+    assert _leftovers(store, "frames") == []
+
+
+def test_failed_build_publishes_nothing(store):
+    def build(d):
+        (d / "data.txt").write_text("partial")
+        raise RuntimeError("boom")
+
+    store.acquire("a", "frames", "k1")
+    with pytest.raises(RuntimeError):
+        store.put("frames", "k1", build)
+    assert not store.exists("frames", "k1")
+    assert _leftovers(store, "frames") == []
+
+
+def test_entry_lives_until_the_last_reference_is_released(store):
+    for job in ("a", "b"):
+        if not store.acquire(job, "frames", "k1"):
+            store.put("frames", "k1", _build("x"))
+    store.release("a")
+    assert store.exists("frames", "k1")
+    store.release("b", "frames")
+    assert not store.path("frames", "k1").exists()
+    assert _leftovers(store, "frames") == []
+
+
+def test_release_one_kind(store):
+    store.acquire("a", "frames", "k1")
+    store.put("frames", "k1", _build("x"))
+    store.acquire("a", "videos", "v1")
+    store.put("videos", "v1", _build("v"))
+    store.release("a", "videos")
+    assert store.refs("a") == {"frames": "k1"}
+    assert not store.exists("videos", "v1")
+    assert store.exists("frames", "k1")
+
+
+def test_acquire_replaces_and_collects_the_old_entry(store):
+    store.acquire("a", "frames", "k1")
+    store.put("frames", "k1", _build("old"))
+    store.acquire("b", "frames", "k2")
+    store.put("frames", "k2", _build("shared"))
+    store.acquire("a", "frames", "k2")
+    assert store.refs("a") == {"frames": "k2"}
+    assert not store.path("frames", "k1").exists()
+    assert store.exists("frames", "k2")
+    # Re-acquiring the same key keeps it
+    assert store.acquire("a", "frames", "k2")
+    assert store.exists("frames", "k2")
+
+
+def test_share_mirrors_the_source_references(store):
+    store.acquire("parent", "frames", "k1")
+    store.put("frames", "k1", _build("x"))
+    store.acquire("child", "videos", "v1")
+    store.put("videos", "v1", _build("v"))
+    store.share("parent", "child")
+    assert store.refs("child") == {"frames": "k1"}
+    assert not store.exists("videos", "v1")
+    store.release("parent")
+    assert store.exists("frames", "k1")
+
+
+def test_collect_only_moves_unreferenced_entries(store):
+    store.acquire("a", "frames", "k1")
+    store.put("frames", "k1", _build("x"))
+    conn = store._conn()
+    assert store._collect(conn, "frames", "k1") is None
+    assert store._collect(conn, "frames", "missing") is None
+    conn.execute("DELETE FROM refs")
+    trash = store._collect(conn, "frames", "k1")
+    assert trash is not None and trash.name.endswith(".del")
+    assert (trash / "data.txt").exists()
+    assert not store.path("frames", "k1").exists()
+    ContentStore._purge(trash)
+    assert not trash.exists()
+
+
+def test_link_or_copy_replaces_dest(tmp_path):
+    src, dest = tmp_path / "src", tmp_path / "dest"
+    src.write_text("new")
+    dest.write_text("old")
+    link_or_copy(src, dest)
+    assert dest.read_text() == "new"
+    assert dest.stat().st_ino == src.stat().st_ino
@@ -0,0 +1,118 @@
+import io
+import os
+import zipfile
+
+import cv2
+import numpy as np
+
+from app.export import etag_matches, export_etag, prune_exports, stream_export
+from app.mask_store import MaskStore
+from app.runner import job_paths
+
+FRAMES = ["00000001.png", "00000002.png", "00000003.png"]
+
+
+def _store(root, mode="composite"):
+    store = MaskStore.create(root, FRAMES, 6, 5, ["cat", "dog"], mode)
+    store.write(0, np.eye(6, 5, dtype=np.uint8)[None].repeat(2, 0))
+    store.write(2, np.ones((2, 6, 5), dtype=np.uint8))
+    return store
+
+
+def _archive(masks_dir, store, cache_path=None):
+    return b"".join(stream_export(masks_dir, store, cache_path))
+
+
+def test_etag_is_stable_until_a_mask_changes(tmp_path):
+    store = _store(tmp_path)
+    etag = export_etag(tmp_path, store)
+    assert export_etag(tmp_path, MaskStore.open(tmp_path)) == etag
+    store.write(1, np.ones((2, 6, 5), dtype=np.uint8))
+    assert export_etag(tmp_path, store) != etag
+
+
+def test_etag_of_png_masks(tmp_path):
+    (tmp_path / "cat").mkdir()
+    for name in ("00000001.png", "cat/00000001.png"):
+        cv2.imwrite(str(tmp_path / name), np.zeros((4, 4), np.uint8))
+    etag = export_etag(tmp_path, None)
+    assert export_etag(tmp_path, None) == etag
+    st = (tmp_path / "cat/00000001.png").stat()
+    os.utime(tmp_path / "cat/00000001.png", ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    assert export_etag(tmp_path, None) != etag
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', "abc")
+    assert etag_matches('W/"abc"', "abc")
+    assert etag_matches('"x", "abc"', "abc")
+    assert etag_matches("*", "abc")
+    assert not etag_matches('"abcd"', "abc")
+    assert not etag_matches(None, "abc")
+    assert not etag_matches("", "abc")
+
+
+def test_archive_is_byte_identical_and_complete(tmp_path):
+    store = _store(tmp_path, "per_label")
+    data = _archive(tmp_path, store)
+    assert _archive(tmp_path, MaskStore.open(tmp_path)) == data
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.namelist() == ["00000001.png", "cat/00000001.png", "dog/00000001.png",
+                                 "00000003.png", "cat/00000003.png", "dog/00000003.png"]
+        png = cv2.imdecode(np.frombuffer(zf.read("00000003.png"), np.uint8), cv2.IMREAD_GRAYSCALE)
+        assert png.shape == (6, 5) and png.all()
+
+
+def test_cache_is_written_whole_and_prunes_stale_archives(tmp_path):
+    store = _store(tmp_path / "masks")
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    (exports / "stale.zip").write_bytes(b"old")
+    cache = exports / f"{export_etag(tmp_path / 'masks', store)}.zip"
+    data = _archive(tmp_path / "masks", store, cache)
+    assert cache.read_bytes() == data
+    assert sorted(p.name for p in exports.iterdir()) == [cache.name]
+
+
+def test_abandoned_download_leaves_no_cache(tmp_path):
+    store = _store(tmp_path / "masks")
+    exports = tmp_path / "exports"
+    chunks = stream_export(tmp_path / "masks", store, exports / "x.zip")
+    next(chunks)
+    chunks.close()  # client went away
+    assert list(exports.iterdir()) == []
+
+
+def test_prune_exports_keeps_one(tmp_path):
+    for name in ("a.zip", "b.zip", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    prune_exports(tmp_path, keep="b.zip")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["b.zip", "notes.txt"]
+    prune_exports(tmp_path)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["notes.txt"]
+
+
+def test_export_endpoint_revalidates(client, job_id):
+    p = job_paths(job_id)
+    assert client.get(f"/api/export/{job_id}").status_code == 200  # empty masks dir: empty archive
+    store = _store(p["masks_dir"])
+
+    r = client.get(f"/api/export/{job_id}")
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+    with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
+        assert zf.namelist() == ["00000001.png", "00000003.png"]
+    assert client.get(f"/api/export/{job_id}", headers={"If-None-Match": etag}).status_code == 304
+    # Served again from the cached archive, byte for byte
+    again = client.get(f"/api/export/{job_id}")
+    assert again.headers["etag"] == etag and again.content == r.content
+
+    store.write(1, np.ones((2, 6, 5), dtype=np.uint8))
+    r = client.get(f"/api/export/{job_id}", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert [fp.name for fp in p["exports_dir"].iterdir()] == [r.headers["etag"].strip('"') + ".zip"]
+
+
+def test_export_missing_job(client):
+    assert client.get("/api/export/nosuchjob").status_code == 404
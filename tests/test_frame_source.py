@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+import pytest
+
+from app import frame_source
+from app.frame_source import ImageDirFrameSource, VideoFrameSource
+
+
+@pytest.fixture(scope="module")
+def frames(video):
+    # Every frame, decoded in one sequential pass
+    cap = cv2.VideoCapture(str(video))
+    out = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        out.append(frame)
+    cap.release()
+    return out
+
+
+ORDER = [0, 1, 2, 57, 58, 119, 3, 90, 30, 31, 100, 0]
+
+
+@pytest.mark.parametrize("seek", [True, False])
+def test_video_random_access_matches_sequential_decode(video, frames, monkeypatch, no_seek_cv2, seek):
+    if not seek:
+        monkeypatch.setattr(frame_source, "cv2", no_seek_cv2)
+    src = VideoFrameSource(video, cache_size=0)
+    assert len(src) == len(frames)
+    for i in ORDER:
+        assert np.array_equal(src.read(i), frames[i]), i
+    assert src.name(57) == "00000058.png"
+    assert src.index_of("00000058.png") == 57
+    src.close()
+
+
+def test_video_source_survives_pickling(video, frames):
+    import pickle
+
+    src = pickle.loads(pickle.dumps(VideoFrameSource(video, cache_size=0)))
+    assert np.array_equal(src.read(40), frames[40])
+
+
+def test_image_dir_source_cache(tmp_path):
+    for i in range(3):
+        cv2.imwrite(str(tmp_path / f"{i + 1:08d}.png"), np.full((4, 5, 3), i, np.uint8))
+    src = ImageDirFrameSource.from_dir(tmp_path, cache_size=1)
+    assert len(src) == 3 and src.shape() == (4, 5)
+    assert src.read(2)[0, 0, 0] == 2
+    with pytest.raises(IndexError):
+        src.read(3)
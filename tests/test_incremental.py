@@ -0,0 +1,91 @@
+import cv2
+import numpy as np
+
+from app import runner
+from app.incremental import dirty_frames, prompt_digests, remove_manifest, run_key, save_manifest
+from app.labelstudio_parser import BoxPrompt, ParsedPrompts, PointPrompt
+from app.mask_store import MaskStore
+from app.predictor_pool import PredictorPool
+from app.progress import JobManager
+from benchmarks.synthetic import stand_in_propagator
+
+FRAMES = ["00000001.png", "00000002.png", "00000003.png", "00000004.png"]
+KEY = run_key(model="m", labels_mode="single")
+
+
+def _prompts(x=10):
+    return ParsedPrompts(boxes=[BoxPrompt(frame=1, x1=x, y1=0, x2=20, y2=20, label="a")],
+                         points=[PointPrompt(frame=3, x=5, y=5, label="a")])
+
+
+def _completed_run(masks_dir, digests, written=range(len(FRAMES))):
+    store = MaskStore.create(masks_dir, FRAMES, 4, 4, ["a"])
+    for i in written:
+        store.write(i, np.zeros((4, 4)))
+    store.close()
+    save_manifest(masks_dir, KEY, digests)
+
+
+def test_prompt_digests_per_frame():
+    digests = prompt_digests(_prompts(), len(FRAMES))
+    assert digests[1] == digests[3] == ""
+    assert digests[0] and digests[2] and digests[0] != digests[2]
+    assert prompt_digests(_prompts(), len(FRAMES)) == digests
+
+
+def test_unchanged_prompts_leave_nothing_dirty(tmp_path):
+    digests = prompt_digests(_prompts(), len(FRAMES))
+    _completed_run(tmp_path, digests)
+    assert dirty_frames(tmp_path, KEY, digests, ["a"]) == []
+
+
+def test_changed_prompt_marks_its_frame(tmp_path):
+    _completed_run(tmp_path, prompt_digests(_prompts(), len(FRAMES)))
+    assert dirty_frames(tmp_path, KEY, prompt_digests(_prompts(x=11), len(FRAMES)), ["a"]) == [0]
+
+
+def test_unwritten_frames_are_dirty(tmp_path):
+    digests = prompt_digests(_prompts(), len(FRAMES))
+    _completed_run(tmp_path, digests, written=[0, 1, 3])
+    assert dirty_frames(tmp_path, KEY, digests, ["a"]) == [2]
+
+
+def test_nothing_reusable(tmp_path):
+    digests = prompt_digests(_prompts(), len(FRAMES))
+    assert dirty_frames(tmp_path, KEY, digests, ["a"]) is None  # no previous run
+    _completed_run(tmp_path, digests)
+    assert dirty_frames(tmp_path, run_key(model="other"), digests, ["a"]) is None
+    assert dirty_frames(tmp_path, KEY, digests, ["a", "b"]) is None
+    assert dirty_frames(tmp_path, KEY, digests + [""], ["a"]) is None
+    remove_manifest(tmp_path)
+    assert dirty_frames(tmp_path, KEY, digests, ["a"]) is None
+
+
+def test_repeated_reruns_keep_the_store_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "UPLOADS", tmp_path / "uploads")
+    monkeypatch.setattr(runner, "OUTPUTS", tmp_path / "outputs")
+    p = runner.job_paths("job")
+    p["frames_dir"].mkdir(parents=True)
+    for i in range(20):
+        cv2.imwrite(str(p["frames_dir"] / f"{i + 1:08d}.png"), np.full((32, 32, 3), i * 10, np.uint8))
+    jobs = JobManager()
+    jobs.create("job")
+    job_runner = runner.JobRunner(jobs, PredictorPool(factory=stand_in_propagator))
+
+    def run(x):
+        # The box on frame 6 moves every run; the one on frame 16 stops the rerun after it
+        prompts = ParsedPrompts(boxes=[BoxPrompt(frame=6, x1=x, y1=0, x2=x + 8, y2=30, label="a"),
+                                       BoxPrompt(frame=16, x1=0, y1=0, x2=4, y2=4, label="a")])
+        job_runner.run("job", dict(labels_mode="single"), prompts)
+        job = jobs.get("job")
+        assert job["status"] == "completed", job["message"]
+        return job["meta"]["throughput"]["computed"]
+
+    assert run(0) == 20
+    sizes = []
+    for x in range(1, 13):
+        assert run(x) == 10
+        sizes.append(sum(f.stat().st_size for f in p["masks_dir"].glob("store.*")))
+    assert max(sizes) <= 2 * max(sizes[:3])
+    store = MaskStore.open(p["masks_dir"])
+    assert store.read(9)[0, 0, x:x + 8].all()  # masks of the last run
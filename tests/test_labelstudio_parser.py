@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from app.labelstudio_parser import iter_labelstudio_tasks
+
+TASKS = [
+    {"id": 1, "annotations": [{"result": [{"value": {"frame": 0, "x": 12.5, "rle": [0, 255, 3, 1024]}}]}]},
+    {"id": 2, "data": {"text": 'braces } { ] [ and "quotes" and a backslash \\ in a string'}},
+    {"id": 3, "data": {"text": "unicode é中 and escapes \\\"}"}, "n": -12345.678e-3, "big": 98765432101234},
+    {},
+    {"id": 5, "nested": [[[{"a": [1, 2, {"b": None}]}]]], "ok": True},
+]
+
+
+def _write(path, tasks, bom=False, **dump_kwargs):
+    text = json.dumps(tasks, **dump_kwargs)
+    path.write_text(("\ufeff" if bom else "") + text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize("bom", [False, True])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_tasks_match_json_load(tmp_path, chunk_size, bom, indent):
+    path = _write(tmp_path / "export.json", TASKS, bom=bom, indent=indent)
+    assert list(iter_labelstudio_tasks(path, chunk_size=chunk_size)) == TASKS
+
+
+def test_numbers_split_across_chunks(tmp_path):
+    tasks = [{"v": n} for n in (1234567, -0.000125, 6.02e23, 0, 42)]
+    path = _write(tmp_path / "export.json", tasks, separators=(",", ":"))
+    for chunk_size in range(1, 12):
+        assert list(iter_labelstudio_tasks(path, chunk_size=chunk_size)) == tasks
+
+
+def test_empty_list(tmp_path):
+    path = _write(tmp_path / "export.json", [], bom=True)
+    assert list(iter_labelstudio_tasks(path, chunk_size=1)) == []
+
+
+def test_large_task_is_read_whole(tmp_path):
+    tasks = [{"id": 1, "rle": list(range(200000)), "s": "}" * 5000}, {"id": 2}]
+    path = _write(tmp_path / "export.json", tasks)
+    assert list(iter_labelstudio_tasks(path, chunk_size=256)) == tasks
+
+
+@pytest.mark.parametrize("text", [
+    '{"id": 1}',
+    '[{"id": 1}',
+    '[{"id": 1} {"id": 2}]',
+    '[{"id": 1, "s": "unterminated}]',
+    '[1, 2]',
+    '',
+])
+def test_malformed_exports(tmp_path, text):
+    path = tmp_path / "export.json"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_labelstudio_tasks(str(path), chunk_size=4))
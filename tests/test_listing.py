@@ -0,0 +1,113 @@
+import io
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+from app import main
+from app.manifest import FrameManifest
+from app.mask_store import MaskStore
+from app.runner import job_paths
+
+
+def _frames_zip(n, shade=0):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for i in range(n):
+            ok, png = cv2.imencode(".png", np.full((6, 8, 3), (shade + 10 * i) % 256, np.uint8))
+            zf.writestr(f"clip/frame_{i + 1}.png", png.tobytes())
+    return buf.getvalue()
+
+
+def _upload_frames(client, job_id, n, shade=0):
+    r = client.post("/api/upload_frames_zip", data={"job_id": job_id},
+                    files={"file": ("frames.zip", _frames_zip(n, shade), "application/zip")})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _list(client, job_id, kind="frames", **params):
+    return client.get(f"/api/{kind}/{job_id}/list", params=params)
+
+
+def _names(urls):
+    return [u.rsplit("/", 1)[1] for u in urls]
+
+
+@pytest.fixture
+def frames_job(client, job_id):
+    assert _upload_frames(client, job_id, 5)["frame_count"] == 5
+    return job_id
+
+
+def test_frame_pages(client, frames_job):
+    r = _list(client, frames_job).json()
+    assert (r["total"], r["offset"]) == (5, 0)
+    assert _names(r["frames"]) == [f"{i:08d}.png" for i in range(1, 6)]
+    pages = [_list(client, frames_job, offset=o, limit=2).json()["frames"] for o in (0, 2, 4)]
+    assert [len(p) for p in pages] == [2, 2, 1]
+    assert sum(pages, []) == r["frames"]
+
+
+@pytest.mark.parametrize("offset, limit, expected, start", [
+    (4, 10, ["00000005.png"], 4),
+    (5, 1, [], 5),
+    (99, None, [], 5),  # past the end: empty page, offset clamped to the total
+    (0, 1, ["00000001.png"], 0),
+])
+def test_frame_page_edges(client, frames_job, offset, limit, expected, start):
+    params = dict(offset=offset) if limit is None else dict(offset=offset, limit=limit)
+    r = _list(client, frames_job, **params).json()
+    assert _names(r["frames"]) == expected
+    assert (r["total"], r["offset"]) == (5, start)
+
+
+def test_default_page_size(client, frames_job, monkeypatch):
+    monkeypatch.setattr(main.settings, "LIST_PAGE_SIZE", 3)
+    assert len(_list(client, frames_job).json()["frames"]) == 3
+    assert len(_list(client, frames_job, limit=5).json()["frames"]) == 5
+
+
+@pytest.mark.parametrize("params", [dict(limit=0), dict(offset=-1), dict(limit="x")])
+def test_bad_page_parameters(client, frames_job, params):
+    assert _list(client, frames_job, **params).status_code == 422
+
+
+def test_missing_frames_and_masks(client, job_id):
+    assert _list(client, "nosuchjob").status_code == 404
+    assert _list(client, job_id).status_code == 404
+    assert _list(client, "nosuchjob", "masks").status_code == 404
+
+
+def test_new_upload_replaces_the_listed_frames(client, frames_job):
+    # The job's cached frame source is dropped when its frames change
+    assert _list(client, frames_job).json()["total"] == 5
+    assert _upload_frames(client, frames_job, 3, shade=100)["frame_count"] == 3
+    r = _list(client, frames_job).json()
+    assert r["total"] == 3
+    assert _names(r["frames"]) == ["00000001.png", "00000002.png", "00000003.png"]
+    assert main._frame_source(frames_job).signature == FrameManifest.load(job_paths(frames_job)["frames_dir"]).signature
+
+
+def test_mask_pages_list_written_frames_only(client, frames_job):
+    p = job_paths(frames_job)
+    store = MaskStore.create(p["masks_dir"], [f"{i:08d}.png" for i in range(1, 6)], 6, 8, ["cat", "dog"], "per_label")
+    for i in (0, 2, 3):
+        store.write(i, np.ones((2, 6, 8), dtype=np.uint8))
+    r = _list(client, frames_job, "masks", offset=1, limit=5).json()
+    assert _names(r["masks"]) == ["00000003.png", "00000004.png"]
+    assert (r["total"], r["offset"], r["labels"], r["labels_mode"]) == (3, 1, ["cat", "dog"], "per_label")
+    r = _list(client, frames_job, "masks", offset=3).json()
+    assert (r["masks"], r["offset"]) == ([], 3)
+
+
+def test_mask_pages_of_png_masks(client, job_id):
+    masks_dir = job_paths(job_id)["masks_dir"]
+    for name in ("00000002.png", "00000001.png", "00000007.png"):
+        cv2.imwrite(str(masks_dir / name), np.zeros((4, 4), np.uint8))
+    r = _list(client, job_id, "masks", limit=2).json()
+    assert _names(r["masks"]) == ["00000001.png", "00000002.png"]
+    assert r["total"] == 3
+    r = _list(client, job_id, "masks", offset=2, limit=2).json()
+    assert _names(r["masks"]) == ["00000007.png"]
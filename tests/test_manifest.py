@@ -0,0 +1,93 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from app.frame_source import VideoFrameSource, open_frame_source
+from app.manifest import MANIFEST_NAME, FrameManifest, build_frames_manifest, video_manifest
+
+
+def _frames(frames_dir, n=3, ext="png"):
+    frames_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(n):
+        cv2.imwrite(str(frames_dir / f"{i + 1:08d}.{ext}"), np.full((6, 8, 3), 40 * i, np.uint8))
+    return frames_dir
+
+
+def test_build_save_load(tmp_path):
+    frames = _frames(tmp_path / "frames")
+    manifest = build_frames_manifest(frames)
+    assert (manifest.kind, manifest.count, manifest.height, manifest.width) == ("frames", 3, 6, 8)
+    assert manifest.names == ["00000001.png", "00000002.png", "00000003.png"]
+    assert len(set(manifest.hashes)) == 3
+    manifest.save(frames)
+    assert FrameManifest.load(frames) == manifest
+    assert build_frames_manifest(tmp_path / "empty") is None
+
+
+def test_signature_tracks_content(tmp_path):
+    frames = _frames(tmp_path / "frames")
+    before = build_frames_manifest(frames).signature
+    assert build_frames_manifest(frames).signature == before
+    cv2.imwrite(str(frames / "00000002.png"), np.full((6, 8, 3), 255, np.uint8))
+    changed = build_frames_manifest(frames).signature
+    assert changed != before
+    (frames / "00000004.png").write_bytes((frames / "00000001.png").read_bytes())
+    assert build_frames_manifest(frames).signature not in (before, changed)
+
+
+@pytest.mark.parametrize("text", ["{not json", json.dumps({"version": 0, "kind": "frames"})])
+def test_unreadable_or_old_manifest_is_ignored(tmp_path, text):
+    (tmp_path / MANIFEST_NAME).write_text(text)
+    assert FrameManifest.load(tmp_path) is None
+    assert FrameManifest.load(tmp_path / "missing") is None
+
+
+def test_save_replaces_a_shared_file(tmp_path):
+    # A hardlinked manifest (frames shared with another job) must not change under the other job
+    frames = _frames(tmp_path / "frames")
+    build_frames_manifest(frames).save(frames)
+    other = tmp_path / "other.json"
+    other.hardlink_to(frames / MANIFEST_NAME)
+    before = other.read_text()
+    video_manifest(tmp_path / "v.mp4", 2, 6, 8, "mp4v").save(frames)
+    assert other.read_text() == before
+    assert FrameManifest.load(frames).kind == "video"
+
+
+def test_open_frame_source_uses_the_manifest(tmp_path):
+    frames = _frames(tmp_path / "frames")
+    manifest = build_frames_manifest(frames)
+    manifest.save(frames)
+    src = open_frame_source(frames, tmp_path / "video")
+    assert len(src) == 3 and src.signature == manifest.signature
+
+
+def test_stale_manifest_falls_back_to_listing(tmp_path):
+    frames = _frames(tmp_path / "frames")
+    build_frames_manifest(frames).save(frames)
+    # FRAME_EXT changed since ingest: the manifest's codec no longer matches
+    _frames(frames, n=2, ext="jpg")
+    src = open_frame_source(frames, tmp_path / "video", ext="jpg")
+    assert len(src) == 2 and src.signature is None
+
+
+def test_video_manifest_needs_its_video(tmp_path, video):
+    frames, video_dir = tmp_path / "frames", tmp_path / "video"
+    video_dir.mkdir()
+    (video_dir / "clip.mp4").write_bytes(video.read_bytes())
+    probe = VideoFrameSource(video_dir / "clip.mp4")
+    manifest = video_manifest(video_dir / "clip.mp4", len(probe), *probe.shape(), probe.codec())
+    probe.close()
+    frames.mkdir()
+    manifest.save(frames)
+    src = open_frame_source(frames, video_dir)
+    assert src.signature == manifest.signature and len(src) == manifest.count
+    assert src.name(0) == "00000001.png"
+    src.close()
+    # The video was replaced by one under another name: probed again, not trusted
+    (video_dir / "clip.mp4").rename(video_dir / "other.mp4")
+    src = open_frame_source(frames, video_dir)
+    assert src.signature is None and len(src) == manifest.count
+    src.close()
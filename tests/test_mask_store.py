@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from app.mask_store import MaskStore, planes_to_mask
+
+
+def _planes(rng, labels=2, h=12, w=9):
+    return (rng.random((labels, h, w)) > 0.6).astype(np.uint8)
+
+
+def test_write_read_roundtrip(tmp_path):
+    rng = np.random.default_rng(0)
+    store = MaskStore.create(tmp_path, ["00000001.png", "00000002.png", "00000003.png"], 12, 9, ["a", "b"], "per_label")
+    written = {0: _planes(rng), 2: _planes(rng)}
+    for i, planes in written.items():
+        store.write(i, planes)
+    store.close()
+
+    store = MaskStore.open(tmp_path)
+    assert store.frames == ["00000001", "00000002", "00000003"]
+    assert store.written().tolist() == [True, False, True]
+    assert list(store.iter_written()) == [0, 2]
+    for i, planes in written.items():
+        assert np.array_equal(store.read(i), planes.astype(bool))
+        assert np.array_equal(store.read_plane(i, 1), planes[1].astype(bool))
+    with pytest.raises(KeyError):
+        store.read_plane(1)
+
+
+def test_rewrite_replaces_frame(tmp_path):
+    store = MaskStore.create(tmp_path, ["1.png"], 4, 4, ["a"])
+    store.write(0, np.ones((4, 4)))
+    store.write(0, np.zeros((4, 4)))
+    assert not MaskStore.open(tmp_path).read(0).any()
+
+
+def test_write_checks_shape(tmp_path):
+    store = MaskStore.create(tmp_path, ["1.png"], 4, 4, ["a", "b"])
+    with pytest.raises(ValueError):
+        store.write(0, np.zeros((4, 4)))
+
+
+def test_lookups(tmp_path):
+    store = MaskStore.create(tmp_path, ["00000001.png", "00000002.png"], 2, 2, ["cat", "dog"])
+    assert store.frame_index("00000002.png") == 1
+    assert store.frame_index("00000009.png") is None
+    assert store.label_index("dog") == 1
+    assert store.label_index("bird") is None
+
+
+def test_open_missing_and_remove(tmp_path):
+    assert MaskStore.open(tmp_path) is None
+    MaskStore.create(tmp_path, ["1.png"], 2, 2, ["a"])
+    MaskStore.remove(tmp_path)
+    assert MaskStore.open(tmp_path) is None
+
+
+def test_signature_changes_on_write(tmp_path):
+    store = MaskStore.create(tmp_path, ["1.png", "2.png"], 4, 4, ["a"])
+    before = store.signature()
+    store.write(1, np.ones((4, 4)))
+    assert store.signature() != before
+
+
+def test_mask_image_modes(tmp_path):
+    planes = np.zeros((2, 2, 2), dtype=np.uint8)
+    planes[0, 0, 0] = planes[1, 0, 0] = planes[1, 1, 1] = 1
+    assert planes_to_mask(planes, "single").tolist() == [[255, 0], [0, 255]]
+    assert planes_to_mask(planes, "composite").tolist() == [[2, 0], [0, 2]]
+    store = MaskStore.create(tmp_path, ["1.png"], 2, 2, ["a", "b"], "per_label")
+    store.write(0, planes)
+    assert store.mask_image(0).tolist() == [[2, 0], [0, 2]]
+    assert store.mask_image(0, 0).tolist() == [[255, 0], [0, 0]]
+
+
+def _data_files(root):
+    return sorted(p.name for p in root.glob("store.*.dat"))
+
+
+def test_compaction_keeps_the_data_file_bounded(tmp_path):
+    rng = np.random.default_rng(1)
+    store = MaskStore.create(tmp_path, [f"{i}.png" for i in range(5)], 12, 9, ["a", "b"])
+    for i in range(5):
+        store.write(i, _planes(rng))
+    assert not store.compact()  # nothing dead yet
+    sizes = []
+    for _ in range(20):
+        latest = {i: _planes(rng) for i in (1, 3)}
+        for i, planes in latest.items():
+            store.write(i, planes)
+        store.compact(min_dead_ratio=0.5)
+        sizes.append(sum(p.stat().st_size for p in tmp_path.glob("store.*")))
+        for i, planes in latest.items():
+            assert np.array_equal(MaskStore.open(tmp_path).read(i), planes.astype(bool))
+    live = int(MaskStore.open(tmp_path).index()[:, :, 1].sum())
+    assert (tmp_path / f"store.{store.generation}.dat").stat().st_size < 2 * live + 1
+    assert max(sizes[5:]) <= 2 * max(sizes[:5])
+    assert len(_data_files(tmp_path)) <= 2
+
+
+def test_compaction_below_the_ratio_is_skipped(tmp_path):
+    store = MaskStore.create(tmp_path, ["1.png", "2.png"], 4, 4, ["a"])
+    store.write(0, np.ones((4, 4)))
+    store.write(1, np.ones((4, 4)))
+    store.write(0, np.zeros((4, 4)))
+    assert not store.compact(min_dead_ratio=0.9)
+    assert store.compact(min_dead_ratio=0.1)
+    assert _data_files(tmp_path) == ["store.0.dat", "store.1.dat"]
+
+
+def test_readers_keep_the_generation_they_opened(tmp_path):
+    store = MaskStore.create(tmp_path, ["1.png", "2.png"], 4, 4, ["a"])
+    store.write(0, np.eye(4))
+    store.write(1, np.ones((4, 4)))
+    store.write(0, np.zeros((4, 4)))
+    reader = MaskStore.open(tmp_path)
+    assert not reader.read(0).any()
+    assert store.compact()
+    # The reader's offsets point into generation 0, which the first compaction keeps
+    assert not reader.read(0).any() and reader.read(1).all()
+    fresh = MaskStore.open(tmp_path)
+    assert fresh.generation == 1 and fresh.signature() != reader.signature()
+    assert not fresh.read(0).any() and fresh.read(1).all()
@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.overlay import BytesLRU, OverlayRenderer, make_palette
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (24, 32, 3), dtype=np.uint8)
+    mask = np.zeros((24, 32), dtype=np.uint8)
+    mask[4:12, 5:20] = 1
+    mask[10:20, 15:30] = 3
+    return image, mask
+
+
+def _reference(image, mask, alpha):
+    # Whole-frame cv2.addWeighted of the palette colours, kept where the mask is set
+    blended = cv2.addWeighted(image, 1.0 - alpha, make_palette()[mask], alpha, 0.0)
+    out = image.copy()
+    out[mask > 0] = blended[mask > 0]
+    return out
+
+
+@pytest.mark.parametrize("alpha", [0.0, 0.4, 1.0])
+def test_render_matches_add_weighted(frame, alpha):
+    image, mask = frame
+    before = image.copy()
+    out = OverlayRenderer(alpha=alpha).render(image, mask)
+    assert np.array_equal(out, _reference(image, mask, alpha))
+    assert np.array_equal(image, before)
+
+
+def test_binary_mask_is_red_like_the_float_blend(frame):
+    # The pre-uint8 overlay: float blend towards pure red on masked pixels
+    image, mask = frame
+    binary = (mask > 0).astype(np.uint8) * 255
+    expected = image.astype(np.float64)
+    expected[binary > 0] = 0.6 * expected[binary > 0] + 0.4 * np.array([0, 0, 255])
+    out = OverlayRenderer(alpha=0.4).render(image, binary)
+    assert np.abs(out.astype(np.int16) - np.rint(expected).astype(np.int16)).max() <= 1
+
+
+def test_render_into_out_and_in_place(frame):
+    image, mask = frame
+    renderer = OverlayRenderer()
+    expected = _reference(image, mask, renderer.alpha)
+    out = np.empty_like(image)
+    assert renderer.render(image, mask, out=out) is out
+    assert np.array_equal(out, expected)
+    in_place = image.copy()
+    renderer.render(in_place, mask.astype(bool), out=in_place)
+    assert np.array_equal(in_place, _reference(image, (mask > 0).astype(np.uint8), renderer.alpha))
+
+
+def test_scratch_follows_the_frame_size(frame):
+    image, mask = frame
+    renderer = OverlayRenderer()
+    small = renderer.render(image[:10, :10], mask[:10, :10])
+    assert np.array_equal(small, _reference(image[:10, :10], mask[:10, :10], renderer.alpha))
+    assert np.array_equal(renderer.render(image, mask), _reference(image, mask, renderer.alpha))
+    with pytest.raises(ValueError):
+        renderer.render(image, mask[:10])
+
+
+def test_lru_evicts_least_recent_by_size():
+    cache = BytesLRU(10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"  # now most recent
+    cache.put("c", b"1234")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234" and cache.get("c") == b"1234"
+
+
+def test_lru_replaces_and_skips_oversized():
+    cache = BytesLRU(10)
+    cache.put("a", b"12345678")
+    cache.put("a", b"12")
+    cache.put("b", b"12345678")
+    assert cache.get("a") == b"12" and cache.get("b") == b"12345678"
+    cache.put("big", b"x" * 11)
+    assert cache.get("big") is None and cache.get("a") == b"12"
+    assert BytesLRU(0).get("a") is None
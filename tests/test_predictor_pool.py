@@ -0,0 +1,166 @@
+import threading
+import time
+
+import pytest
+
+from app.predictor_pool import PredictorPool
+
+
+class FakePropagator:
+    def __init__(self, model_type, checkpoint_path, device):
+        self.key = (model_type, checkpoint_path, device)
+        self.resets = 0
+
+    def reset(self):
+        self.resets += 1
+
+
+class Factory:
+    # Counts loads; with a gate, each load blocks until it is set; models named in `fail` raise
+    def __init__(self, gate=None, fail=()):
+        self.loads = []
+        self.gate = gate
+        self.fail = set(fail)
+
+    def __call__(self, model_type, checkpoint_path, device):
+        self.loads.append(model_type)
+        if self.gate is not None:
+            self.gate.wait(5)
+        if model_type in self.fail:
+            raise RuntimeError(f"cannot load {model_type}")
+        return FakePropagator(model_type, checkpoint_path, device)
+
+
+def _keys(pool):
+    return [e["model_type"] for e in pool.stats()["entries"]]
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_reuses_loaded_propagator():
+    factory = Factory()
+    pool = PredictorPool(factory=factory)
+    with pool.acquire("a", "", "cpu") as (first, info):
+        assert not info["pool_hit"]
+        assert first.resets == 1
+    with pool.acquire("a", "", "cpu") as (second, info):
+        assert info["pool_hit"]
+    assert second is first
+    assert first.resets == 4  # before and after each job
+    assert factory.loads == ["a"]
+    assert (pool.hits, pool.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used():
+    factory = Factory()
+    pool = PredictorPool(max_size=2, factory=factory)
+    for model in ("a", "b", "a", "c"):
+        pool.preload(model, "", "cpu")
+    assert _keys(pool) == ["a", "c"]
+    assert pool.evictions == 1
+    assert factory.loads == ["a", "b", "c"]
+
+
+def test_entry_in_use_is_not_evicted():
+    pool = PredictorPool(max_size=1, factory=Factory())
+    with pool.acquire("a", "", "cpu"):
+        pool.preload("b", "", "cpu")
+        assert _keys(pool) == ["a", "b"]
+    pool.preload("c", "", "cpu")
+    assert _keys(pool) == ["c"]
+
+
+def test_entry_waited_for_is_not_evicted():
+    # A job that has looked the entry up but not yet taken its lock must not lose it to an
+    # eviction, which would leave the pool loading a second copy of the same model
+    factory = Factory()
+    pool = PredictorPool(max_size=1, factory=factory)
+    entry, _ = pool._get_or_load(pool.make_key("a", "", "cpu"))
+    pool.preload("b", "", "cpu")
+    assert _keys(pool) == ["a", "b"]
+    pool._unpin(entry)
+    with pool.acquire("a", "", "cpu") as (_, info):
+        assert info["pool_hit"]
+    assert factory.loads == ["a", "b"]
+
+
+def test_jobs_waiting_on_a_busy_entry_keep_it():
+    factory = Factory()
+    pool = PredictorPool(max_size=1, factory=factory)
+    results = []
+
+    def job():
+        with pool.acquire("a", "", "cpu") as (propagator, _):
+            results.append(propagator)
+
+    with pool.acquire("a", "", "cpu") as (holder, _):
+        waiter = threading.Thread(target=job)
+        waiter.start()
+        _wait_until(lambda: pool._entries[pool.make_key("a", "", "cpu")].users == 2)
+        pool.preload("b", "", "cpu")
+    waiter.join(5)
+    assert results == [holder]
+    assert factory.loads == ["a", "b"]
+    pool.preload("c", "", "cpu")
+    assert _keys(pool) == ["c"]
+
+
+def test_concurrent_first_jobs_share_one_load():
+    gate = threading.Event()
+    factory = Factory(gate=gate)
+    pool = PredictorPool(factory=factory)
+    results = []
+
+    def job():
+        with pool.acquire("a", "", "cpu") as (propagator, _):
+            results.append(propagator)
+
+    threads = [threading.Thread(target=job) for _ in range(4)]
+    for t in threads:
+        t.start()
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert len(results) == 4 and len({id(p) for p in results}) == 1
+    assert factory.loads == ["a"]
+
+
+def test_failed_load_is_not_cached():
+    factory = Factory(fail={"a"})
+    pool = PredictorPool(factory=factory)
+    with pytest.raises(RuntimeError):
+        pool.preload("a", "", "cpu")
+    assert _keys(pool) == []
+    factory.fail.clear()
+    with pool.acquire("a", "", "cpu") as (propagator, info):
+        assert not info["pool_hit"]
+    assert factory.loads == ["a", "a"]
+
+
+def test_waiters_see_the_load_error():
+    gate = threading.Event()
+    factory = Factory(gate=gate, fail={"a"})
+    pool = PredictorPool(factory=factory)
+    errors = []
+
+    def job():
+        try:
+            pool.preload("a", "", "cpu")
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=job) for _ in range(3)]
+    for t in threads:
+        t.start()
+    _wait_until(lambda: pool.misses + pool.hits == 3)
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert len(errors) == 3
+    assert factory.loads == ["a"]
+    assert _keys(pool) == []
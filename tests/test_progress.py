@@ -0,0 +1,99 @@
+import socket
+import time
+
+import pytest
+
+from app.progress import SQLiteJobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteJobStore(tmp_path / "jobs.db", flush_interval=60)
+
+
+def test_create_update_get(store):
+    store.create("j")
+    store.update("j", status="running", meta={"a": 1})
+    job = store.get("j")
+    assert job["status"] == "running" and job["meta"] == {"a": 1}
+    assert job["started_at"] is not None and job["finished_at"] is None
+    store.update("j", status="completed")
+    assert store.get("j")["finished_at"] is not None
+    assert store.get("missing") is None
+
+
+def test_unknown_field_is_rejected(store):
+    store.create("j")
+    with pytest.raises(AttributeError):
+        store.update("j", colour="red")
+
+
+def test_progress_is_buffered_until_flush(store, tmp_path):
+    store.create("j")
+    store.update("j", status="running")
+    store.update("j", progress=40, message="Processed frame 4/10")
+    other = SQLiteJobStore(tmp_path / "jobs.db")
+    assert store.get("j")["progress"] == 40  # the writing process sees its own updates
+    assert other.get("j")["progress"] == 0
+    store.flush()
+    assert other.get("j")["progress"] == 40
+
+
+def test_buffered_progress_is_written_without_further_updates(tmp_path):
+    # The last update of a burst must not wait for another update (or shutdown) to be seen
+    store = SQLiteJobStore(tmp_path / "jobs.db", flush_interval=0.05)
+    other = SQLiteJobStore(tmp_path / "jobs.db")
+    store.create("j")
+    store.update("j", status="running")
+    store.update("j", progress=40)
+    store.update("j", progress=50)
+    assert other.get("j")["progress"] == 0
+    deadline = time.monotonic() + 5
+    while other.get("j")["progress"] != 50:
+        assert time.monotonic() < deadline, "buffered progress was never written"
+        time.sleep(0.01)
+
+
+def test_flush_keeps_the_newest_values(store, tmp_path):
+    store.create("j")
+    store.update("j", status="running")
+    store.update("j", progress=40, message="Processed frame 4/10")
+    store.update("j", status="completed", progress=100, message="Done")
+    store.flush()
+    job = SQLiteJobStore(tmp_path / "jobs.db").get("j")
+    assert (job["status"], job["progress"], job["message"]) == ("completed", 100, "Done")
+
+
+def test_changes_report_new_versions_only(store):
+    store.create("j")
+    version, state = store.changes("j", 0)
+    assert store.changes("j", version) is None
+    store.update("j", progress=10)
+    version2, state = store.changes("j", version)
+    assert version2 != version and state["progress"] == 10
+
+
+def test_cancel_flag(store):
+    store.create("j")
+    assert not store.is_cancel_requested("j")
+    assert store.request_cancel("j")
+    assert store.is_cancel_requested("j")
+    assert not store.request_cancel("missing")
+
+
+def test_claim_orphans_takes_jobs_of_dead_processes(store):
+    host = socket.gethostname()
+    for job_id, status, owner in [("dead", "running", f"{host}:999999999"), ("mine", "queued", "me"),
+                                  ("done", "completed", f"{host}:999999999"), ("remote", "queued", "elsewhere:1")]:
+        store.create(job_id)
+        store.update(job_id, status=status, owner=owner)
+    claimed = store.claim_orphans("me")
+    assert [j["job_id"] for j in claimed] == ["dead"]
+    assert store.get("dead")["owner"] == "me"
+    assert store.claim_orphans("someone") == []  # owners on other hosts count as alive
+
+
+def test_delete(store):
+    store.create("j")
+    store.delete("j")
+    assert store.get("j") is None
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from app.labelstudio_parser import BoxPrompt, MaskPrompt, ParsedPrompts, PointPrompt
+from app.resolution import ProcessingResolution
+
+
+def test_plan_sizes():
+    assert ProcessingResolution().plan(480, 640) is None
+    assert ProcessingResolution(scale=0.5).plan(480, 640).size == (240, 320)
+    assert ProcessingResolution(max_side=320).plan(480, 640).size == (240, 320)
+    # The smaller of the two limits wins, and frames are never upscaled
+    assert ProcessingResolution(max_side=320, scale=0.25).plan(480, 640).size == (120, 160)
+    assert ProcessingResolution(max_side=1024).plan(480, 640) is None
+    assert ProcessingResolution(scale=0.001).plan(480, 640).size == (1, 1)
+
+
+@pytest.mark.parametrize("kwargs", [dict(scale=0), dict(scale=1.5), dict(max_side=-1), dict(output="half")])
+def test_plan_rejects_bad_settings(kwargs):
+    with pytest.raises(ValueError):
+        ProcessingResolution(**kwargs).plan(480, 640)
+
+
+def test_describe():
+    plan = ProcessingResolution(scale=0.5, output="processing", refine_edges=True).plan(480, 640)
+    assert plan.describe() == dict(source=[480, 640], processing=[240, 320], output=[240, 320], refine_edges=False)
+    assert ProcessingResolution(scale=0.5).plan(480, 640).output_size == (480, 640)
+
+
+def test_prompts_round_trip():
+    plan = ProcessingResolution(max_side=400).plan(600, 1000)
+    assert plan.size == (240, 400)
+    mask = np.zeros((600, 1000), dtype=bool)
+    mask[100:300, 250:750] = True
+    prompts = ParsedPrompts(
+        boxes=[BoxPrompt(frame=3, x1=100.0, y1=50.0, x2=900.0, y2=550.0, label="car")],
+        points=[PointPrompt(frame=3, x=500.0, y=125.0, label="car", positive=False)],
+        masks=[MaskPrompt(frame=0, mask=mask, label="road")],
+    )
+    scaled = plan.prompts(prompts)
+    box, point = scaled.boxes[0], scaled.points[0]
+    assert (box.x1, box.y1, box.x2, box.y2) == pytest.approx((40, 20, 360, 220))
+    assert (point.x, point.y) == pytest.approx((200, 50))
+    assert (box.frame, box.label, point.positive) == (3, "car", False)
+    assert scaled.masks[0].mask.shape == (240, 400) and scaled.masks[0].mask.dtype == np.uint8
+    assert scaled.masks[0].label == "road"
+    # Back to the frame size: the coordinates and the mask come back where they were (the mask's
+    # corners are rounded by the upsampling)
+    sx, sy = 1000 / 400, 600 / 240
+    assert (box.x1 * sx, box.y1 * sy, box.x2 * sx, box.y2 * sy) == pytest.approx((100, 50, 900, 550))
+    assert (point.x * sx, point.y * sy) == pytest.approx((500, 125))
+    restored = plan.to_output(scaled.masks[0].mask[None])[0].astype(bool)
+    assert restored.shape == (600, 1000)
+    assert (restored != mask).sum() < 0.002 * mask.sum()
+    ys, xs = np.nonzero(restored)
+    assert (ys.min(), ys.max(), xs.min(), xs.max()) == (100, 299, 250, 749)
+    # The originals are untouched
+    assert prompts.boxes[0].x1 == 100.0 and prompts.masks[0].mask.shape == (600, 1000)
+
+
+@pytest.mark.parametrize("refine_edges", [False, True])
+def test_to_output_shape_and_dtype(refine_edges):
+    plan = ProcessingResolution(scale=0.25, refine_edges=refine_edges).plan(120, 160)
+    planes = np.zeros((3, 30, 40), dtype=np.uint8)
+    planes[0, 5:20, 10:30] = 1
+    planes[2, :, :] = 1
+    image = np.full((120, 160, 3), 90, dtype=np.uint8)
+    out = plan.to_output(planes, image)
+    assert out.shape == (3, 120, 160) and out.dtype == np.uint8
+    assert set(np.unique(out)) <= {0, 1}
+    assert not out[1].any()
+    assert out[2].all()
+    # Upsampling rounds the corners a little, more so when smoothed against a flat frame
+    assert out[0, 26:74, 46:114].all()
+    assert not out[0, :14].any() and not out[0, 86:].any()
+    if not refine_edges:
+        assert np.array_equal(plan.from_output(out), planes)
+
+
+def test_processing_output_is_left_as_computed():
+    plan = ProcessingResolution(scale=0.5, output="processing").plan(40, 60)
+    planes = np.ones((2, 20, 30), dtype=np.uint8)
+    assert plan.to_output(planes) is planes
+    assert plan.from_output(planes) is planes
+
+
+def test_refined_edge_follows_the_frame():
+    # The object's edge lies between two processing pixels; the upsampled mask alone cuts it
+    # on the coarse grid, the refined one where the frame's edge is
+    plan = ProcessingResolution(scale=0.125, refine_edges=True).plan(64, 128)
+    image = np.zeros((64, 128, 3), dtype=np.uint8)
+    image[:, :61] = 255
+    planes = np.zeros((1, 8, 16), dtype=np.uint8)
+    planes[0, :, :8] = 1  # 0..63 at full size, three pixels past the edge
+    plain = ProcessingResolution(scale=0.125).plan(64, 128).to_output(planes)[0]
+    refined = plan.to_output(planes, image)[0]
+    assert refined.dtype == np.uint8
+    row = 32
+    assert np.flatnonzero(plain[row]).max() > 60
+    assert np.flatnonzero(refined[row]).max() == 60
+    # Without a frame to follow the result is the plain upsampling
+    assert np.array_equal(plan.to_output(planes)[0], plain)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from app.rle import (counts_from_string, counts_to_string, decode_counts, decode_ls_brush_mask, encode_counts,
+                     encode_ls_brush)
+
+
+def _masks():
+    rng = np.random.default_rng(0)
+    yield np.zeros((7, 5), dtype=bool)
+    yield np.ones((7, 5), dtype=bool)
+    yield rng.random((31, 17)) > 0.5
+    m = np.zeros((40, 60), dtype=bool)
+    m[5:30, 10:50] = True
+    yield m
+
+
+@pytest.mark.parametrize("mask", list(_masks()))
+def test_counts_roundtrip(mask):
+    counts = encode_counts(mask)
+    assert counts.sum() == mask.size
+    assert np.array_equal(decode_counts(counts, *mask.shape), mask)
+
+
+def test_counts_are_column_major_and_start_with_zeros():
+    mask = np.array([[1, 0], [1, 1]], dtype=bool)
+    assert encode_counts(mask).tolist() == [0, 2, 1, 1]
+
+
+def test_decode_counts_rejects_wrong_size():
+    with pytest.raises(ValueError):
+        decode_counts([3, 2], 2, 2)
+
+
+@pytest.mark.parametrize("mask", list(_masks()))
+def test_string_counts_roundtrip(mask):
+    counts = encode_counts(mask)
+    assert counts_from_string(counts_to_string(counts)).tolist() == counts.tolist()
+
+
+def test_string_counts_match_pycocotools():
+    # rleToString of [3, 5, 100, 2]: the fourth count is delta-coded against the second
+    assert counts_to_string([3, 5, 100, 2]) == "35T3M"
+    assert counts_from_string("35T3M").tolist() == [3, 5, 100, 2]
+
+
+@pytest.mark.parametrize("mask", list(_masks()))
+def test_brush_roundtrip(mask):
+    assert np.array_equal(decode_ls_brush_mask(encode_ls_brush(mask), *mask.shape), mask)
+
+
+def test_brush_long_runs_are_split():
+    # Runs over 65536 channel values do not fit one token
+    mask = np.ones((200, 200), dtype=bool)
+    assert np.array_equal(decode_ls_brush_mask(encode_ls_brush(mask), 200, 200), mask)
+
+
+def test_brush_rejects_wrong_size():
+    with pytest.raises(ValueError):
+        decode_ls_brush_mask(encode_ls_brush(np.ones((4, 4))), 5, 5)
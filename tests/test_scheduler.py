@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+
+from app.progress import JobManager
+from app.sam2_infer import PropagationCancelled
+from app.scheduler import JobScheduler, QueueFull
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def jobs():
+    store = JobManager()
+    for job_id in ("block", "a", "b", "c", "d"):
+        store.create(job_id)
+    return store
+
+
+@pytest.fixture
+def scheduler(jobs):
+    s = JobScheduler(jobs, max_workers=1, max_queue=3)
+    yield s
+    s.shutdown(timeout=5)
+
+
+def _blocker(scheduler, release):
+    # Occupies the only worker until release is set, so later submissions stay queued
+    started = threading.Event()
+
+    def run():
+        started.set()
+        release.wait(5)
+
+    scheduler.submit("block", run)
+    assert started.wait(5)
+
+
+def test_runs_by_priority_then_fifo(scheduler, jobs):
+    release = threading.Event()
+    _blocker(scheduler, release)
+    ran = []
+    positions = [scheduler.submit(job_id, lambda j=job_id: ran.append(j), priority=p)
+                 for job_id, p in (("a", 5), ("b", 0), ("c", 5))]
+    assert positions == [1, 1, 3]
+    assert [scheduler.position(j) for j in "abc"] == [2, 1, 3]
+    assert jobs.get("a")["status"] == "queued"
+    release.set()
+    _wait_until(lambda: len(ran) == 3)
+    assert ran == ["b", "a", "c"]
+    assert scheduler.position("a") is None
+
+
+def test_queue_limit_and_duplicates(scheduler):
+    release = threading.Event()
+    _blocker(scheduler, release)
+    for job_id in "abc":
+        scheduler.submit(job_id, lambda: None)
+    with pytest.raises(QueueFull):
+        scheduler.submit("d", lambda: None)
+    with pytest.raises(ValueError):
+        scheduler.submit("a", lambda: None)
+    with pytest.raises(ValueError):
+        scheduler.submit("block", lambda: None)
+    release.set()
+
+
+def test_cancel_queued_job(scheduler, jobs):
+    release = threading.Event()
+    _blocker(scheduler, release)
+    ran = []
+    for job_id in "ab":
+        scheduler.submit(job_id, lambda j=job_id: ran.append(j))
+    assert scheduler.cancel("a")
+    assert not scheduler.is_active("a")
+    assert scheduler.position("b") == 1
+    assert jobs.get("a")["status"] == "cancelled"
+    release.set()
+    _wait_until(lambda: ran == ["b"])
+    assert not scheduler.cancel("a")
+
+
+def test_cancel_requested_elsewhere_skips_queued_job(scheduler, jobs):
+    release = threading.Event()
+    _blocker(scheduler, release)
+    ran = []
+    scheduler.submit("a", lambda: ran.append("a"))
+    jobs.request_cancel("a")  # e.g. another API process sharing the store
+    release.set()
+    _wait_until(lambda: not scheduler.is_active("a"))
+    assert ran == []
+    assert jobs.get("a")["status"] == "cancelled"
+
+
+def test_cancel_running_job_is_cooperative(scheduler, jobs):
+    started = threading.Event()
+
+    def run():
+        started.set()
+        _wait_until(lambda: jobs.is_cancel_requested("a"))
+        raise PropagationCancelled("Cancelled.")
+
+    scheduler.submit("a", run)
+    assert started.wait(5)
+    assert scheduler.cancel("a")
+    _wait_until(lambda: not scheduler.is_active("a"))
+    assert jobs.get("a")["status"] == "failed"
+
+
+def test_failing_job_does_not_stop_the_worker(scheduler, jobs):
+    def fail():
+        raise RuntimeError("boom")
+
+    ran = []
+    scheduler.submit("a", fail)
+    scheduler.submit("b", lambda: ran.append("b"))
+    _wait_until(lambda: ran == ["b"])
+    assert jobs.get("a")["status"] == "failed"
+    assert jobs.get("a")["message"] == "boom"
+
+
+def test_shutdown_leaves_jobs_queued_for_restart(jobs):
+    scheduler = JobScheduler(jobs, max_workers=1)
+    started = threading.Event()
+    ran = []
+
+    def run():
+        started.set()
+        _wait_until(scheduler.stopping.is_set)
+        raise PropagationCancelled("Stopped.")
+
+    scheduler.submit("a", run)
+    assert started.wait(5)
+    scheduler.submit("b", lambda: ran.append("b"))
+    scheduler.shutdown(timeout=5)
+    assert not scheduler.is_active("a")
+    assert jobs.get("a")["status"] == "queued"
+    assert jobs.get("a")["message"] == "Server stopped; resumes on restart."
+    # The job that never started is not run by the stopping workers
+    time.sleep(0.05)
+    assert ran == []
+    assert jobs.get("b")["status"] == "queued"
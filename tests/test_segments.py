@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.frame_source import VideoFrameSource
+from app.segments import plan_segments
+from benchmarks.synthetic import stand_in_propagator
+
+
+def _owner(segments, total):
+    # Which keyframe writes each frame (the forward segment writes its keyframe)
+    owner = {}
+    for s in sorted(segments, key=lambda s: s.forward):
+        for f in s.frames:
+            owner[f] = s.seed
+    assert sorted(owner) == list(range(total))
+    return owner
+
+
+def test_no_keyframes_is_one_forward_pass():
+    (segment,) = plan_segments(10, [])
+    assert segment.seed == 0 and list(segment.frames) == list(range(10))
+
+
+def test_keyframes_out_of_range_are_ignored():
+    assert plan_segments(5, [-1, 7]) == plan_segments(5, [])
+
+
+def test_single_keyframe_runs_both_ways():
+    segments = plan_segments(10, [4])
+    assert sorted((s.forward, list(s.frames)) for s in segments) == [
+        (False, [3, 2, 1, 0]), (True, [4, 5, 6, 7, 8, 9])]
+
+
+@pytest.mark.parametrize("total,keys", [(10, [0, 9]), (20, [3, 8, 15]), (7, [2, 3]), (100, [10, 10, 50])])
+def test_every_frame_follows_its_nearest_keyframe(total, keys):
+    owner = _owner(plan_segments(total, keys), total)
+    for f, seed in owner.items():
+        nearest = min(sorted(set(keys)), key=lambda k: (abs(k - f), k))  # ties go to the earlier keyframe
+        assert seed == nearest, f
+
+
+def test_segments_start_at_their_keyframe_and_longest_come_first():
+    segments = plan_segments(30, [5, 20])
+    for s in segments:
+        assert s.frames[0] == (s.seed if s.forward else s.seed - 1)
+    lengths = [len(s.frames) for s in segments]
+    assert lengths == sorted(lengths, reverse=True)
+
+
+def test_backward_segment_over_video_reads_forward(video):
+    # Frames reach the tracker in segment order, each the frame at its index, while the video is
+    # decoded forward in pieces rather than seeking back for every frame
+    class LoggingSource(VideoFrameSource):
+        def _decode(self, index):
+            decoded.append(index)
+            return super()._decode(index)
+
+    cap = cv2.VideoCapture(str(video))
+    frames = [cap.read()[1] for _ in range(60)]
+    cap.release()
+    (backward,) = [s for s in plan_segments(60, [59]) if not s.forward]
+    decoded, seen = [], []
+
+    def write(i, img, planes):
+        seen.append(i)
+        assert np.array_equal(img, frames[i]), i
+
+    source = LoggingSource(video, cache_size=0)
+    stand_in_propagator()._track(source, backward.frames, {}, {"a": 0}, write, done_cb=lambda i: None)
+    assert seen == list(backward.frames)
+    assert sorted(decoded) == sorted(backward.frames)
+    seeks = sum(b != a + 1 for a, b in zip(decoded, decoded[1:]))
+    assert seeks <= len(backward.frames) // 16 + 1
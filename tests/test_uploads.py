@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+
+import pytest
+from starlette.requests import Request
+
+from app.uploads import UploadTooLarge, append_chunk, receive_upload
+
+BOUNDARY = "----boundary7MA4YWxkTrZu0gW"
+
+
+def _form(fields, filename, data):
+    body = b""
+    for name, value in fields.items():
+        body += (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n").encode()
+    body += (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+             "Content-Type: application/octet-stream\r\n\r\n").encode()
+    return body + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _request(body, piece, content_length=None):
+    # A request whose body arrives in piece-sized reads, like a slow client's
+    pieces = [body[i:i + piece] for i in range(0, len(body), piece)] or [b""]
+    messages = [{"type": "http.request", "body": p, "more_body": i < len(pieces) - 1} for i, p in enumerate(pieces)]
+
+    async def receive():
+        return messages.pop(0)
+
+    length = len(body) if content_length is None else content_length
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+               (b"content-length", str(length).encode())]
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive)
+
+
+def _receive(body, tmp_path, piece, **kwargs):
+    return asyncio.run(receive_upload(_request(body, piece, kwargs.pop("content_length", None)), tmp_path, **kwargs))
+
+
+# The file data contains near-misses of the delimiter, so a boundary split across reads must
+# not be mistaken for (or hide) the real one
+DATA = (b"\r\n--" + BOUNDARY[:10].encode() + b"\x00" * 50) * 40 + bytes(range(256)) * 8
+
+
+@pytest.mark.parametrize("piece", [1, 7, 64, len(BOUNDARY) + 3, 4096, 1 << 20])
+def test_file_and_fields_survive_any_read_size(tmp_path, piece):
+    body = _form({"job_id": "j1", "offset": "0"}, "../../clip.mp4", DATA)
+    upload = _receive(body, tmp_path, piece, chunk_size=100)
+    assert upload.fields == {"job_id": "j1", "offset": "0"}
+    assert upload.filename == "../../clip.mp4"  # callers sanitize with safe_filename
+    assert upload.path.parent == tmp_path
+    assert upload.path.read_bytes() == DATA
+    assert upload.size == len(DATA)
+    assert upload.sha256 == hashlib.sha256(DATA).hexdigest()
+
+
+def test_digest_can_be_skipped(tmp_path):
+    upload = _receive(_form({}, "a.bin", DATA), tmp_path, 512, digest=False)
+    assert upload.path.read_bytes() == DATA
+    assert upload.sha256 == ""
+
+
+def test_oversized_file_is_discarded(tmp_path):
+    # Content-Length understates the body, so the limit is hit while streaming
+    body = _form({"job_id": "j1"}, "a.bin", DATA)
+    with pytest.raises(UploadTooLarge):
+        _receive(body, tmp_path, 256, max_bytes=len(DATA) - 1, content_length=10)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_declared_length_over_limit_is_refused_before_reading(tmp_path):
+    async def receive():
+        raise AssertionError("body read")
+
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+               (b"content-length", str(10 ** 9).encode())]
+    request = Request({"type": "http", "method": "POST", "headers": headers}, receive)
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(receive_upload(request, tmp_path, max_bytes=1024))
+
+
+def test_file_at_the_limit_is_accepted(tmp_path):
+    upload = _receive(_form({}, "a.bin", DATA), tmp_path, 256, max_bytes=len(DATA))
+    assert upload.size == len(DATA)
+
+
+def test_non_multipart_body_is_rejected(tmp_path):
+    request = Request({"type": "http", "method": "POST", "headers": [(b"content-type", b"application/json")]}, None)
+    with pytest.raises(ValueError):
+        asyncio.run(receive_upload(request, tmp_path))
+
+
+def test_append_chunk_checks_offset_and_limit(tmp_path):
+    piece, part = tmp_path / "piece", tmp_path / "video.part"
+    piece.write_bytes(b"abcd")
+    assert asyncio.run(append_chunk(piece, part, 0)) == 4
+    with pytest.raises(ValueError):
+        asyncio.run(append_chunk(piece, part, 0))
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(append_chunk(piece, part, 4, max_bytes=7))
+    assert asyncio.run(append_chunk(piece, part, 4, chunk_size=3)) == 8
+    assert part.read_bytes() == b"abcdabcd"
+
+
+def _chunk(client, job_id, offset, data, filename="clip.mp4"):
+    return client.post("/api/upload_video/chunk", data={"job_id": job_id, "filename": filename, "offset": str(offset)},
+                       files={"file": ("blob", data)})
+
+
+def _status(client, job_id, filename="clip.mp4"):
+    return client.get("/api/upload_video/status", params={"job_id": job_id, "filename": filename}).json()["received"]
+
+
+def test_resumable_upload(client, job_id, video):
+    data = video.read_bytes()
+    half = len(data) // 2
+    assert _status(client, job_id) == 0
+    assert _chunk(client, job_id, 0, data[:half]).json() == {"received": half}
+    # A retried piece (the client missed the reply) is refused; /status says where to resume
+    assert _chunk(client, job_id, 0, data[:half]).status_code == 409
+    assert _status(client, job_id) == half
+    assert _chunk(client, job_id, half, data[half:]).json() == {"received": len(data)}
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    r = client.post("/api/upload_video/complete", data={"job_id": job_id, "filename": "clip.mp4", "sha256": sha256})
+    assert r.status_code == 200, r.text
+    assert r.json()["bytes"] == len(data)
+    assert r.json()["sha256"] == sha256
+    assert r.json()["frame_count"] > 0
+    assert _status(client, job_id) == 0
+
+
+def test_resumable_upload_checksum_mismatch(client, job_id):
+    assert _chunk(client, job_id, 0, b"not a video").status_code == 200
+    r = client.post("/api/upload_video/complete", data={"job_id": job_id, "filename": "clip.mp4", "sha256": "0" * 64})
+    assert r.status_code == 400
+    assert _status(client, job_id) == 0
+
+
+def test_chunk_rejects_bad_requests(client, job_id):
+    assert _chunk(client, "nosuchjob", 0, b"x").status_code == 400
+    assert _chunk(client, job_id, "-1", b"x").status_code == 422
+    r = client.post("/api/upload_video/chunk", data={"job_id": job_id, "offset": "0"}, files={"file": ("blob", b"x")})
+    assert r.status_code == 422
+    r = client.post("/api/upload_video/complete", data={"job_id": job_id, "filename": "never.mp4"})
+    assert r.status_code == 400
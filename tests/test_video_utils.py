@@ -0,0 +1,55 @@
+import numpy as np
+
+from app import video_utils
+from app.video_utils import _extract_segment, extract_frames_from_video, read_frame
+
+FRAMES = 120  # length of the `video` clip in conftest.py
+
+
+def _frames(d):
+    return {p.name: read_frame(p) for p in sorted(d.iterdir())}
+
+
+def test_parallel_extraction_matches_serial(video, tmp_path):
+    serial, parallel = tmp_path / "serial", tmp_path / "parallel"
+    assert extract_frames_from_video(str(video), str(serial), workers=1) == FRAMES
+    assert extract_frames_from_video(str(video), str(parallel), workers=3, min_segment_frames=30) == FRAMES
+    a, b = _frames(serial), _frames(parallel)
+    assert list(a) == list(b)
+    for name in a:
+        assert np.array_equal(a[name], b[name]), name
+
+
+def test_segment_decodes_up_to_start_when_seek_fails(video, tmp_path, monkeypatch, no_seek_cv2):
+    serial = tmp_path / "serial"
+    extract_frames_from_video(str(video), str(serial), workers=1)
+    monkeypatch.setattr(video_utils, "cv2", no_seek_cv2)
+    out = tmp_path / "segment"
+    out.mkdir()
+    count, _ = _extract_segment(str(video), str(out), 50, 80, "png", [], 1)
+    assert count == 30
+    got = _frames(out)
+    assert list(got) == [f"{i:08d}.png" for i in range(51, 81)]
+    for name, img in got.items():
+        assert np.array_equal(img, read_frame(serial / name)), name
+
+
+def test_extraction_is_one_pass_when_seeks_fail(video, tmp_path, monkeypatch, no_seek_cv2):
+    serial = tmp_path / "serial"
+    extract_frames_from_video(str(video), str(serial), workers=1)
+    monkeypatch.setattr(video_utils, "cv2", no_seek_cv2)
+    starts = []
+    segment = video_utils._extract_segment
+
+    def recording_segment(video_path, out_dir, start, end, *args):
+        starts.append((start, end))
+        return segment(video_path, out_dir, start, end, *args)
+
+    monkeypatch.setattr(video_utils, "_extract_segment", recording_segment)
+    out = tmp_path / "out"
+    assert extract_frames_from_video(str(video), str(out), workers=3, min_segment_frames=30) == FRAMES
+    assert starts == [(0, None)]
+    a, b = _frames(serial), _frames(out)
+    assert list(a) == list(b)
+    for name in a:
+        assert np.array_equal(a[name], b[name]), name
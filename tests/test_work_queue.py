@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from app.scheduler import QueueFull
+from app.work_queue import WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return WorkQueue(tmp_path / "queue.db", max_queue=3)
+
+
+def test_lease_order_is_priority_then_fifo(queue):
+    queue.submit("a", {"n": 1}, priority=1)
+    queue.submit("b", {"n": 2}, priority=0)
+    queue.submit("c", {"n": 3}, priority=1)
+    assert [queue.position(j) for j in "abc"] == [2, 1, 3]
+    leased = [queue.lease("w", 60) for _ in range(3)]
+    assert [(l.job_id, l.params["n"], l.attempts) for l in leased] == [("b", 2, 1), ("a", 1, 1), ("c", 3, 1)]
+    assert queue.lease("w", 60) is None
+    assert queue.position("a") is None and queue.queue_length() == 0
+
+
+def test_submit_limits(queue):
+    queue.submit("a", {})
+    with pytest.raises(ValueError):
+        queue.submit("a", {})
+    queue.submit("b", {})
+    queue.submit("c", {})
+    with pytest.raises(QueueFull):
+        queue.submit("d", {})
+    queue.lease("w", 60)  # leased jobs no longer count as waiting
+    queue.submit("d", {})
+
+
+def test_expired_lease_is_taken_over(queue):
+    queue.submit("a", {})
+    assert queue.lease("w1", 0.05).job_id == "a"
+    assert queue.lease("w2", 60) is None
+    time.sleep(0.1)
+    lease = queue.lease("w2", 60)
+    assert lease.job_id == "a" and lease.attempts == 2
+    assert not queue.heartbeat("a", "w1", 60)  # the first worker lost it
+    assert queue.heartbeat("a", "w2", 60)
+    queue.complete("a", "w1")  # ignored: not the holder
+    assert queue.is_active("a")
+    queue.complete("a", "w2")
+    assert not queue.is_active("a")
+
+
+def test_heartbeat_keeps_lease(queue):
+    queue.submit("a", {})
+    queue.lease("w1", 0.2)
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.heartbeat("a", "w1", 0.2)
+    assert queue.lease("w2", 60) is None
+
+
+def test_release_does_not_count_the_attempt(queue):
+    queue.submit("a", {})
+    queue.lease("w1", 60)
+    queue.release("a", "w1")
+    assert queue.position("a") == 1
+    assert queue.lease("w2", 60).attempts == 1
+
+
+def test_cancel_only_waiting_jobs(queue):
+    queue.submit("a", {})
+    queue.submit("b", {})
+    queue.lease("w", 60)
+    assert not queue.cancel("a")
+    assert queue.cancel("b")
+    assert queue.is_active("a") and not queue.is_active("b")
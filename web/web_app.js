@@ -3,6 +3,9 @@ let frames = [];
 let masks = [];
 let currentIdx = 0;
 
+const CHUNK_SIZE = 8 * 1024 * 1024;
+const CHUNKED_UPLOAD_THRESHOLD = 64 * 1024 * 1024;
+
 const jobInfo = document.getElementById('job-info');
 const framesStatus = document.getElementById('frames-status');
 const lsStatus = document.getElementById('ls-status');
@@ -26,11 +29,16 @@ document.getElementById('btn-upload-video').addEventListener('click', async () =
   if (!jobId) return alert('Create a job first.');
   const file = document.getElementById('video-file').files[0];
   if (!file) return alert('Select a video.');
-  const form = new FormData();
-  form.append('job_id', jobId);
-  form.append('file', file);
   framesStatus.textContent = 'Uploading...';
-  const res = await fetch('/api/upload_video', { method: 'POST', body: form });
+  let res;
+  if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+    res = await uploadVideoChunked(file);
+  } else {
+    const form = new FormData();
+    form.append('job_id', jobId);
+    form.append('file', file);
+    res = await fetch('/api/upload_video', { method: 'POST', body: form });
+  }
   const data = await res.json();
   if (res.ok) {
     framesStatus.textContent = `Uploaded. Frame count: ${data.frame_count}`;
@@ -87,7 +95,18 @@ document.getElementById('btn-propagate').addEventListener('click', async () => {
     progressDiv.textContent = `Error: ${data.detail || 'Failed to start propagation.'}`;
     return;
   }
-  pollStatus();
+  masks = [];
+  updateViewer();
+  watchStatus();
+});
+
+document.getElementById('btn-cancel').addEventListener('click', async () => {
+  if (!jobId) return alert('Create a job first.');
+  const res = await fetch(`/api/cancel/${jobId}`, { method: 'POST' });
+  const data = await res.json();
+  if (!res.ok) {
+    progressDiv.textContent = `Error: ${data.detail || 'Failed to cancel.'}`;
+  }
 });
 
 document.getElementById('prev-frame').addEventListener('click', () => {
@@ -108,18 +127,49 @@ document.getElementById('btn-export').addEventListener('click', async () => {
   window.location.href = url;
 });
 
+// Large videos go up in pieces; an interrupted upload resumes from the server's received offset.
+async function uploadVideoChunked(file) {
+  const params = new URLSearchParams({ job_id: jobId, filename: file.name });
+  const st = await fetch(`/api/upload_video/status?${params}`);
+  let offset = st.ok ? (await st.json()).received : 0;
+  while (offset < file.size) {
+    const form = new FormData();
+    form.append('job_id', jobId);
+    form.append('filename', file.name);
+    form.append('offset', offset);
+    form.append('file', file.slice(offset, offset + CHUNK_SIZE));
+    const res = await fetch('/api/upload_video/chunk', { method: 'POST', body: form });
+    if (!res.ok) return res;
+    offset = (await res.json()).received;
+    framesStatus.textContent = `Uploading... ${Math.floor(100 * offset / file.size)}%`;
+  }
+  const form = new FormData();
+  form.append('job_id', jobId);
+  form.append('filename', file.name);
+  framesStatus.textContent = 'Extracting frames...';
+  return fetch('/api/upload_video/complete', { method: 'POST', body: form });
+}
+
+// List endpoints are paginated (offset/limit); fetch every page.
+async function fetchAll(url, key) {
+  let items = [];
+  while (true) {
+    const res = await fetch(`${url}?offset=${items.length}`);
+    const data = await res.json();
+    const page = data[key] || [];
+    items = items.concat(page);
+    if (!page.length || items.length >= (data.total || 0)) return items;
+  }
+}
+
 async function refreshFrames() {
-  const res = await fetch(`/api/frames/${jobId}/list`);
-  const data = await res.json();
-  frames = data.frames || [];
+  frames = await fetchAll(`/api/frames/${jobId}/list`, 'frames');
   currentIdx = 0;
   updateViewer();
 }
 
 async function refreshMasks() {
-  const res = await fetch(`/api/masks/${jobId}/list`);
-  const data = await res.json();
-  masks = data.masks || [];
+  masks = await fetchAll(`/api/masks/${jobId}/list`, 'masks');
   updateViewer();
 }
 
@@ -129,6 +179,41 @@ function updateViewer() {
   maskImg.src = masks[currentIdx] || '';
 }
 
+function showStatus(s) {
+  const queued = s.queue_position ? ` [queue position ${s.queue_position}]` : '';
+  progressDiv.textContent = `${s.status}${queued} - ${s.progress}% ${s.message ? '(' + s.message + ')' : ''}`;
+}
+
+// Progress and finished masks are pushed over Server-Sent Events; polling is the fallback.
+function watchStatus() {
+  if (!jobId) return;
+  if (!window.EventSource) return pollStatus();
+  const es = new EventSource(`/api/events/${jobId}`);
+  let received = false;
+  es.addEventListener('frames', (ev) => {
+    const f = JSON.parse(ev.data);
+    if (!f.masks) return;
+    f.masks.forEach((url, k) => { masks[f.start + k] = url; });
+    if (currentIdx >= f.start && currentIdx < f.end) updateViewer();
+  });
+  es.addEventListener('status', async (ev) => {
+    received = true;
+    const s = JSON.parse(ev.data);
+    showStatus(s);
+    if (s.status === 'completed' || s.status === 'failed' || s.status === 'cancelled') {
+      es.close();
+      if (s.status === 'completed') await refreshMasks();
+    }
+  });
+  es.onerror = () => {
+    // The browser reconnects by itself once a stream was working; otherwise fall back to polling
+    if (!received) {
+      es.close();
+      pollStatus();
+    }
+  };
+}
+
 async function pollStatus() {
   if (!jobId) return;
   let done = false;
@@ -137,11 +222,11 @@ async function pollStatus() {
     const res = await fetch(`/api/status/${jobId}`);
     if (!res.ok) break;
     const s = await res.json();
-    progressDiv.textContent = `${s.status} - ${s.progress}% ${s.message ? '(' + s.message + ')' : ''}`;
+    showStatus(s);
     if (s.status === 'completed') {
       done = true;
       await refreshMasks();
-    } else if (s.status === 'failed') {
+    } else if (s.status === 'failed' || s.status === 'cancelled') {
       done = true;
     }
   }